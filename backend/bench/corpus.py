@@ -0,0 +1,131 @@
+"""
+Deterministic synthetic image corpus for the benchmarks in bench/.
+
+Every image is a full-body "outfit" scene: a gradient background, a skin-tone
+head (so face detectors have work to do), a top / bottom / shoes made of two-tone
+garment patches with texture noise, and a few distractor objects. Sizes cycle
+through typical upload resolutions (phone photos included), so decode and the
+working-resolution cap are exercised as well.
+
+The same (--n, --seed) always produces byte-identical JPEGs; manifest.json records
+the sha256 of every file and the corpus is regenerated when it does not match.
+
+Usage (from backend/):
+    python bench/corpus.py --out ../bench_corpus --n 24
+"""
+
+import os
+import io
+import json
+import hashlib
+import argparse
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+SIZES = [(640, 480), (1024, 768), (1280, 960), (1920, 1080), (3024, 4032)]  # (w, h)
+SKIN = [(241, 194, 167), (224, 172, 105), (198, 134, 66), (141, 85, 36)]
+MANIFEST = "manifest.json"
+CORPUS_VERSION = 1
+
+
+def _garment(draw, rng, box):
+    """Two-tone patch (e.g. shirt + stripe) inside box."""
+    x1, y1, x2, y2 = box
+    c1, c2 = (tuple(int(v) for v in rng.integers(0, 256, 3)) for _ in range(2))
+    draw.rectangle(box, fill=c1)
+    split = y1 + int((y2 - y1) * rng.uniform(0.55, 0.85))
+    draw.rectangle((x1, split, x2, y2), fill=c2)
+
+
+def make_image(i: int, seed: int) -> bytes:
+    rng = np.random.default_rng(seed * 100003 + i)
+    w, h = SIZES[i % len(SIZES)]
+
+    top, bottom = rng.integers(0, 256, size=(2, 3))
+    ramp = np.linspace(0, 1, h, dtype=np.float32)[:, None, None]
+    bg = (top * (1 - ramp) + bottom * ramp).astype(np.float32)
+    img = Image.fromarray(np.broadcast_to(bg, (h, w, 3)).astype(np.uint8))
+    draw = ImageDraw.Draw(img)
+
+    # distractors
+    for _ in range(rng.integers(2, 6)):
+        x, y = int(rng.integers(0, w)), int(rng.integers(0, h))
+        r = int(rng.integers(min(w, h) // 40, min(w, h) // 10))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(int(v) for v in rng.integers(0, 256, 3)))
+
+    # person: head, top, bottom, shoes
+    cx = int(w * rng.uniform(0.35, 0.65))
+    ph = int(h * rng.uniform(0.7, 0.9))
+    py = int((h - ph) * rng.uniform(0.2, 0.8))
+    pw = int(ph * 0.35)
+    head = int(ph * 0.12)
+    draw.ellipse((cx - head // 2, py, cx + head // 2, py + head), fill=SKIN[int(rng.integers(0, len(SKIN)))])
+    eye = max(1, head // 10)
+    for ex in (cx - head // 5, cx + head // 5):
+        draw.ellipse((ex - eye, py + head // 3, ex + eye, py + head // 3 + eye * 2), fill=(30, 30, 30))
+    body = py + head
+    _garment(draw, rng, (cx - pw // 2, body, cx + pw // 2, body + int(ph * 0.38)))
+    _garment(draw, rng, (cx - pw // 2 + pw // 10, body + int(ph * 0.38), cx + pw // 2 - pw // 10, body + int(ph * 0.8)))
+    shoe = tuple(int(v) for v in rng.integers(0, 256, 3))
+    draw.rectangle((cx - pw // 2, body + int(ph * 0.8), cx - 2, py + ph), fill=shoe)
+    draw.rectangle((cx + 2, body + int(ph * 0.8), cx + pw // 2, py + ph), fill=shoe)
+
+    # texture noise + a little blur so JPEG sizes look like photos
+    arr = np.asarray(img.filter(ImageFilter.GaussianBlur(1.5)), dtype=np.float32)
+    arr += rng.normal(0, 6, arr.shape).astype(np.float32)
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def ensure_corpus(out_dir: str, n: int = 24, seed: int = 0) -> list:
+    """Paths of the corpus images, (re)generated unless manifest.json already matches."""
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        files = [os.path.join(out_dir, e["file"]) for e in manifest["files"]]
+        if (manifest.get("version") == CORPUS_VERSION and manifest.get("n") == n and manifest.get("seed") == seed
+                and all(os.path.exists(p) and _sha256(p) == e["sha256"] for p, e in zip(files, manifest["files"]))):
+            return files
+
+    os.makedirs(out_dir, exist_ok=True)
+    entries = []
+    for i in range(n):
+        name = f"img-{i:03d}.jpg"
+        data = make_image(i, seed)
+        with open(os.path.join(out_dir, name), "wb") as f:
+            f.write(data)
+        entries.append({"file": name, "sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data)})
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"version": CORPUS_VERSION, "n": n, "seed": seed, "files": entries}, f, indent=2)
+    print(f"[INFO] generated {n} synthetic images in {out_dir}")
+    return [os.path.join(out_dir, e["file"]) for e in entries]
+
+
+def corpus_digest(paths: list) -> str:
+    """One hash over the corpus contents (recorded in benchmark results)."""
+    h = hashlib.sha256()
+    for p in paths:
+        h.update(_sha256(p).encode())
+    return h.hexdigest()[:16]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="../bench_corpus")
+    ap.add_argument("--n", type=int, default=24)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    paths = ensure_corpus(args.out, args.n, args.seed)
+    print(f"[OK] {len(paths)} images, digest {corpus_digest(paths)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Local stand-in for the Perplexity chat completions API (no network, no API key).
+
+Answers POST /chat/completions in the OpenAI-like shape perplexity_client expects
+(choices[0].message.content) with canned JSON: the analyzer schema for the
+"fashion analyst" prompt, the enhancer schema for the "stylist" prompt. Knobs:
+- --latency-ms / --jitter-ms   per-response delay (uniform jitter, asyncio.sleep:
+                               the fake itself never becomes the bottleneck)
+- --error-rate / --error-status  fraction of requests answered with an error status
+                               (503 / 429 exercise the client's retry + Retry-After path)
+- --malformed-rate             fraction answered with non-JSON text (parse fallbacks)
+- --max-concurrency            more in-flight requests than this get 429 (provider rate limit)
+- --responses FILE             JSON {"analyze": {...}, "enhance": {...}} replacing the canned bodies
+GET /stats reports requests, errors, malformed answers and peak concurrency.
+
+Point the API at it with:
+    API_URL=http://127.0.0.1:8900/chat/completions PERPLEXITY_API_KEY=fake DEFAULT_MODEL=fake
+
+Usage (from backend/):
+    python bench/fake_llm.py --port 8900 --latency-ms 800 --jitter-ms 300 --error-rate 0.02
+"""
+
+import json
+import random
+import asyncio
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+CANNED = {
+    "analyze": {
+        "outfit_description": "A relaxed casual look built around a plain top and dark jeans.",
+        "positives": ["clean color palette", "good fit"],
+        "negatives": ["lacks a focal accessory"],
+        "lacking_items": ["watch"],
+        "llm_suggested_additions": ["denim jacket", "white sneakers", "leather belt"],
+        "llm_tags": ["casual"],
+    },
+    "enhance": {
+        "final_description": "Layer a denim jacket and finish with white sneakers for an easy casual outfit.",
+        "recommendation_style": "easy casual",
+        "confidence_level": "medium",
+        "items_explained": [
+            {"label": "denim jacket", "reason": "adds structure without breaking the casual tone"},
+            {"label": "white sneakers", "reason": "keeps the palette light"},
+        ],
+    },
+}
+
+
+def create_app(latency_ms: float = 800, jitter_ms: float = 0, error_rate: float = 0.0, error_status: int = 503,
+               malformed_rate: float = 0.0, max_concurrency: int = 0, responses: dict = None,
+               seed: int = 0) -> FastAPI:
+    app = FastAPI(title="Fake Perplexity")
+    canned = {**CANNED, **(responses or {})}
+    rng = random.Random(seed)
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0, "malformed": 0, "in_flight": 0, "peak_in_flight": 0}
+
+    @app.post("/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if max_concurrency and stats["in_flight"] >= max_concurrency:
+            stats["rate_limited"] += 1
+            return JSONResponse(status_code=429, content={"error": "rate limited"}, headers={"Retry-After": "1"})
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        try:
+            delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+            await asyncio.sleep(delay)
+            if rng.random() < error_rate:
+                stats["errors"] += 1
+                return JSONResponse(status_code=error_status, content={"error": "injected failure"})
+
+            system = next((m.get("content", "") for m in body.get("messages", []) if m.get("role") == "system"), "")
+            kind = "enhance" if "stylist" in system else "analyze"
+            if rng.random() < malformed_rate:
+                stats["malformed"] += 1
+                content = "Sure! Here is my take on the outfit: " + canned[kind].get(
+                    "outfit_description", canned[kind].get("final_description", ""))
+            else:
+                content = json.dumps(canned[kind])
+            return {
+                "id": f"fake-{stats['requests']}",
+                "model": body.get("model") or "fake",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": sum(len(m.get("content", "")) // 4 for m in body.get("messages", [])),
+                          "completion_tokens": len(content) // 4},
+            }
+        finally:
+            stats["in_flight"] -= 1
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--latency-ms", type=float, default=800)
+    ap.add_argument("--jitter-ms", type=float, default=200)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-status", type=int, default=503)
+    ap.add_argument("--malformed-rate", type=float, default=0.0)
+    ap.add_argument("--max-concurrency", type=int, default=0, help="0 = unlimited")
+    ap.add_argument("--responses", help="JSON file with 'analyze' / 'enhance' bodies")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    responses = None
+    if args.responses:
+        with open(args.responses, encoding="utf-8") as f:
+            responses = json.load(f)
+    app = create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.malformed_rate,
+                     args.max_concurrency, responses, args.seed)
+    print(f"[INFO] fake LLM on http://{args.host}:{args.port}/chat/completions")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
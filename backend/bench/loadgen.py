@@ -0,0 +1,313 @@
+"""
+HTTP load generator for the FastAPI app (open-loop, target RPS).
+
+Drives a weighted mix of /detect-v2 (synthetic corpus uploads), /analyze/ and
+/recommend/ at a fixed arrival rate: requests are sent on schedule whether or not
+earlier ones finished, so queueing shows up as latency / 503s instead of silently
+lowering the offered load. Per step and endpoint: sent, ok, error rate by status,
+p50 / p95 / p99 latency and achieved throughput. A GET /ping probe runs alongside
+(10/s). /ping is an async def answered on the event loop, so its latency is the
+event-loop lag - blocking work on the loop shows up there first (the sync /health
+also waits for a threadpool slot, which mixes threadpool contention into it).
+
+A step is saturated when achieved throughput < 90% of the target, the error rate is
+above --max-error-rate or p95 is above --slo-ms; the report lists the highest
+sustainable RPS per worker count.
+
+--spawn starts bench/fake_llm.py and, for every --workers value, `uvicorn main:app
+--workers N` pointed at it (API_URL), waits for --ready-path and sweeps --rps.
+Without --spawn the running server at --url is tested as is.
+--bust-caches makes every upload / detection payload unique so the detection and LLM
+caches do not absorb the load.
+
+Usage (from backend/):
+    python bench/loadgen.py --spawn --workers 1,2,4 --rps 2,5,10,20 --duration 30
+    python bench/loadgen.py --url http://127.0.0.1:8000 --mix analyze=1,recommend=1 --rps 50
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import subprocess
+from typing import Dict, List
+
+import numpy as np
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+from corpus import ensure_corpus  # noqa: E402
+
+ENDPOINTS = {"detect-v2": "/detect-v2", "analyze": "/analyze/", "recommend": "/recommend/"}
+OCCASIONS = ["casual", "party", "college", "ceremony"]
+GARMENTS = [("shirt", "t-shirt"), ("pants", "jeans"), ("shoes", "sneakers"), ("jacket", "denim jacket"),
+            ("dress", "dress"), ("bag", "backpack")]
+
+
+def synthetic_result(rng: random.Random) -> Dict:
+    """A detect_image_bytes_v2-shaped result with random garments / colors."""
+    dets = []
+    for label, refined in rng.sample(GARMENTS, rng.randint(2, 4)):
+        rgb = [rng.randrange(256) for _ in range(3)]
+        dets.append({"label": label, "refined_label": refined, "confidence": round(rng.uniform(0.4, 0.95), 3),
+                     "refined_confidence": round(rng.uniform(0.4, 0.95), 3), "bbox": [10, 10, 200, 300],
+                     "colors": [{"rgb": rgb, "hex": "#{:02x}{:02x}{:02x}".format(*rgb)}]})
+    regions = {name: {"bbox": [0, 0, 10, 10], "dominant_color_rgb": [rng.randrange(256) for _ in range(3)]}
+               for name in ("top", "bottom", "shoes")}
+    return {"refined_detections": dets, "detections": dets,
+            "person_regions": [{"person_bbox": [0, 0, 300, 600], "regions": regions}]}
+
+
+class RequestFactory:
+    """Builds the next request for an endpoint."""
+
+    def __init__(self, corpus: List[bytes], bust_caches: bool, seed: int):
+        self.corpus = corpus
+        self.bust = bust_caches
+        self.rng = random.Random(seed)
+        self.fixed = synthetic_result(random.Random(seed))
+        self.i = 0
+
+    def build(self, endpoint: str) -> Dict:
+        self.i += 1
+        if endpoint == "detect-v2":
+            data = self.corpus[self.i % len(self.corpus)]
+            if self.bust:
+                data = data + os.urandom(8)  # trailing bytes after EOI: same pixels, new content hash
+            return {"files": {"file": (f"load-{self.i}.jpg", data, "image/jpeg")}}
+        result = synthetic_result(self.rng) if self.bust else self.fixed
+        occasion = self.rng.choice(OCCASIONS) if self.bust else "casual"
+        body = {"detections": result, "person_regions": result["person_regions"], "occasion": occasion}
+        return {"json": body}
+
+
+def _pct(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)), 1) if values else 0.0
+
+
+async def run_step(base_url: str, mix: Dict[str, float], rps: float, duration: float, factory: RequestFactory,
+                   max_in_flight: int, timeout: float, poisson: bool, seed: int) -> Dict:
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    samples: Dict[str, List] = {name: [] for name in names}  # (status, latency_ms)
+    dropped = {name: 0 for name in names}
+    probe: List[float] = []
+    in_flight = 0
+    limits = httpx.Limits(max_connections=max_in_flight + 1, max_keepalive_connections=max_in_flight + 1)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def one(name: str):
+            nonlocal in_flight
+            kwargs = factory.build(name)
+            t = time.perf_counter()
+            try:
+                resp = await client.post(ENDPOINTS[name], **kwargs)
+                await resp.aread()
+                status = resp.status_code
+            except httpx.TimeoutException:
+                status = "timeout"
+            except httpx.HTTPError:
+                status = "conn_error"
+            samples[name].append((status, (time.perf_counter() - t) * 1000))
+            in_flight -= 1
+
+        async def loop_probe():
+            while True:
+                t = time.perf_counter()
+                try:
+                    await client.get("/ping")
+                    probe.append((time.perf_counter() - t) * 1000)
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.1)
+
+        prober = asyncio.create_task(loop_probe())
+        tasks = []
+        t0 = time.perf_counter()
+        next_at = 0.0
+        while next_at < duration:
+            delay = t0 + next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            name = rng.choices(names, weights)[0]
+            if in_flight >= max_in_flight:
+                dropped[name] += 1  # the client itself is saturated: count, don't queue
+            else:
+                in_flight += 1
+                tasks.append(asyncio.create_task(one(name)))
+            next_at += rng.expovariate(rps) if poisson else 1.0 / rps
+        sent_s = time.perf_counter() - t0
+        if tasks:
+            await asyncio.wait(tasks)
+        prober.cancel()
+        elapsed = time.perf_counter() - t0
+
+    out = {"target_rps": rps, "offered_s": round(sent_s, 2), "elapsed_s": round(elapsed, 2),
+           "loop_lag_ms": {"p50": _pct(probe, 50), "p95": _pct(probe, 95), "p99": _pct(probe, 99)},
+           "endpoints": {}}
+    total_ok = total = 0
+    for name in names:
+        rows = samples[name]
+        ok = [ms for status, ms in rows if status == 200]
+        statuses: Dict[str, int] = {}
+        for status, _ in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        sent = len(rows) + dropped[name]
+        total_ok += len(ok)
+        total += sent
+        out["endpoints"][name] = {
+            "sent": sent, "ok": len(ok), "client_dropped": dropped[name], "statuses": statuses,
+            "error_rate": round(1 - len(ok) / sent, 4) if sent else 0.0,
+            "p50_ms": _pct(ok, 50), "p95_ms": _pct(ok, 95), "p99_ms": _pct(ok, 99),
+            "throughput_rps": round(len(ok) / elapsed, 2),
+        }
+    out["ok_rps"] = round(total_ok / elapsed, 2)
+    out["error_rate"] = round(1 - total_ok / total, 4) if total else 0.0
+    out["p95_ms"] = _pct([ms for rows in samples.values() for status, ms in rows if status == 200], 95)
+    return out
+
+
+def saturated(step: Dict, max_error_rate: float, slo_ms: float) -> bool:
+    return (step["ok_rps"] < 0.9 * step["target_rps"] or step["error_rate"] > max_error_rate
+            or step["p95_ms"] > slo_ms)
+
+
+def print_step(label: str, step: Dict, is_saturated: bool):
+    lag = step["loop_lag_ms"]
+    print(f"{label:<10} target {step['target_rps']:6.1f} rps | ok {step['ok_rps']:6.1f} rps | "
+          f"err {step['error_rate']:6.1%} | p95 {step['p95_ms']:8.1f} ms | loop lag p99 {lag['p99']:7.1f} ms"
+          + ("  SATURATED" if is_saturated else ""))
+    for name, e in step["endpoints"].items():
+        print(f"    {name:<10} sent {e['sent']:5d} ok {e['ok']:5d} p50 {e['p50_ms']:8.1f} p95 {e['p95_ms']:8.1f} "
+              f"p99 {e['p99_ms']:8.1f} ms  {e['statuses']}")
+
+
+# ---- process management (--spawn) ----
+
+def _wait_ready(url: str, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(1)
+    return False
+
+
+def _start(cmd: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, start_new_session=True)
+
+
+def _stop(proc: subprocess.Popen):
+    if proc.poll() is None:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8000", help="server to test (ignored with --spawn)")
+    ap.add_argument("--mix", default="detect-v2=1,analyze=1,recommend=1", help="endpoint=weight,...")
+    ap.add_argument("--rps", default="5", help="comma-separated target rates, swept in order")
+    ap.add_argument("--duration", type=float, default=20, help="seconds per step")
+    ap.add_argument("--poisson", action="store_true", help="exponential inter-arrival times instead of fixed")
+    ap.add_argument("--max-in-flight", type=int, default=256, help="client-side cap on open requests")
+    ap.add_argument("--timeout", type=float, default=60)
+    ap.add_argument("--bust-caches", action="store_true", help="unique payload per request")
+    ap.add_argument("--max-error-rate", type=float, default=0.01)
+    ap.add_argument("--slo-ms", type=float, default=5000, help="p95 above this counts as saturated")
+    ap.add_argument("--stop-at-saturation", action="store_true", help="skip higher rates once saturated")
+    ap.add_argument("--corpus", default="../bench_corpus")
+    ap.add_argument("--n", type=int, default=24, help="corpus images")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write all steps as JSON")
+    spawn = ap.add_argument_group("--spawn")
+    spawn.add_argument("--spawn", action="store_true", help="start the fake LLM + the app per worker count")
+    spawn.add_argument("--workers", default="1", help="comma-separated uvicorn worker counts")
+    spawn.add_argument("--port", type=int, default=8765)
+    spawn.add_argument("--llm-port", type=int, default=8900)
+    spawn.add_argument("--llm-args", default="--latency-ms 800 --jitter-ms 200",
+                       help="extra arguments for bench/fake_llm.py")
+    spawn.add_argument("--ready-path", default="/ready", help="polled until 200 before each sweep")
+    spawn.add_argument("--ready-timeout", type=float, default=300)
+    args = ap.parse_args()
+
+    mix = {}
+    for part in args.mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint '{name}' (expected {', '.join(ENDPOINTS)})")
+        mix[name.strip()] = float(weight or 1)
+    rates = [float(r) for r in args.rps.split(",")]
+
+    corpus = []
+    if "detect-v2" in mix:
+        for p in ensure_corpus(args.corpus, args.n, args.seed):
+            with open(p, "rb") as f:
+                corpus.append(f.read())
+    factory = RequestFactory(corpus, args.bust_caches, args.seed)
+
+    def sweep(label: str, base_url: str) -> Dict:
+        steps, best = [], 0.0
+        for i, rps in enumerate(rates):
+            step = asyncio.run(run_step(base_url, mix, rps, args.duration, factory, args.max_in_flight,
+                                        args.timeout, args.poisson, args.seed + i))
+            step["saturated"] = saturated(step, args.max_error_rate, args.slo_ms)
+            print_step(label, step, step["saturated"])
+            steps.append(step)
+            if not step["saturated"]:
+                best = max(best, rps)
+            elif args.stop_at_saturation:
+                break
+        return {"steps": steps, "max_sustainable_rps": best}
+
+    report = {"mix": mix, "duration_s": args.duration, "bust_caches": args.bust_caches, "runs": {}}
+    if not args.spawn:
+        report["runs"]["external"] = sweep("external", args.url)
+    else:
+        llm = _start([sys.executable, os.path.join(BENCH_DIR, "fake_llm.py"), "--port", str(args.llm_port)]
+                     + args.llm_args.split(), dict(os.environ))
+        try:
+            env = dict(os.environ, API_URL=f"http://127.0.0.1:{args.llm_port}/chat/completions",
+                       PERPLEXITY_API_KEY=os.getenv("PERPLEXITY_API_KEY", "fake"),
+                       DEFAULT_MODEL=os.getenv("DEFAULT_MODEL", "fake"),
+                       UPLOAD_PERSIST=os.getenv("UPLOAD_PERSIST", "0"))
+            if not _wait_ready(f"http://127.0.0.1:{args.llm_port}/stats", 30):
+                raise SystemExit("[FAIL] fake LLM did not start")
+            for workers in [int(w) for w in args.workers.split(",")]:
+                app = _start([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+                              "--workers", str(workers), "--log-level", "warning"], env)
+                try:
+                    base_url = f"http://127.0.0.1:{args.port}"
+                    if not _wait_ready(base_url + args.ready_path, args.ready_timeout):
+                        print(f"[WARN] {workers} worker(s): {args.ready_path} not ready after {args.ready_timeout:.0f}s")
+                        report["runs"][f"workers={workers}"] = {"error": "not ready"}
+                        continue
+                    report["runs"][f"workers={workers}"] = sweep(f"w={workers}", base_url)
+                finally:
+                    _stop(app)
+            report["fake_llm"] = httpx.get(f"http://127.0.0.1:{args.llm_port}/stats").json()
+        finally:
+            _stop(llm)
+
+    print("\nmax sustainable rps:", ", ".join(f"{k}: {v.get('max_sustainable_rps', '-')}"
+                                             for k, v in report["runs"].items()))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[OK] report -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
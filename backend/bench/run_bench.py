@@ -0,0 +1,259 @@
+"""
+Reproducible benchmark of the detection pipeline stages.
+
+Stages (each runs in its own subprocess, so peak RSS and model load are per stage):
+- detect_image_bytes     utils.detect, upload bytes -> detections
+- detect_image_bytes_v2  utils.D2, upload bytes -> fused / filtered / refined detections
+- blur_faces             utils.face_blur, upload bytes -> blurred JPEG bytes
+- zero_shot_classify     utils.classify, one garment crop (PIL) -> top-3 labels
+- dominant_colors        utils.colors, one garment crop (BGR) -> 2 colors
+  (the successor of get_dominant_colors)
+
+Per stage: first call (model load + warm-up), p50 / p95 / p99 / mean latency over
+--repeats passes of the corpus, throughput (calls/s, one caller) and peak RSS.
+Results are written as JSON together with the git commit, host, thread settings and
+corpus digest. --compare flags every metric that is worse than the baseline by more
+than --threshold (relative) and exits with status 1 if there is any regression;
+a stage that fails in the current run counts as one.
+
+Usage (from backend/):
+    python bench/run_bench.py --out bench_results.json
+    python bench/run_bench.py --stages blur_faces,dominant_colors --repeats 5
+    python bench/run_bench.py --compare bench_baseline.json --threshold 0.10
+Uploads are not persisted during the run (UPLOAD_PERSIST=0) unless set explicitly.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from corpus import corpus_digest, ensure_corpus  # noqa: E402
+
+STAGES = ("detect_image_bytes", "detect_image_bytes_v2", "blur_faces", "zero_shot_classify", "dominant_colors")
+RESULT_MARKER = "BENCH_RESULT "
+THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+# metric -> True if higher is better
+COMPARED = {"p50_ms": False, "p95_ms": False, "p99_ms": False, "throughput_per_s": True, "peak_rss_mb": False}
+
+
+# ---- worker side (one stage per process) ----
+
+def _center_crop(data: bytes):
+    """The middle of the frame, roughly where the synthetic outfit is (a typical refine crop)."""
+    from PIL import Image
+    import io
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    w, h = img.size
+    return img.crop((int(w * 0.3), int(h * 0.2), int(w * 0.7), int(h * 0.8)))
+
+
+def load_stage(name: str, corpus: list):
+    """(fn, inputs) for a stage; imports happen here so they count toward the stage's RSS."""
+    if name == "detect_image_bytes":
+        from utils.detect import detect_image_bytes
+        return detect_image_bytes, corpus
+    if name == "detect_image_bytes_v2":
+        from utils.D2 import detect_image_bytes_v2
+        return detect_image_bytes_v2, corpus
+    if name == "blur_faces":
+        from utils.face_blur import blur_faces
+        return blur_faces, corpus
+    if name == "zero_shot_classify":
+        from utils.classify import zero_shot_classify
+        return (lambda img: zero_shot_classify(img, top_k=3)), [_center_crop(d) for d in corpus]
+    if name == "dominant_colors":
+        from utils.colors import dominant_colors
+        crops = [np.ascontiguousarray(np.asarray(_center_crop(d))[:, :, ::-1]) for d in corpus]
+        return (lambda crop: dominant_colors(crop, k=2)), crops
+    raise ValueError(f"Unknown stage '{name}' (expected one of {', '.join(STAGES)})")
+
+
+def _peak_rss_mb() -> float:
+    # VmHWM belongs to this process image; ru_maxrss would carry the parent's peak over fork + exec
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def run_worker(name: str, paths: list, repeats: int, warmup: int) -> dict:
+    corpus = []
+    for p in paths:
+        with open(p, "rb") as f:
+            corpus.append(f.read())
+    rss_before = _peak_rss_mb()
+
+    t0 = time.perf_counter()
+    fn, inputs = load_stage(name, corpus)
+    fn(inputs[0])  # model load + first call
+    first_call_s = time.perf_counter() - t0
+    for x in inputs[:warmup]:
+        fn(x)
+
+    latencies = []
+    t_run = time.perf_counter()
+    for _ in range(repeats):
+        for x in inputs:
+            t = time.perf_counter()
+            fn(x)
+            latencies.append(time.perf_counter() - t)
+    wall = time.perf_counter() - t_run
+
+    ms = np.asarray(latencies) * 1000
+    return {
+        "calls": len(latencies),
+        "first_call_s": round(first_call_s, 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "throughput_per_s": round(len(latencies) / wall, 3),
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+# ---- driver ----
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def run_stage(name: str, args, env: dict) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", name, "--corpus", os.path.abspath(args.corpus),
+           "--n", str(args.n), "--seed", str(args.seed), "--repeats", str(args.repeats), "--warmup", str(args.warmup)]
+    proc = subprocess.run(cmd, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    tail = (proc.stderr or proc.stdout).strip().splitlines()[-5:]
+    return {"error": f"exit {proc.returncode}: " + " | ".join(tail)}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Rows (stage, metric, baseline, current, relative change, regressed); a failed stage is a regression."""
+    rows = []
+    for stage, cur in results["stages"].items():
+        if "error" in cur:
+            rows.append((stage, "error", None, None, None, True))
+            continue
+        base = baseline.get("stages", {}).get(stage)
+        if not base or "error" in base:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            b, c = base.get(metric), cur.get(metric)
+            if not b or c is None:
+                continue
+            change = (c - b) / b
+            worse = -change if higher_is_better else change
+            rows.append((stage, metric, b, c, change, worse > threshold))
+    return rows
+
+
+def print_table(results: dict):
+    print(f"{'stage':<24} {'first s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'calls/s':>8} {'peak MB':>8}")
+    for stage, r in results["stages"].items():
+        if "error" in r:
+            print(f"{stage:<24} ERROR {r['error']}")
+            continue
+        print(f"{stage:<24} {r['first_call_s']:8.2f} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} "
+              f"{r['throughput_per_s']:8.2f} {r['peak_rss_mb']:8.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of " + ", ".join(STAGES))
+    ap.add_argument("--corpus", default="../bench_corpus", help="synthetic corpus directory (generated if missing)")
+    ap.add_argument("--n", type=int, default=24, help="corpus images")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeats", type=int, default=3, help="timed passes over the corpus")
+    ap.add_argument("--warmup", type=int, default=2, help="untimed calls after the first one")
+    ap.add_argument("--threads", type=int, default=None, help="pin OMP / MKL / OpenBLAS threads")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--compare", help="baseline results JSON")
+    ap.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    ap.add_argument("--worker", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    paths = ensure_corpus(args.corpus, args.n, args.seed)
+    if args.worker:
+        print(RESULT_MARKER + json.dumps(run_worker(args.worker, paths, args.repeats, args.warmup)))
+        return
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise SystemExit(f"unknown stages: {', '.join(unknown)}")
+    env = dict(os.environ)
+    env.setdefault("UPLOAD_PERSIST", "0")
+    if args.threads:
+        env.update({v: str(args.threads) for v in THREAD_VARS})
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "threads": {v: env.get(v) for v in THREAD_VARS},
+            "corpus": {"n": len(paths), "seed": args.seed, "digest": corpus_digest(paths)},
+            "repeats": args.repeats,
+        },
+        "stages": {},
+    }
+    for stage in stages:
+        print(f"[INFO] {stage} ...")
+        results["stages"][stage] = run_stage(stage, args, env)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_table(results)
+    print(f"[OK] results -> {args.out}")
+
+    if not args.compare:
+        return
+    with open(args.compare, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("meta", {}).get("corpus", {}).get("digest") != results["meta"]["corpus"]["digest"]:
+        print("[WARN] baseline was measured on a different corpus")
+    if baseline.get("meta", {}).get("platform") != results["meta"]["platform"]:
+        print("[WARN] baseline was measured on a different platform")
+    rows = compare(results, baseline, args.threshold)
+    print(f"\nvs {args.compare} ({baseline.get('meta', {}).get('commit', '?')}), threshold {args.threshold:.0%}")
+    print(f"{'stage':<24} {'metric':<17} {'baseline':>10} {'current':>10} {'change':>8}")
+    for stage, metric, b, c, change, regressed in rows:
+        if metric == "error":
+            print(f"{stage:<24} {metric:<17} {'':>10} {'failed':>10} {'':>8}  REGRESSION")
+            continue
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{stage:<24} {metric:<17} {b:10.2f} {c:10.2f} {change:+8.1%}{flag}")
+    regressions = [r for r in rows if r[-1]]
+    if regressions:
+        raise SystemExit(f"[FAIL] {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+    print("[OK] no regressions")
+
+
+if __name__ == "__main__":
+    main()
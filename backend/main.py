@@ -4,27 +4,63 @@ main.py - FastAPI entrypoint for Fashion Recommendation API
 Organized for clarity and maintainability.
 """
 
+import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
 
 # Third-party imports
-from fastapi import FastAPI, UploadFile, File , HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File , Form, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # Local application imports
 from utils.D2 import detect_image_bytes_v2
 from utils.detect import detect_image_bytes
-from utils.face_blur import blur_faces
-from utils.llm_analyzer import analyze_outfit
-from utils.recommend_hybrid import generate_hybrid_recommendations
-from utils.llm_enhancer import enhance_recommendation
+from utils.face_blur import blur_faces_image
+from utils.image_io import MAX_WORKING_SIDE, DecodedImage
+from utils.clip_encoder import CLIP_ENCODER
+from utils.llm_analyzer import analyze_outfit_async
+from utils.recommend_hybrid import generate_hybrid_recommendations, retrieve_similar_items
+from utils.llm_enhancer import enhance_recommendation_async
+from utils.perplexity_client import close_async_client
+from utils.llm_cache import llm_cache_stats
+from utils.prompt_compactor import compaction_stats
+from utils.box_fusion import fusion_stats
+from utils.model_registry import get_registry
+from utils.cache import content_key, get_detection_cache, model_set_version
+from utils.upload_store import upload_store_stats, close_upload_stores
+from utils.tracing import SERVER_TIMING, ServerTimingMiddleware, render_prometheus
+from utils.executor import OverloadedError, run_cpu, run_io, run_process, executor_stats, shutdown_executors
 
 # Pydantic models for request/response validation
 from pydantic import BaseModel
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, Tuple
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load + warm every model at startup (in the background, see /ready); clean up on shutdown."""
+    load_task = None
+    if os.getenv("MODEL_EAGER_LOAD", "1") == "1":
+        registry = get_registry()
+        load_task = asyncio.get_running_loop().run_in_executor(None, registry.load_all)
+    else:
+        get_registry().mark_lazy()
+    yield
+    if load_task is not None:
+        # cancelling the future would not stop the loader thread: skip the remaining
+        # models and wait for the running ones before the executors go away
+        registry.stop()
+        await load_task
+    await close_async_client()
+    close_upload_stores()  # flush queued upload writes
+    shutdown_executors()
 
 
 app = FastAPI(
-    title="Fashion Recommendation API"
+    title="Fashion Recommendation API",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -34,8 +70,78 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Per-stage timings of each request (SERVER_TIMING=1, see utils/tracing.py)
+if SERVER_TIMING:
+    app.add_middleware(ServerTimingMiddleware)
+
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request, exc: OverloadedError):
+    """Admission control: shed load instead of queueing without bound."""
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Server is busy, please retry shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+# Detection parameters (part of the result cache key)
+DETECT_CONF_THRESH = 0.25
+DETECT_K_COLORS = 2
+CLASSIFIER_THRESHOLD = 0.35
+COMBINED_THRESHOLD = 0.35
+
+
+def _cache_lookup(contents: bytes, **params) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """(key, cached result or None); hashes the upload and may hit SQLite, so it runs on the io lane."""
+    key = content_key(contents, **params)
+    return key, get_detection_cache().get(key)
+
+
+def _blur_and_detect(contents: bytes) -> Dict[str, Any]:
+    """Blocking /detect pipeline (runs on the cpu lane)."""
+    blurred = blur_faces_image(contents)  # decoded once, no JPEG round trip before detection
+    return detect_image_bytes(blurred, conf_thresh=DETECT_CONF_THRESH, k_colors=DETECT_K_COLORS)
+
+
+def _blur_and_detect_v2(contents: bytes) -> Tuple[Dict[str, Any], DecodedImage]:
+    """Blocking /detect-v2 pipeline (runs on the cpu lane); also returns the blurred image."""
+    blurred = blur_faces_image(contents)
+    result = detect_image_bytes_v2(blurred, conf_thresh=DETECT_CONF_THRESH, k_colors=DETECT_K_COLORS,
+                                   classifier_threshold=CLASSIFIER_THRESHOLD, combined_threshold=COMBINED_THRESHOLD)
+    return result, blurred
+
+
+async def _detect_v2_cached(contents: bytes) -> Tuple[Dict[str, Any], Optional[DecodedImage]]:
+    """
+    Cached blur + detect_image_bytes_v2 for an upload.
+    Returns (result, blurred image); the image is None on a cache hit (nothing was decoded).
+    """
+    # Same upload + same parameters -> reuse the previous result
+    key, result = await run_io(_cache_lookup, contents, endpoint="detect-v2", conf_thresh=DETECT_CONF_THRESH,
+                               k_colors=DETECT_K_COLORS, classifier_threshold=CLASSIFIER_THRESHOLD,
+                               combined_threshold=COMBINED_THRESHOLD, max_side=MAX_WORKING_SIDE,
+                               models=model_set_version(), clip_encoder=CLIP_ENCODER)
+    if result is not None:
+        return result, None
+
+    # Blur faces and run detection off the event loop
+    result, blurred = await run_cpu(_blur_and_detect_v2, contents)
+    await run_io(get_detection_cache().set, key, result)
+    return result, blurred
+
+
+def _validate_upload(file: UploadFile, contents: bytes) -> Optional[JSONResponse]:
+    allowed_ext = (".jpg", ".png")
+    if not file.filename.lower().endswith(allowed_ext):
+        return JSONResponse(status_code=400, content={"error": "Only .jpg and .png images are allowed."})
+    if not contents:
+        return JSONResponse(status_code=400, content={"error": "Empty file"})
+    return None
+
 
 @app.get("/")
 def root():
@@ -60,11 +166,15 @@ async def detect(file: UploadFile = File(...)):
     if not contents:
         return JSONResponse(status_code=400, content={"error": "Empty file"})
 
-    # Blur faces in the image
-    blurred_bytes = blur_faces(contents)
+    # Same upload + same parameters -> reuse the previous result
+    key, result = await run_io(_cache_lookup, contents, endpoint="detect", conf_thresh=DETECT_CONF_THRESH,
+                               k_colors=DETECT_K_COLORS, max_side=MAX_WORKING_SIDE, models=model_set_version())
+    if result is not None:
+        return result
 
-    # Run detection on blurred image
-    result = detect_image_bytes(blurred_bytes, conf_thresh=0.25)
+    # Blur faces and run detection off the event loop
+    result = await run_cpu(_blur_and_detect, contents)
+    await run_io(get_detection_cache().set, key, result)
     return result
 
 # New detection endpoint using updated detection function
@@ -84,14 +194,86 @@ async def detect(file: UploadFile = File(...)):
     if not contents:
         return JSONResponse(status_code=400, content={"error": "Empty file"})
 
-    # Blur faces in the image
-    blurred_bytes = blur_faces(contents)
-
-    # Run detection on blurred image
-    result = detect_image_bytes_v2(blurred_bytes, conf_thresh=0.25)
+    result, _ = await _detect_v2_cached(contents)
     return result
 
 
+def _ndjson(stage: str, data: Any) -> str:
+    return json.dumps({"stage": stage, "data": data}) + "\n"
+
+
+async def _outfit_stream(result: Dict[str, Any], occasion: str, excluded: set, image=None):
+    """Yield one NDJSON line per pipeline stage as soon as it is ready (image: pixels for crop retrieval)."""
+    yield _ndjson("detections", result)
+
+    detections = result.get("refined_detections", [])
+    person_regions = result.get("person_regions", [])
+
+    # LLM analysis and ML retrieval don't depend on each other -> run them concurrently
+    analysis_task = asyncio.create_task(
+        analyze_outfit_async(detections=result, person_regions=person_regions, occasion=None))
+    ml_task = asyncio.create_task(run_cpu(retrieve_similar_items, detections, image=image))
+    try:
+        analysis = {}
+        try:
+            analysis = await analysis_task
+            yield _ndjson("analysis", analysis)
+        except Exception as e:
+            yield _ndjson("error", {"stage": "analysis", "error": str(e)})
+
+        try:
+            ml_items = await ml_task
+        except Exception as e:
+            ml_items = []
+            yield _ndjson("error", {"stage": "retrieval", "error": str(e)})
+
+        recs = generate_hybrid_recommendations(
+            detections=detections,
+            person_regions=person_regions,
+            occasion=occasion,
+            llm_suggestions=analysis.get("llm_suggested_additions", []),
+            exclude_previous=excluded,
+            ml_items=ml_items,
+        )
+        yield _ndjson("recommendations", recs)
+
+        try:
+            enhanced = await enhance_recommendation_async(result, occasion, recs)
+            yield _ndjson("enhanced", enhanced)
+        except Exception as e:
+            yield _ndjson("error", {"stage": "enhance", "error": str(e)})
+
+        yield _ndjson("done", None)
+    finally:
+        # client went away mid-stream: don't leave work running
+        for task in (analysis_task, ml_task):
+            if not task.done():
+                task.cancel()
+
+
+@app.post("/outfit")
+async def outfit(file: UploadFile = File(...), occasion: str = Form("casual"),
+                 exclude_previous: Optional[str] = Form(None)):
+    """
+    End-to-end pipeline in one round trip: blur -> detect -> analyze -> recommend -> enhance.
+    Streams NDJSON, one line per stage as soon as it is ready:
+        {"stage": "detections" | "analysis" | "recommendations" | "enhanced" | "error" | "done", "data": ...}
+    exclude_previous is a comma-separated list of item labels.
+    """
+    contents = await file.read()
+    error = _validate_upload(file, contents)
+    if error is not None:
+        return error
+
+    # detection runs before the stream opens so overload still maps to a 503
+    result, blurred = await _detect_v2_cached(contents)
+    excluded = {i.strip().lower() for i in (exclude_previous or "").split(",") if i.strip()}
+    # crop from the already decoded, blurred pixels; on a cache hit only the upload is at hand
+    image = blurred if blurred is not None else contents
+    return StreamingResponse(_outfit_stream(result, occasion or "casual", excluded, image=image),
+                             media_type="application/x-ndjson")
+
+
 
 # Request model for analysis
 class AnalyzeRequest(BaseModel):
@@ -106,7 +288,7 @@ async def analyze_image(req: AnalyzeRequest):
     Analyze the outfit using LLM.
     """
     # LLM analysis (no occasion yet)
-    analysis = analyze_outfit(detections=req.detections, person_regions=req.person_regions, occasion=None)
+    analysis = await analyze_outfit_async(detections=req.detections, person_regions=req.person_regions, occasion=None)
 
     return {"analysis": analysis}
 
@@ -130,7 +312,8 @@ async def recommend(req: RecommendRequest):
         llm_suggestions = analysis.get("llm_suggested_additions", [])
     # else, you could re-run analyze_outfit here
 
-    recs = generate_hybrid_recommendations(
+    recs = await run_process(
+        generate_hybrid_recommendations,
         detections=req.detections.get("detections", []),
         person_regions=req.person_regions or req.detections.get("person_regions", []),
         occasion=req.occasion,
@@ -139,7 +322,7 @@ async def recommend(req: RecommendRequest):
     )
 
     # Enhance with LLM to produce final_description
-    enhanced = enhance_recommendation(req.detections, req.occasion, recs)
+    enhanced = await enhance_recommendation_async(req.detections, req.occasion, recs)
 
     return {"hybrid_recommendations": recs, "enhanced": enhanced}
 
@@ -148,4 +331,66 @@ async def recommend(req: RecommendRequest):
 @app.get("/health")
 def health_check():
     """Health check endpoint."""
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+# Event-loop probe: async, so it is answered on the loop itself. The sync /health also waits
+# for a threadpool slot, which mixes threadpool contention into it. bench/loadgen.py reads this as loop lag
+@app.get("/ping")
+async def ping():
+    return {"status": "ok"}
+
+
+# Readiness check (point the load balancer / rolling deploy at this, not /health)
+@app.get("/ready")
+def ready_check():
+    """503 until every required model is loaded and warmed (or left to lazy loading); per-model status and timings."""
+    registry = get_registry()
+    body = {"ready": registry.ready(), "models": registry.status()}
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=body)
+
+
+# Result cache metrics
+@app.get("/cache-stats")
+def cache_stats():
+    """Hit/miss counters of the detection result cache and the LLM response cache."""
+    return {"detections": get_detection_cache().stats(), "llm": llm_cache_stats()}
+
+
+@app.get("/executor-stats")
+def executor_stats_endpoint():
+    """Queue depth / rejections per execution lane."""
+    return executor_stats()
+
+
+@app.get("/upload-stats")
+def upload_stats():
+    """Write-behind upload persistence: queued / written / dropped / sampled-out / retention deletes."""
+    return upload_store_stats()
+
+
+@app.get("/fusion-stats")
+def fusion_stats_endpoint():
+    """Ensemble boxes before / after cross-model fusion and the crop operations it saved."""
+    return fusion_stats()
+
+
+@app.get("/prompt-stats")
+def prompt_stats():
+    """Bytes / estimated tokens sent to the LLM before and after compaction."""
+    return compaction_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape target: per-stage latency histograms / errors + the stats endpoints as gauges."""
+    uploads = {s["directory"]: s for s in upload_store_stats()["stores"]}
+    body = render_prometheus({
+        "cache_detections": get_detection_cache().stats(),
+        "cache_llm": llm_cache_stats(),
+        "executor": executor_stats(),
+        "upload": uploads,
+        "fusion": fusion_stats(),
+        "prompt": compaction_stats(),
+    })
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
@@ -0,0 +1,97 @@
+"""
+Benchmark: vectorized dominant-color engine (utils/colors.py) vs the old
+per-crop sklearn KMeans path.
+
+Usage (from backend/):
+    python scripts/bench_colors.py --crops 12 --repeats 5
+
+Crops are synthetic garment-like patches (two main colours + noise) at
+realistic detection sizes, plus the three person regions of a full-body box.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import cv2
+from sklearn.cluster import KMeans
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.colors import dominant_colors, dominant_colors_batch  # noqa: E402
+
+
+def sklearn_dominant_colors(np_img, k=2, resize=150):
+    """Reference: the previous get_dominant_colors implementation."""
+    img_rgb = cv2.cvtColor(np_img, cv2.COLOR_BGR2RGB)
+    h, w = img_rgb.shape[:2]
+    if max(h, w) > resize:
+        scale = resize / max(h, w)
+        img_rgb = cv2.resize(img_rgb, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    pixels = img_rgb.reshape(-1, 3).astype(float)
+    k_use = min(k, max(1, min(pixels.shape[0], 5)))
+    kmeans = KMeans(n_clusters=k_use, random_state=0, n_init="auto")
+    kmeans.fit(pixels)
+    counts = np.bincount(kmeans.labels_)
+    return [tuple(map(int, kmeans.cluster_centers_[i])) for i in counts.argsort()[::-1]]
+
+
+def make_crops(n, seed):
+    rng = np.random.default_rng(seed)
+    sizes = [(180, 120), (320, 240), (480, 300), (640, 420), (900, 600)]
+    crops = []
+    for i in range(n):
+        h, w = sizes[i % len(sizes)]
+        c1, c2 = rng.integers(0, 256, size=(2, 3))
+        img = np.empty((h, w, 3), dtype=np.float32)
+        split = int(h * rng.uniform(0.55, 0.8))
+        img[:split] = c1
+        img[split:] = c2
+        img += rng.normal(0, 12, size=img.shape)
+        crops.append(np.clip(img, 0, 255).astype(np.uint8))
+    # person regions (top / bottom / shoes) of one large box
+    person = crops[-1] if crops else np.zeros((900, 600, 3), np.uint8)
+    H = person.shape[0]
+    crops += [person[: int(H * 0.45)], person[int(H * 0.45): int(H * 0.8)], person[int(H * 0.8):]]
+    return crops
+
+
+def timed(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--crops", type=int, default=12, help="detection crops per image")
+    ap.add_argument("--k", type=int, default=2)
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    crops = make_crops(args.crops, args.seed)
+    print(f"[INFO] {len(crops)} crops, k={args.k}, best of {args.repeats}")
+
+    t_sk, ref = timed(lambda: [sklearn_dominant_colors(c, k=args.k) for c in crops], args.repeats)
+    t_one, _ = timed(lambda: [dominant_colors(c, k=args.k) for c in crops], args.repeats)
+    t_batch, new = timed(lambda: dominant_colors_batch(crops, k=args.k), args.repeats)
+
+    primary_err = [np.abs(np.subtract(r[0], n[0])).max() for r, n in zip(ref, new)]
+    same_order = sum(
+        all(np.abs(np.subtract(rc, nc)).max() <= 8 for rc, nc in zip(r, n)) for r, n in zip(ref, new)
+    )
+
+    print(f"sklearn KMeans per crop : {t_sk * 1000:8.1f} ms")
+    print(f"numpy engine per crop   : {t_one * 1000:8.1f} ms  ({t_sk / t_one:5.1f}x)")
+    print(f"numpy engine batched    : {t_batch * 1000:8.1f} ms  ({t_sk / t_batch:5.1f}x)")
+    print(f"primary color max abs diff (RGB): {max(primary_err)}")
+    print(f"crops with matching primary/secondary order (±8): {same_order}/{len(crops)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: face-detection backends of utils/face_blur.py against MTCNN.
+
+For every image in a local sample directory, runs the reference backend
+(MTCNN at full resolution, i.e. the previous and default blur_faces behaviour) and
+each candidate backend at --max-side (or at the side given as name@side), then
+reports per-image latency (mean / p50 / p95) and recall / precision of the
+candidate boxes against the reference boxes (IoU >= --iou). The default candidates
+include mtcnn@640, the recall FACE_MTCNN_MAX_SIDE=640 would give up.
+
+Usage (from backend/):
+    python scripts/bench_face_blur.py --images ../samples/faces
+    python scripts/bench_face_blur.py --images ../samples/faces --backends mtcnn@480,yunet@0,haar
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.face_blur import FACE_DETECT_MAX_SIDE, _BACKENDS  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def load_images(directory, limit):
+    paths = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTS))
+    if limit:
+        paths = paths[:limit]
+    return [(os.path.basename(p), np.array(Image.open(p).convert("RGB"))) for p in paths]
+
+
+def iou(a, b):
+    ax1, ay1, ax2, ay2 = a[0], a[1], a[0] + a[2], a[1] + a[3]
+    bx1, by1, bx2, by2 = b[0], b[1], b[0] + b[2], b[1] + b[3]
+    iw, ih = max(0, min(ax2, bx2) - max(ax1, bx1)), max(0, min(ay2, by2) - max(ay1, by1))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match(ref, pred, thresh):
+    """Greedy one-to-one matching; returns the number of reference boxes found."""
+    used, hits = set(), 0
+    for r in ref:
+        best, best_j = 0.0, None
+        for j, p in enumerate(pred):
+            if j not in used:
+                v = iou(r, p)
+                if v > best:
+                    best, best_j = v, j
+        if best_j is not None and best >= thresh:
+            used.add(best_j)
+            hits += 1
+    return hits
+
+
+def run(backend, images, repeats):
+    backend.detect(images[0][1])  # warm-up
+    boxes, times = [], []
+    for _, img in images:
+        best = float("inf")
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            out = backend.detect(img)
+            best = min(best, time.perf_counter() - t0)
+        boxes.append(out)
+        times.append(best * 1000)
+    return boxes, np.array(times)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", required=True, help="directory with sample photos")
+    ap.add_argument("--backends", default="mtcnn@640,yunet,haar", help="comma-separated name[@max_side]")
+    ap.add_argument("--max-side", type=int, default=FACE_DETECT_MAX_SIDE)
+    ap.add_argument("--iou", type=float, default=0.4)
+    ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--repeats", type=int, default=3)
+    args = ap.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        raise SystemExit(f"no images found in {args.images}")
+    print(f"[INFO] {len(images)} images, default detection side {args.max_side}px")
+
+    ref_boxes, ref_ms = run(_BACKENDS["mtcnn"](max_side=0), images, args.repeats)
+    n_ref = sum(len(b) for b in ref_boxes)
+    print(f"{'backend':<18} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8} {'recall':>7} {'precision':>9}")
+    print(f"{'mtcnn@full':<18} {ref_ms.mean():8.1f} {np.percentile(ref_ms, 50):8.1f} "
+          f"{np.percentile(ref_ms, 95):8.1f} {1.0:8.2f} {'ref':>7} {'ref':>9}")
+
+    for spec in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        name, _, side = spec.partition("@")
+        max_side = int(side) if side else args.max_side
+        label = f"{name}@{max_side or 'full'}"
+        try:
+            backend = _BACKENDS[name](max_side=max_side)
+        except Exception as e:
+            print(f"[WARN] skipping {label}: {e}")
+            continue
+        boxes, ms = run(backend, images, args.repeats)
+        hits = sum(match(r, p, args.iou) for r, p in zip(ref_boxes, boxes))
+        n_pred = sum(len(b) for b in boxes)
+        recall = hits / n_ref if n_ref else 1.0
+        precision = hits / n_pred if n_pred else 1.0
+        print(f"{label:<18} {ms.mean():8.1f} {np.percentile(ms, 50):8.1f} {np.percentile(ms, 95):8.1f} "
+              f"{ref_ms.mean() / ms.mean():8.2f} {recall:7.3f} {precision:9.3f}")
+        missed = [fname for (fname, _), r, p in zip(images, ref_boxes, boxes) if match(r, p, args.iou) < len(r)]
+        if missed:
+            print(f"    missed faces in: {', '.join(missed[:10])}{' ...' if len(missed) > 10 else ''}")
+
+
+if __name__ == "__main__":
+    main()
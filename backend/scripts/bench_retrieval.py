@@ -0,0 +1,94 @@
+"""
+Benchmark: recall@k vs latency of the FAISS catalog index against brute force.
+
+Brute force is an exact NumPy matrix product over the stored embeddings
+(kind "exact" is the same search, chunked over the memmap).
+For each nprobe (IVF) or efSearch (HNSW) setting, reports recall@k of the
+approximate index against the exact top-k and per-query latency.
+
+Usage (from backend/):
+    python scripts/bench_retrieval.py --index-dir ./catalog_index --k 10
+    python scripts/bench_retrieval.py --synthetic 50000 --dim 512 --kind ivf
+Queries are catalog vectors plus noise (a crop never matches its product exactly).
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.retrieval import INDEX_KINDS, CatalogIndex, _normalize, create_catalog_index  # noqa: E402
+
+
+def synthetic(n, dim, seed):
+    """Clustered unit vectors, roughly like embeddings of a product catalog."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 50), dim)).astype(np.float32)
+    return _normalize(centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32))
+
+
+def timed_search(index, queries, k):
+    index.search(queries[:1], k)  # warm-up
+    t0 = time.perf_counter()
+    _, ids = index.search(queries, k)
+    return ids, (time.perf_counter() - t0) * 1000 / len(queries)
+
+
+def recall(approx, exact):
+    return float(np.mean([len(set(a[a >= 0]) & set(e)) / len(e) for a, e in zip(approx, exact)]))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index-dir", help="index built by build_catalog_index.py")
+    ap.add_argument("--synthetic", type=int, default=0, help="benchmark N synthetic vectors instead")
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--kind", choices=INDEX_KINDS, default="hnsw", help="index kind for --synthetic")
+    ap.add_argument("--store-dtype", choices=("float16", "float32"), default="float16")
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--sweep", default="1,4,8,16,32,64,128", help="nprobe / efSearch values")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    if args.synthetic:
+        args.index_dir = tempfile.mkdtemp(prefix="bench_retrieval_")
+        t0 = time.perf_counter()
+        create_catalog_index(args.index_dir, synthetic(args.synthetic, args.dim, args.seed),
+                             [{"item_id": i} for i in range(args.synthetic)], kind=args.kind, store_dtype=args.store_dtype)
+        print(f"[INFO] built {args.kind} over {args.synthetic} vectors in {time.perf_counter() - t0:.1f}s")
+    elif not args.index_dir:
+        raise SystemExit("pass --index-dir or --synthetic N")
+    catalog = CatalogIndex.load(args.index_dir)
+    embs = catalog.store.rows()  # ground truth from the stored (possibly float16) rows
+
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, len(embs), args.queries)
+    queries = _normalize(embs[picks] + 0.05 * rng.standard_normal((args.queries, embs.shape[1])).astype(np.float32))
+
+    t0 = time.perf_counter()
+    exact = np.argsort(-(queries @ embs.T), axis=1)[:, :args.k]
+    brute_ms = (time.perf_counter() - t0) * 1000 / args.queries
+    kind = catalog.config.get("kind")
+    print(f"{kind} index, {len(embs)} items, dim {embs.shape[1]}, {args.queries} queries, k={args.k}")
+    print(f"{'setting':<14} {'recall@k':>9} {'ms/query':>9} {'speedup':>8}")
+    print(f"{'brute force':<14} {1.0:9.3f} {brute_ms:9.3f} {1.0:8.2f}")
+
+    knob = {"ivf": "nprobe", "hnsw": "efSearch"}.get(kind)
+    values = [int(v) for v in args.sweep.split(",")] if knob else [None]
+    for v in values:
+        if knob == "nprobe":
+            catalog.set_search_params(nprobe=v)
+        elif knob == "efSearch":
+            catalog.set_search_params(ef_search=max(v, args.k))
+        ids, ms = timed_search(catalog, queries, args.k)
+        name = f"{knob}={v}" if knob else "exact"
+        print(f"{name:<14} {recall(ids, exact):9.3f} {ms:9.3f} {brute_ms / ms:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
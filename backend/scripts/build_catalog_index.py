@@ -0,0 +1,112 @@
+"""
+Build the FAISS catalog index used by utils/retrieval.py.
+
+Embeds every product image of a local catalog with the classifier's image
+encoder (utils.classify.image_embeddings, i.e. FashionCLIP / CLIP) and writes
+the memory-mapped store/ (utils.embedding_store) + index.faiss + index.json to --out.
+With --append, new products are added to an existing index directory without
+rewriting the store.
+
+Metadata (optional --meta, JSONL or CSV) has one row per product with an
+"image" column (path relative to --catalog) plus any of item_id, label / title,
+category, url, price. Without --meta every image becomes an item whose label is
+its file name and whose category is its parent folder.
+
+Usage (from backend/):
+    python scripts/build_catalog_index.py --catalog ../catalog --out ./catalog_index --kind hnsw
+    python scripts/build_catalog_index.py --catalog ../catalog --meta ../catalog/products.csv --kind ivf --nlist 256
+    python scripts/build_catalog_index.py --catalog ../new_arrivals --append
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.classify import image_embeddings  # noqa: E402
+from utils.retrieval import INDEX_KINDS, append_items, create_catalog_index, encoder_config  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_meta(catalog, meta_path):
+    if meta_path:
+        with open(meta_path, encoding="utf-8") as f:
+            if meta_path.endswith(".csv"):
+                rows = list(csv.DictReader(f))
+            else:
+                rows = [json.loads(line) for line in f if line.strip()]
+        return [r for r in rows if r.get("image")]
+    rows = []
+    for root, _, files in os.walk(catalog):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTS):
+                rel = os.path.relpath(os.path.join(root, name), catalog)
+                stem = os.path.splitext(name)[0]
+                rows.append({
+                    "item_id": rel,
+                    "image": rel,
+                    "label": stem.replace("_", " ").replace("-", " "),
+                    "category": os.path.basename(root) if root != catalog else "",
+                })
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--catalog", required=True, help="catalog image root")
+    ap.add_argument("--meta", help="optional products JSONL / CSV with an 'image' column")
+    ap.add_argument("--out", default=os.getenv("RETRIEVAL_INDEX_DIR", "./catalog_index"))
+    ap.add_argument("--kind", choices=INDEX_KINDS, default="hnsw")
+    ap.add_argument("--nlist", type=int, default=None, help="IVF lists (default 4*sqrt(n))")
+    ap.add_argument("--hnsw-m", type=int, default=32)
+    ap.add_argument("--ef-construction", type=int, default=200)
+    ap.add_argument("--store-dtype", choices=("float16", "float32"), default="float16")
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--append", action="store_true", help="add to the existing index in --out")
+    args = ap.parse_args()
+
+    rows = load_meta(args.catalog, args.meta)
+    if not rows:
+        raise SystemExit(f"no catalog images found under {args.catalog}")
+    print(f"[INFO] embedding {len(rows)} catalog images")
+
+    kept, chunks = [], []
+    t0 = time.perf_counter()
+    for start in range(0, len(rows), args.batch_size):
+        batch, imgs = [], []
+        for row in rows[start:start + args.batch_size]:
+            try:
+                imgs.append(Image.open(os.path.join(args.catalog, row["image"])).convert("RGB"))
+                batch.append(row)
+            except Exception as e:
+                print(f"[WARN] skipping {row['image']}: {e}")
+        if imgs:
+            chunks.append(image_embeddings(imgs, batch_size=args.batch_size))
+            kept.extend(batch)
+        done = start + len(rows[start:start + args.batch_size])
+        print(f"[INFO] {done}/{len(rows)} ({done / (time.perf_counter() - t0):.1f} img/s)", end="\r")
+    print()
+
+    import numpy as np
+    embs = np.concatenate(chunks).astype("float32")
+    if args.append:
+        ids = append_items(args.out, embs, kept)
+        print(f"[OK] appended {len(ids)} items -> {args.out} (now {ids.stop})")
+        return
+    config = {**encoder_config(), "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    build_kwargs = {"nlist": args.nlist} if args.kind == "ivf" else {}
+    if args.kind == "hnsw":
+        build_kwargs = {"hnsw_m": args.hnsw_m, "ef_construction": args.ef_construction}
+    create_catalog_index(args.out, embs, kept, kind=args.kind, store_dtype=args.store_dtype,
+                         config=config, **build_kwargs)
+    print(f"[OK] {len(kept)} items -> {args.out} ({args.kind}, dim {embs.shape[1]}, {args.store_dtype} store)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Parity check: exported / quantized CLIP image encoders vs the float model.
+
+Embeds the same crops with utils.classify.float_image_embeddings (the current
+float path, CLIPProcessor / FashionCLIP preprocessing) and with every encoder in
+--encoders (utils.clip_encoder, NumPy preprocessing). Scores all of them against
+the FINE_LABELS bank and reports per encoder:
+- top-1 agreement with the float model, and how often the float top-1 is in its top-3
+- mean cosine similarity between the two embeddings of a crop
+- ms per crop at --batch-size and the speedup over the float model
+Exits with status 1 if any encoder's top-1 agreement is below --min-agreement.
+
+Usage (from backend/):
+    python scripts/check_clip_parity.py --images ../samples/crops
+    python scripts/check_clip_parity.py --encoders onnx,onnx-int8,torch-int8 --batch-size 8
+Without --images, crops are cut from the synthetic bench corpus (smoke test only;
+real garment crops are what the agreement number should be measured on).
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "bench"))
+from utils.classify import classify_embeddings, float_image_embeddings  # noqa: E402
+from utils.clip_encoder import ENCODER_KINDS, load_encoder  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_crops(directory, limit, seed):
+    if directory:
+        paths = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTS))
+        return [Image.open(p).convert("RGB") for p in paths[:limit]]
+    from corpus import ensure_corpus
+    rng = np.random.default_rng(seed)
+    crops = []
+    for p in ensure_corpus(os.path.join(BACKEND_DIR, "..", "bench_corpus")):
+        img = Image.open(p).convert("RGB")
+        w, h = img.size
+        for _ in range(4):  # detection-sized boxes of varying aspect
+            cw, ch = int(w * rng.uniform(0.15, 0.5)), int(h * rng.uniform(0.15, 0.5))
+            x, y = int(rng.integers(0, w - cw)), int(rng.integers(0, h - ch))
+            crops.append(img.crop((x, y, x + cw, y + ch)))
+    return crops[:limit]
+
+
+def timed(fn, crops, batch_size):
+    fn(crops[:batch_size], batch_size=batch_size)  # warm-up
+    t0 = time.perf_counter()
+    embs = fn(crops, batch_size=batch_size)
+    return embs, (time.perf_counter() - t0) * 1000 / len(crops)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", help="directory of garment crops")
+    ap.add_argument("--limit", type=int, default=200)
+    ap.add_argument("--encoders", default="onnx,onnx-int8,torch-int8",
+                    help="comma-separated subset of " + ", ".join(k for k in ENCODER_KINDS if k != "torch"))
+    ap.add_argument("--onnx-path", default=None, help="default CLIP_ONNX_PATH")
+    ap.add_argument("--batch-size", type=int, default=16)
+    ap.add_argument("--min-agreement", type=float, default=0.95)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    crops = load_crops(args.images, args.limit, args.seed)
+    ref, ref_ms = timed(float_image_embeddings, crops, args.batch_size)
+    ref_top = [r[0][0] for r in classify_embeddings(ref, top_k=1)]
+    print(f"[INFO] {len(crops)} crops, batch {args.batch_size}, {len(ref_top)} float top-1 labels")
+    print(f"{'encoder':<12} {'top-1 agr':>9} {'in top-3':>9} {'cosine':>7} {'ms/crop':>8} {'speedup':>8}")
+    print(f"{'float':<12} {1.0:9.3f} {1.0:9.3f} {1.0:7.4f} {ref_ms:8.2f} {1.0:8.2f}")
+
+    failed = False
+    for kind in [k.strip() for k in args.encoders.split(",") if k.strip()]:
+        try:
+            encoder = load_encoder(kind, args.onnx_path)
+        except Exception as e:
+            print(f"{kind:<12} skipped: {e}")
+            continue
+        embs, ms = timed(encoder.encode, crops, args.batch_size)
+        top3 = classify_embeddings(embs, top_k=3)
+        agree = float(np.mean([t[0][0] == r for t, r in zip(top3, ref_top)]))
+        in_top3 = float(np.mean([r in [lab for lab, _ in t] for t, r in zip(top3, ref_top)]))
+        ref_n = ref / np.linalg.norm(ref, axis=1, keepdims=True)
+        cosine = float(np.mean(np.sum(ref_n * embs, axis=1)))
+        failed |= agree < args.min_agreement
+        print(f"{kind:<12} {agree:9.3f} {in_top3:9.3f} {cosine:7.4f} {ms:8.2f} {ref_ms / ms:8.2f}")
+    if failed:
+        raise SystemExit(f"[FAIL] top-1 agreement below {args.min_agreement}")
+    print("[OK] parity")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Import-time budget check for the API module.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and fails
+(exit code 1) when
+- any heavy ML/CV package is imported at module import time, or
+- the cumulative import time of `main` exceeds the budget.
+
+Usage (from backend/):
+    python scripts/check_import_time.py --budget-ms 1500
+"""
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# must only be imported on first use / registry load
+HEAVY_MODULES = ("torch", "torchvision", "ultralytics", "tensorflow", "transformers",
+                 "fashion_clip", "sklearn", "cv2", "mtcnn", "faiss", "onnxruntime")
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module: str):
+    """Return [(module_name, self_us, cumulative_us, depth)] from -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        raise SystemExit(f"[FAIL] `import {module}` raised")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--module", default="main")
+    ap.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1500")))
+    ap.add_argument("--top", type=int, default=10, help="show the N most expensive imports")
+    args = ap.parse_args()
+
+    rows = measure(args.module)
+    total_us = next((cum for name, _, cum, _ in rows if name == args.module), None)
+    if total_us is None:
+        raise SystemExit(f"[FAIL] no importtime entry for {args.module}")
+
+    heavy = sorted({name.split(".")[0] for name, *_ in rows if name.split(".")[0] in HEAVY_MODULES})
+
+    print(f"[INFO] import {args.module}: {total_us / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"[INFO] top {args.top} by cumulative time:")
+    for name, _, cum, depth in sorted((r for r in rows if r[3] <= 1), key=lambda r: -r[2])[:args.top]:
+        print(f"    {cum / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if heavy:
+        print(f"[FAIL] heavy modules imported eagerly: {', '.join(heavy)}")
+        failed = True
+    if total_us / 1000 > args.budget_ms:
+        print(f"[FAIL] import time {total_us / 1000:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("[OK] import budget respected")
+
+
+if __name__ == "__main__":
+    main()
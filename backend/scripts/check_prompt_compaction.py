@@ -0,0 +1,118 @@
+"""
+Check: the LLM prompt summary of a detect_image_bytes_v2 result lists every object once.
+
+Runs images through detect_image_bytes_v2 and utils.prompt_compactor and verifies, per image:
+- no raw detection that was merged into a fused box (its "fused_ids") comes back as a
+  separate low_conf item
+- every filtered / refined detection is kept, raw detections are kept only when no later
+  stage and no fused box covers them
+Prints items / tokens before and after compaction. Exits with status 1 on any violation.
+
+Usage (from backend/):
+    python scripts/check_prompt_compaction.py --images ../samples
+    python scripts/check_prompt_compaction.py --synthetic
+Without --images the synthetic bench corpus is used. --synthetic skips the models and
+builds v2-shaped results from jittered two-model boxes through utils.box_fusion.
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "bench"))
+from utils.box_fusion import fuse_detections  # noqa: E402
+from utils.prompt_compactor import _merged_detections, compact_detections  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_images(directory, limit):
+    if directory is None:
+        from corpus import ensure_corpus
+        paths = ensure_corpus(os.path.join(BACKEND_DIR, "..", "bench_corpus"))
+    else:
+        paths = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTS))
+    out = []
+    for p in paths[:limit]:
+        with open(p, "rb") as f:
+            out.append((os.path.basename(p), f.read()))
+    return out
+
+
+def synthetic_result(rng):
+    """detect_image_bytes_v2-shaped result: two models finding the same garments, slightly apart."""
+    raw = []
+    for label in rng.choice(["shirt", "pants", "shoes", "jacket", "bag"], size=4, replace=False):
+        x1, y1 = (int(v) for v in rng.integers(0, 400, 2))
+        box = np.array([x1, y1, x1 + int(rng.integers(80, 200)), y1 + int(rng.integers(80, 200))])
+        for model in ("fashion", "general")[:int(rng.integers(1, 3))]:
+            raw.append({"source_model": model, "label": str(label),
+                        "bbox": [int(v) for v in box + rng.integers(-6, 7, 4)],
+                        "confidence": round(float(rng.uniform(0.1, 0.9)), 4)})
+    fused = fuse_detections(raw, method="wbf", iou_thresh=0.55)
+    filtered = [d for d in fused if d["confidence"] >= 0.3]
+    refined = [dict(d, refined_label=d["label"], refined_confidence=d["confidence"],
+                    colors=[{"rgb": [120, 30, 30], "hex": "#781e1e"}]) for d in filtered]
+    return {"raw_detections": raw, "filtered_detections": filtered, "refined_detections": refined,
+            "person_regions": []}
+
+
+def _key(d):
+    return d.get("source_model"), (d.get("label") or "").lower(), tuple(d.get("bbox") or ())
+
+
+def violations(result):
+    raw = result.get("raw_detections") or []
+    later = (result.get("filtered_detections") or []) + (result.get("refined_detections") or [])
+    members = {i for d in later for i in d.get("fused_ids") or ()}
+    later_keys = {_key(d) for d in later}
+    expected = later_keys | {_key(d) for i, d in enumerate(raw) if i not in members}
+
+    merged = _merged_detections(result)
+    kept = {_key(d) for _, d in merged}
+    raw_ids = {id(d): i for i, d in enumerate(raw)}
+    errors = []
+    for _, d in merged:
+        if raw_ids.get(id(d)) in members and _key(d) not in later_keys:
+            errors.append(f"fused member {_key(d)} listed as low_conf")
+    if kept != expected:
+        errors.append(f"kept {len(kept)} detections, expected {len(expected)}")
+    return errors
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", help="directory of real test images")
+    ap.add_argument("--limit", type=int, default=24)
+    ap.add_argument("--synthetic", action="store_true", help="no models: fused results built from random boxes")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        cases = [(f"synthetic-{i}", synthetic_result(rng)) for i in range(args.limit)]
+    else:
+        from utils.D2 import detect_image_bytes_v2
+        cases = [(name, detect_image_bytes_v2(data)) for name, data in load_images(args.images, args.limit)]
+
+    failed = False
+    print(f"{'image':<24} {'raw':>4} {'fused':>5} {'items':>5} {'tokens':>13}")
+    for name, result in cases:
+        _, stats = compact_detections(result, token_budget=10 ** 6)
+        n_fused = sum("fused_ids" in d for d in result.get("filtered_detections") or [])
+        print(f"{name[:24]:<24} {len(result.get('raw_detections') or []):>4} {n_fused:>5} {stats['items_out']:>5} "
+              f"{stats['tokens_before']:>6}->{stats['tokens_after']:<6}")
+        for err in violations(result):
+            failed = True
+            print(f"  [WARN] {err}")
+    if failed:
+        raise SystemExit("[FAIL] prompt compaction repeats detections")
+    print("[OK] every object listed once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Parity check: ONNX Runtime detector backend vs the PyTorch (ultralytics) models.
+
+For every ensemble member with both a .pt and an ONNX export, runs the same images
+through utils.batching.predict_arrays on each backend and matches boxes greedily
+(same class, IoU >= --iou). Reports per model:
+- recall / precision of the ONNX boxes against the PyTorch boxes
+- mean IoU and mean |confidence difference| of the matched pairs
+- ms per image for both backends
+Exits with status 1 if any model's recall or precision is below --min-agreement.
+
+Usage (from backend/):
+    python scripts/check_yolo_parity.py --images ../samples
+    python scripts/check_yolo_parity.py --images ../samples --int8 --min-agreement 0.9
+Without --images the synthetic bench corpus is used (few objects: smoke test only).
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "bench"))
+from utils.batching import predict_arrays  # noqa: E402
+from utils.box_fusion import iou_matrix  # noqa: E402
+from utils.yolo_onnx import ENSEMBLE, FALLBACK, OnnxYolo, onnx_path  # noqa: E402
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_images(directory, limit):
+    if directory is None:
+        from corpus import ensure_corpus
+        paths = ensure_corpus(os.path.join(BACKEND_DIR, "..", "bench_corpus"))
+    else:
+        paths = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTS))
+    return [np.asarray(Image.open(p).convert("RGB")) for p in paths[:limit]]
+
+
+def match(ref, test, iou_thresh):
+    """Greedy same-class matching by IoU. Returns (matched pairs, n_ref, n_test)."""
+    pairs = []
+    if len(ref["confs"]) and len(test["confs"]):
+        ious = iou_matrix(np.concatenate([ref["boxes"], test["boxes"]]).astype(np.float32))
+        ious = ious[:len(ref["confs"]), len(ref["confs"]):]
+        ious[ref["classes"][:, None] != test["classes"][None, :]] = 0
+        while ious.size and ious.max() >= iou_thresh:
+            i, j = np.unravel_index(ious.argmax(), ious.shape)
+            pairs.append((i, j, float(ious[i, j])))
+            ious[i, :] = 0
+            ious[:, j] = 0
+    return pairs, len(ref["confs"]), len(test["confs"])
+
+
+def timed(model, images, conf):
+    predict_arrays(model, images[:1], conf)  # warm-up
+    out = []
+    t0 = time.perf_counter()
+    for img in images:
+        out += predict_arrays(model, [img], conf)
+    return out, (time.perf_counter() - t0) * 1000 / len(images)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", help="directory of real test images")
+    ap.add_argument("--limit", type=int, default=50)
+    ap.add_argument("--weights", default="./weights")
+    ap.add_argument("--onnx-dir", default=None, help="default YOLO_ONNX_DIR")
+    ap.add_argument("--int8", action="store_true", help="check the .int8.onnx exports")
+    ap.add_argument("--conf", type=float, default=0.25)
+    ap.add_argument("--iou", type=float, default=0.5, help="IoU for a box to count as the same")
+    ap.add_argument("--min-agreement", type=float, default=0.95)
+    args = ap.parse_args()
+
+    from ultralytics import YOLO
+    images = load_images(args.images, args.limit)
+    print(f"[INFO] {len(images)} images, conf {args.conf}, match IoU {args.iou}")
+    print(f"{'model':<10} {'recall':>7} {'precision':>9} {'mean IoU':>9} {'|dconf|':>8} {'torch ms':>9} {'onnx ms':>8}")
+    failed = False
+    for _, stem in ENSEMBLE + (FALLBACK,):
+        pt, onnx_file = os.path.join(args.weights, stem + ".pt"), onnx_path(stem, args.int8, args.onnx_dir)
+        if not (os.path.exists(pt) and os.path.exists(onnx_file)):
+            continue
+        ref, torch_ms = timed(YOLO(pt), images, args.conf)
+        test, onnx_ms = timed(OnnxYolo(onnx_file), images, args.conf)
+        matched = n_ref = n_test = 0
+        ious, dconf = [], []
+        for r, t in zip(ref, test):
+            pairs, nr, nt = match(r, t, args.iou)
+            matched, n_ref, n_test = matched + len(pairs), n_ref + nr, n_test + nt
+            ious += [p[2] for p in pairs]
+            dconf += [abs(float(r["confs"][i]) - float(t["confs"][j])) for i, j, _ in pairs]
+        recall = matched / n_ref if n_ref else 1.0
+        precision = matched / n_test if n_test else 1.0
+        failed |= min(recall, precision) < args.min_agreement
+        print(f"{stem:<10} {recall:7.3f} {precision:9.3f} "
+              f"{np.mean(ious) if ious else 0:9.3f} {np.mean(dconf) if dconf else 0:8.4f} {torch_ms:9.1f} {onnx_ms:8.1f}")
+    if failed:
+        raise SystemExit(f"[FAIL] agreement below {args.min_agreement}")
+    print("[OK] parity")
+
+
+if __name__ == "__main__":
+    main()
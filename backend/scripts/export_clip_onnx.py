@@ -0,0 +1,82 @@
+"""
+Export the CLIP image tower (vision model + visual projection) to ONNX for
+CLIP_ENCODER=onnx / onnx-int8 (utils/clip_encoder.py).
+
+Input "pixel_values" (batch, 3, 224, 224) float32 as produced by
+utils.clip_encoder.preprocess, output "image_embeds" (batch, dim), dynamic batch.
+The hub id goes into the model metadata ("source_model") so the encoder can warn
+when the export does not match the text embeddings classify uses. By default the
+same model as utils.classify is exported: FashionCLIP if fashion_clip is installed,
+else openai/clip-vit-base-patch32.
+--int8 also writes <out stem>.int8.onnx with onnxruntime dynamic quantization
+(8-bit MatMul / Gemm weights).
+
+Usage (from backend/):
+    python scripts/export_clip_onnx.py --int8
+    python scripts/export_clip_onnx.py --model openai/clip-vit-base-patch32 --out ./weights/onnx/clip_image.onnx
+Then check it with scripts/check_clip_parity.py.
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.clip_encoder import CLIP_IMAGE_SIZE, CLIP_ONNX_PATH, FASHION_CLIP_ID, OPENAI_CLIP_ID, int8_path  # noqa: E402
+
+
+def default_model() -> str:
+    try:
+        import fashion_clip  # noqa: F401
+        return FASHION_CLIP_ID
+    except Exception:
+        return OPENAI_CLIP_ID
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=None, help="hub id (default: the model utils.classify loads)")
+    ap.add_argument("--out", default=CLIP_ONNX_PATH)
+    ap.add_argument("--opset", type=int, default=17)
+    ap.add_argument("--int8", action="store_true", help="also write the dynamically quantized model")
+    args = ap.parse_args()
+
+    import onnx
+    import torch
+    from transformers import CLIPModel
+
+    model_id = args.model or default_model()
+    model = CLIPModel.from_pretrained(model_id).eval()
+
+    class ImageTower(torch.nn.Module):
+        def __init__(self, clip):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, pixel_values):
+            return self.clip.get_image_features(pixel_values=pixel_values)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    dummy = torch.zeros(1, 3, CLIP_IMAGE_SIZE, CLIP_IMAGE_SIZE)
+    torch.onnx.export(ImageTower(model), (dummy,), args.out, input_names=["pixel_values"],
+                      output_names=["image_embeds"], opset_version=args.opset,
+                      dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}})
+    meta = {"source_model": model_id, "image_size": str(CLIP_IMAGE_SIZE),
+            "embed_dim": str(model.config.projection_dim)}
+    exported = onnx.load(args.out)
+    onnx.helper.set_model_props(exported, meta)
+    onnx.save(exported, args.out)
+    print(f"[OK] {model_id} image tower -> {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB)")
+
+    if args.int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        q = int8_path(args.out)
+        quantize_dynamic(args.out, q, weight_type=QuantType.QInt8)
+        quantized = onnx.load(q)
+        onnx.helper.set_model_props(quantized, meta)
+        onnx.save(quantized, q)
+        print(f"[OK] {args.out} -> {q} ({os.path.getsize(q) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
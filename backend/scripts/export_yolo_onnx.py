@@ -0,0 +1,68 @@
+"""
+Export the YOLO ensemble weights to ONNX for DETECTOR_BACKEND=onnx (utils/yolo_onnx.py).
+
+For every present weights file (YoloF.pt, yolov8s.pt, yolov8n.pt) writes
+<out>/<stem>.onnx via ultralytics export (dynamic batch, graph simplified, class
+names kept in the model metadata) and, with --int8, <out>/<stem>.int8.onnx via
+onnxruntime.quantization.quantize_dynamic (8-bit weights, activations quantized at
+run time - no calibration set needed). Use YOLO_ONNX_INT8=1 to serve the INT8 files
+and scripts/check_yolo_parity.py to check them against the PyTorch models first.
+
+Usage (from backend/):
+    python scripts/export_yolo_onnx.py
+    python scripts/export_yolo_onnx.py --int8 --imgsz 640 --out ./weights/onnx
+"""
+
+import os
+import sys
+import shutil
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.yolo_onnx import ENSEMBLE, FALLBACK, YOLO_ONNX_DIR  # noqa: E402
+
+
+def quantize_int8(src: str, dst: str):
+    """Dynamic INT8 quantization, keeping the ultralytics metadata (class names, imgsz)."""
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(src, dst, weight_type=QuantType.QUInt8)
+    meta = {p.key: p.value for p in onnx.load(src, load_external_data=False).metadata_props}
+    model = onnx.load(dst)
+    onnx.helper.set_model_props(model, meta)
+    onnx.save(model, dst)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--weights", default="./weights", help="directory with the .pt files")
+    ap.add_argument("--out", default=YOLO_ONNX_DIR)
+    ap.add_argument("--imgsz", type=int, default=640)
+    ap.add_argument("--opset", type=int, default=17)
+    ap.add_argument("--int8", action="store_true", help="also write <stem>.int8.onnx")
+    args = ap.parse_args()
+
+    from ultralytics import YOLO
+    os.makedirs(args.out, exist_ok=True)
+    exported = 0
+    for _, stem in ENSEMBLE + (FALLBACK,):
+        pt = os.path.join(args.weights, stem + ".pt")
+        if not os.path.exists(pt):
+            print(f"[INFO] {pt} not found, skipping")
+            continue
+        path = YOLO(pt).export(format="onnx", imgsz=args.imgsz, dynamic=True, simplify=True, opset=args.opset)
+        dst = os.path.join(args.out, stem + ".onnx")
+        if os.path.abspath(path) != os.path.abspath(dst):
+            shutil.move(path, dst)
+        print(f"[OK] {pt} -> {dst} ({os.path.getsize(dst) / 1e6:.1f} MB)")
+        if args.int8:
+            q = os.path.join(args.out, stem + ".int8.onnx")
+            quantize_int8(dst, q)
+            print(f"[OK] {dst} -> {q} ({os.path.getsize(q) / 1e6:.1f} MB)")
+        exported += 1
+    if not exported:
+        raise SystemExit(f"no YOLO weights found in {args.weights}")
+
+
+if __name__ == "__main__":
+    main()
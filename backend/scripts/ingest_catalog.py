@@ -0,0 +1,237 @@
+"""
+Bulk, resumable ingest of catalog images into sharded embedding files.
+
+Pipeline:
+- a process pool reads, hashes (sha256), decodes (PIL draft() for JPEG) and
+  downscales every image to CLIP input scale (short side --side), at most
+  2 x workers x batch-size images ahead of the encoder
+- the main process feeds decoded images to utils.classify.image_embeddings in
+  batches of --batch-size (one forward pass per batch)
+- rows are written as shards to --out: shard-NNNNN.npy (float16) + shard-NNNNN.jsonl
+  (metadata incl. sha256); manifest.json is rewritten atomically after each shard
+  and is the checkpoint: a rerun skips every image whose content hash is already
+  in a shard (also duplicate images inside one run)
+- the manifest also records the encoder (CLIP model + CLIP_ENCODER) of the shards;
+  a run embedding with a different one is refused
+- --into-index appends shards not yet merged to a catalog index directory
+  (utils.retrieval.append_items, no store rewrite)
+
+Usage (from backend/):
+    python scripts/ingest_catalog.py --catalog ../catalog --out ../catalog_shards --workers 8
+    python scripts/ingest_catalog.py --catalog ../catalog --out ../catalog_shards --into-index ./catalog_index
+Interrupt at any time; rerunning continues from the last written shard.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from build_catalog_index import load_meta  # noqa: E402
+from utils.retrieval import INDEX_KINDS  # noqa: E402
+
+MANIFEST = "manifest.json"
+
+
+def decode(job):
+    """Worker: (row, path, side) -> (row, sha256, RGB uint8 array | None, error)."""
+    row, path, side = job
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        img = Image.open(io.BytesIO(data))
+        scale = side / min(img.size)
+        if scale < 1:
+            target = (max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale)))
+            img.draft("RGB", target)
+            img = img.convert("RGB").resize(target, Image.BILINEAR, reducing_gap=2.0)
+        else:
+            img = img.convert("RGB")
+        return row, digest, np.asarray(img), None
+    except Exception as e:
+        return row, None, None, str(e)
+
+
+def bounded_imap(pool, fn, jobs, window, workers):
+    """
+    pool.imap over `jobs` in windows of `window` items, in order. Plain imap lets the
+    workers run arbitrarily far ahead of a slower consumer (the encoder), piling
+    decoded images up in memory; here at most two windows are in flight.
+    """
+    chunksize = max(1, window // (4 * workers))
+    pending = pool.map_async(fn, jobs[:window], chunksize)
+    for start in range(window, len(jobs) + window, window):
+        results = pending.get()
+        if start < len(jobs):
+            pending = pool.map_async(fn, jobs[start:start + window], chunksize)
+        yield from results
+
+
+class ShardWriter:
+    """Buffers embedded rows and flushes them as shards + manifest checkpoint."""
+
+    def __init__(self, out_dir, shard_size):
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, MANIFEST)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"version": 1, "dim": None, "count": 0, "shards": []}
+        self.seen = set()
+        for shard in self.manifest["shards"]:
+            with open(os.path.join(out_dir, shard["meta"]), encoding="utf-8") as f:
+                self.seen.update(json.loads(line)["sha256"] for line in f if line.strip())
+        self._embs, self._metas = [], []
+
+    def add(self, embs, metas):
+        self._embs.append(embs)
+        self._metas.extend(metas)
+        if len(self._metas) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        if not self._metas:
+            return
+        embs = np.concatenate(self._embs).astype(np.float16)
+        n = len(self.manifest["shards"])
+        name = f"shard-{n:05d}"
+        np.save(os.path.join(self.out_dir, name + ".npy"), embs)
+        with open(os.path.join(self.out_dir, name + ".jsonl"), "w", encoding="utf-8") as f:
+            for m in self._metas:
+                f.write(json.dumps(m, ensure_ascii=False) + "\n")
+        self._check_encoder()
+        self.manifest["dim"] = int(embs.shape[1])
+        self.manifest["count"] += len(self._metas)
+        self.manifest["shards"].append({"embeddings": name + ".npy", "meta": name + ".jsonl",
+                                        "count": len(self._metas), "merged": False})
+        self.save_manifest()
+        self._embs, self._metas = [], []
+
+    def _check_encoder(self):
+        """Every shard must come from the same embedding space (recorded with the first one)."""
+        from utils.retrieval import encoder_config  # the encoder is loaded by now
+        current = encoder_config()
+        recorded = self.manifest.setdefault("encoder", current)
+        if recorded != current:
+            raise SystemExit(f"{self.out_dir} holds embeddings from {recorded}, this run embeds with {current}; "
+                             f"use a new --out directory")
+
+    def save_manifest(self):
+        tmp = os.path.join(self.out_dir, MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, os.path.join(self.out_dir, MANIFEST))
+
+
+def _load_shard(out_dir, shard):
+    embs = np.load(os.path.join(out_dir, shard["embeddings"])).astype(np.float32)
+    with open(os.path.join(out_dir, shard["meta"]), encoding="utf-8") as f:
+        metas = [json.loads(line) for line in f if line.strip()]
+    return embs, metas
+
+
+def merge_into_index(writer, index_dir, kind):
+    """Append every shard not yet merged to a catalog index directory (created on first use)."""
+    from utils.retrieval import append_items, create_catalog_index, encoder_config
+    pending = [s for s in writer.manifest["shards"] if not s["merged"]]
+    if not pending:
+        return
+    if not os.path.exists(os.path.join(index_dir, "index.json")):
+        loaded = [_load_shard(writer.out_dir, s) for s in pending]
+        embs = np.concatenate([e for e, _ in loaded])
+        create_catalog_index(index_dir, embs, [m for _, ms in loaded for m in ms], kind=kind,
+                             config={**(writer.manifest.get("encoder") or encoder_config()),
+                                     "source": os.path.abspath(writer.out_dir)})
+        for shard in pending:
+            shard["merged"] = True
+        writer.save_manifest()
+        print(f"[INFO] created {kind} index {index_dir} with {len(embs)} rows")
+        return
+    for shard in pending:
+        embs, metas = _load_shard(writer.out_dir, shard)
+        ids = append_items(index_dir, embs, metas)
+        shard["merged"] = True
+        writer.save_manifest()
+        print(f"[INFO] merged {shard['embeddings']} -> {index_dir} (rows {ids.start}..{ids.stop - 1})")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--catalog", required=True, help="catalog image root")
+    ap.add_argument("--meta", help="optional products JSONL / CSV with an 'image' column")
+    ap.add_argument("--out", required=True, help="shard + manifest directory")
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="decode processes")
+    ap.add_argument("--batch-size", type=int, default=64, help="images per encoder forward pass")
+    ap.add_argument("--shard-size", type=int, default=4096, help="rows per shard / checkpoint (rounded up to whole batches)")
+    ap.add_argument("--side", type=int, default=256, help="short side after downscaling")
+    ap.add_argument("--into-index", help="append new shards to this catalog index directory")
+    ap.add_argument("--index-kind", choices=INDEX_KINDS, default="hnsw",
+                    help="kind used when --into-index does not exist yet")
+    args = ap.parse_args()
+
+    rows = load_meta(args.catalog, args.meta)
+    writer = ShardWriter(args.out, args.shard_size)
+    print(f"[INFO] {len(rows)} catalog rows, {len(writer.seen)} already embedded in {len(writer.manifest['shards'])} shards")
+
+    jobs = [(row, os.path.join(args.catalog, row["image"]), args.side) for row in rows]
+    done = skipped = failed = embedded = 0
+    batch_imgs, batch_meta = [], []
+    t0 = time.perf_counter()
+
+    def run_batch():
+        nonlocal embedded
+        from utils.classify import image_embeddings  # loaded after the pool has forked
+        embs = image_embeddings([Image.fromarray(a) for a in batch_imgs], batch_size=args.batch_size)
+        writer.add(embs, list(batch_meta))
+        embedded += len(batch_meta)
+        batch_imgs.clear()
+        batch_meta.clear()
+
+    window = args.workers * args.batch_size  # decoded images per window, at most two windows in memory
+    with Pool(args.workers) as pool:
+        for row, digest, pixels, error in bounded_imap(pool, decode, jobs, window, args.workers):
+            done += 1
+            if error is not None:
+                failed += 1
+                print(f"\n[WARN] skipping {row['image']}: {error}")
+            elif digest in writer.seen:
+                skipped += 1
+            else:
+                writer.seen.add(digest)
+                batch_imgs.append(pixels)
+                batch_meta.append({**row, "sha256": digest})
+                if len(batch_imgs) >= args.batch_size:
+                    run_batch()
+            if done % 50 == 0 or done == len(jobs):
+                elapsed = time.perf_counter() - t0
+                rate = embedded / elapsed if elapsed else 0.0
+                eta = (len(jobs) - done) / (done / elapsed) if elapsed and done else 0.0
+                print(f"[INFO] {done}/{len(jobs)} read | {embedded} embedded ({rate:.1f} img/s) | "
+                      f"{skipped} skipped | {failed} failed | eta {eta:.0f}s", end="\r")
+    if batch_imgs:
+        run_batch()
+    writer.flush()
+    elapsed = time.perf_counter() - t0
+    print(f"\n[OK] embedded {embedded} images in {elapsed:.1f}s ({embedded / max(elapsed, 1e-9):.1f} img/s), "
+          f"skipped {skipped} already-embedded, {failed} failed; {writer.manifest['count']} rows in "
+          f"{len(writer.manifest['shards'])} shards")
+
+    if args.into_index:
+        merge_into_index(writer, args.into_index, args.index_kind)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,130 +3,42 @@ backend/utils/detect.py
 
 YOLOv8 detection utility:
 - Ensemble of models (YoloF.pt, yolov8s.pt, fallback yolov8n.pt)
+  on PyTorch, or their ONNX exports on ONNX Runtime (DETECTOR_BACKEND=onnx, utils/yolo_onnx.py)
 - Detects clothing/objects in image
 - Extracts dominant colors per detection
 - Splits person detections into top/bottom/shoes with color analysis
 """
 
-import os
 import io
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Union
 
 import numpy as np
-import cv2
 from PIL import Image
-from sklearn.cluster import KMeans
-from ultralytics import YOLO
-from sklearn.cluster import KMeans
 
 # -------------------
 # Model Initialization
 # -------------------
 
 # import classifier
-from .classify import zero_shot_classify, init_classifier, image_embedding
-
-
-_MODELS = {}
-
-
-def init_models():
-    """Initialize YOLO models (ensemble)."""
-    global _MODELS
-    if _MODELS:
-        return _MODELS
-
-    models = {}
-
-    try:
-        # Load clothing-specific model (renamed as YoloF.pt)
-        if os.path.exists("./weights/YoloF.pt"):
-            print("[INFO] Loading YoloF.pt (fashion-specific)")
-            models["fashion"] = YOLO("./weights/YoloF.pt")
-            print("[INFO] Loaded YoloF.pt (fashion-specific)")
-    except Exception as e:
-        print("[WARN] Could not load YoloF.pt:", e)
-
-    try:
-        # Load general YOLOv8 small model (better accuracy than n)
-        if os.path.exists("./weights/yolov8s.pt"):
-            models["general"] = YOLO("./weights/yolov8s.pt")
-            print("[INFO] Loaded yolov8s.pt")
-    except Exception as e:
-        print("[WARN] Could not load yolov8s.pt:", e)
-
-    if not models:
-        print("[FALLBACK] Loading yolov8n.pt as backup")
-        models["backup"] = YOLO("./weights/yolov8n.pt")
-
-    _MODELS = models
-    return models
+from .classify import zero_shot_classify_batch
+from .colors import dominant_colors, dominant_colors_batch
+from .image_io import DecodedImage, as_decoded
+from .detect import init_models, get_batcher  # one ensemble + batcher, shared with /detect
+from .box_fusion import fuse_detections, record_fusion
+from .tracing import stage, traced
 
 
 # -------------------
 # Helper Functions
 # -------------------
 
-def _to_numpy(x):
-    try:
-        import torch
-        if hasattr(x, "cpu"):
-            return x.cpu().numpy()
-    except Exception:
-        pass
-    return np.array(x)
-
-
-
 def _rgb_to_hex(rgb: Tuple[int, int, int]) -> str:
     return "#{:02x}{:02x}{:02x}".format(*rgb)
 
 # --- New: multi-dominant colors (primary + secondary)
 def get_dominant_colors(np_img: np.ndarray, k: int = 2, resize: int = 150):
     """Return list of dominant colors (RGB tuples), primary first."""
-    if np_img is None or np_img.size == 0:
-        return []
-    img_rgb = cv2.cvtColor(np_img, cv2.COLOR_BGR2RGB)
-    h, w = img_rgb.shape[:2]
-    if max(h, w) > resize:
-        scale = resize / max(h, w)
-        img_small = cv2.resize(img_rgb, (int(w*scale), int(h*scale)), interpolation=cv2.INTER_AREA)
-    else:
-        img_small = img_rgb
-    pixels = img_small.reshape(-1, 3).astype(float)
-    n_pixels = pixels.shape[0]
-    k_use = min(k, max(1, min(n_pixels, 5)))
-    try:
-        kmeans = KMeans(n_clusters=k_use, random_state=0, n_init="auto")
-        kmeans.fit(pixels)
-        counts = np.bincount(kmeans.labels_)
-        dominant_idxs = counts.argsort()[::-1]
-        colors = [tuple(map(int, kmeans.cluster_centers_[i])) for i in dominant_idxs]
-    except Exception:
-        avg = pixels.mean(axis=0).astype(int)
-        colors = [tuple(avg.tolist())]
-    return colors
-
-
-
-    img_rgb = cv2.cvtColor(np_img, cv2.COLOR_BGR2RGB)
-    h, w = img_rgb.shape[:2]
-    if max(h, w) > resize:
-        scale = resize / max(h, w)
-        img_rgb = cv2.resize(img_rgb, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
-
-    pixels = img_rgb.reshape(-1, 3).astype(float)
-    k_use = min(k, max(1, min(pixels.shape[0], 5)))
-
-    try:
-        kmeans = KMeans(n_clusters=k_use, random_state=0, n_init="auto")
-        kmeans.fit(pixels)
-        counts = np.bincount(kmeans.labels_)
-        dominant = kmeans.cluster_centers_[counts.argmax()].astype(int)
-        return tuple(int(v) for v in dominant)
-    except Exception:
-        avg = pixels.mean(axis=0).astype(int)
-        return tuple(int(v) for v in avg)
+    return dominant_colors(np_img, k=k, resize=resize)
 
 # --- New: partial-body heuristic utility
 def person_height_ratio(person_bbox: Tuple[int,int,int,int], img_h: int) -> float:
@@ -148,6 +60,51 @@ def _split_person_regions(box: Tuple[int, int, int, int], img_shape: Tuple[int,
     }
 
 
+# --- Filter stage: per-class confidence thresholds (tweakable), default 0.25 for others
+CLASS_CONF_THRESH = {
+    "shoes": 0.45,
+    "person": 0.3,
+    "handbag": 0.3,
+    "clothing": 0.25,
+    "bag": 0.25,
+}
+
+# only refine if label generic-ish
+GENERIC_LABELS = {"clothing","clothes","apparel","accessories","bag","handbag"}
+
+
+def _is_refine_target(label: str) -> bool:
+    lab = label.lower()
+    return lab in GENERIC_LABELS or lab == "person"
+
+
+def _crop_ops_saved(detections: List[Dict[str, Any]]) -> int:
+    """Crop operations (color pass + CLIP for refine targets) the merged boxes in `detections` save:
+    each stands in for len(fused_ids) member crops."""
+    return sum((len(d["fused_ids"]) - 1) * (1 + _is_refine_target(d["label"]))
+               for d in detections if "fused_ids" in d)
+
+
+def _filter_detections(detections: List[Dict[str, Any]], img_h: int):
+    """Per-class confidence thresholds and person heuristics. Returns (filtered, largest person bbox)."""
+    # pick largest person bbox if multiple
+    person_bboxes = [d for d in detections if d["label"].lower() == "person"]
+    person_bbox = None
+    if person_bboxes:
+        person_bbox = max(person_bboxes, key=lambda x: (x["bbox"][2]-x["bbox"][0])*(x["bbox"][3]-x["bbox"][1]))["bbox"]
+
+    filtered = []
+    for d in detections:
+        lab = d["label"].lower()
+        thresh = CLASS_CONF_THRESH.get(lab, 0.25)
+        # partial-body heuristic: if person exists and height ratio < 0.55 (only upper body visible), suppress shoes
+        if lab in ("shoe","shoes","sneakers","loafers","sandals") and person_bbox is not None:
+            if person_height_ratio(person_bbox, img_h) < 0.55:
+                # likely person crop doesn't include legs/shoes — raise threshold
+                thresh = max(thresh, 0.6)
+        if d["confidence"] >= thresh:
+            filtered.append(d)
+    return filtered, person_bbox
 
 
 # -------------------
@@ -210,31 +167,32 @@ def _split_person_regions(box: Tuple[int, int, int, int], img_shape: Tuple[int,
 
 #     return out
 
-def detect_image_bytes_v2(image_bytes: bytes, conf_thresh: float = 0.25, k_colors: int = 2,
+@traced("detect_v2")
+def detect_image_bytes_v2(image_bytes: Union[bytes, DecodedImage], conf_thresh: float = 0.25, k_colors: int = 2,
                        classifier_threshold: float = 0.35, combined_threshold: float = 0.35) -> Dict[str,Any]:
     """
     Now runs:
      - ensemble detection (existing)
+     - fusion stage (cross-model WBF / NMS, see utils.box_fusion)
      - filter stage (confidence + heuristics)
      - refine stage (zero-shot classifier on crops)
      - combine confidences: combined_conf = det_conf * 0.6 + cls_conf * 0.4 (example)
     """
     models = init_models()  # your ensemble
-    pil = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    img_rgb = np.array(pil)
-    img_bgr = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
-    H, W = img_bgr.shape[:2]
+    with stage("detect_v2.decode"):
+        image = as_decoded(image_bytes)  # bytes or an already-decoded (e.g. blurred) DecodedImage
+        img_rgb, img_bgr = image.rgb, image.bgr
+    H, W = img_bgr.shape[:2]  # working resolution (capped at MAX_WORKING_SIDE)
 
     # run the models and gather detections (existing code)
     detections = []
+    with stage("detect_v2.yolo"):
+        per_model = get_batcher().predict(img_rgb, conf_thresh)
     for name, model in models.items():
-        results = model.predict(img_rgb, conf=conf_thresh, verbose=False)
-        res = results[0]
-        if not hasattr(res, "boxes") or len(res.boxes) == 0:
+        res = per_model.get(name)
+        if res is None or len(res["confs"]) == 0:
             continue
-        boxes_xy = _to_numpy(res.boxes.xyxy)
-        classes = _to_numpy(res.boxes.cls).astype(int)
-        confs = _to_numpy(res.boxes.conf).astype(float)
+        boxes_xy, classes, confs = res["boxes"], res["classes"], res["confs"]
         for i in range(boxes_xy.shape[0]):
             x1,y1,x2,y2 = [int(round(float(v))) for v in boxes_xy[i]]
             cls_id, conf = int(classes[i]), float(confs[i])
@@ -246,64 +204,55 @@ def detect_image_bytes_v2(image_bytes: bytes, conf_thresh: float = 0.25, k_color
                 "confidence": round(conf,4)
             })
 
+    # --- Fusion stage: merge duplicates of the same object across ensemble members ---
+    with stage("detect_v2.fusion"):
+        fused = fuse_detections(detections)
+
     # --- Filter stage: per-class confidence thresholds and person heuristics ---
-    # Custom thresholds (tweakable)
-    CLASS_CONF_THRESH = {
-        "shoes": 0.45,
-        "person": 0.3,
-        "handbag": 0.3,
-        "clothing": 0.25,
-        "bag": 0.25,
-        # default for others:
-    }
-    filtered = []
-    # find person bbox(es)
-    person_bboxes = [d for d in detections if d["label"].lower() == "person"]
-    # pick largest person bbox if multiple
-    person_bbox = None
-    if person_bboxes:
-        person_bbox = max(person_bboxes, key=lambda x: (x["bbox"][2]-x["bbox"][0])*(x["bbox"][3]-x["bbox"][1]))["bbox"]
+    with stage("detect_v2.filter"):
+        filtered, person_bbox = _filter_detections(fused, H)
 
-    for d in detections:
-        lab = d["label"].lower()
-        det_conf = d["confidence"]
-        thresh = CLASS_CONF_THRESH.get(lab, 0.25)
-        # partial-body heuristic: if person exists and height ratio < 0.55 (only upper body visible), suppress shoes
-        if lab in ("shoe","shoes","sneakers","loafers","sandals") and person_bbox is not None:
-            h_ratio = person_height_ratio(person_bbox, H)
-            if h_ratio < 0.55:
-                # likely person crop doesn't include legs/shoes — raise threshold
-                thresh = max(thresh, 0.6)
-        if det_conf >= thresh:
-            filtered.append(d)
-    # filtered now contains surviving detections
+    fusion = record_fusion(len(detections), len(fused), _crop_ops_saved(filtered))
 
     # --- Refine stage: run zero-shot classifier on clothing-like detections ---
-    refined = []
+    crops = []
     for d in filtered:
-        lab = d["label"].lower()
         x1,y1,x2,y2 = d["bbox"]
         crop_np = img_bgr[y1:y2, x1:x2].copy() if (y2>y1 and x2>x1) else None
-        if crop_np is None or crop_np.size==0:
+        crops.append(crop_np if crop_np is not None and crop_np.size else None)
+
+    # classify every refine target in one batched CLIP pass (top 3)
+    targets = [i for i, d in enumerate(filtered) if crops[i] is not None and _is_refine_target(d["label"])]
+    candidates_by_idx = {}
+    if targets:
+        crop_pils = []
+        for i in targets:
+            x1, y1, x2, y2 = filtered[i]["bbox"]
+            crop_pils.append(Image.fromarray(img_rgb[y1:y2, x1:x2]))
+        try:
+            with stage("detect_v2.clip_refine"):
+                batch_candidates = zero_shot_classify_batch(crop_pils, top_k=3)
+        except Exception as e:
+            batch_candidates = [[] for _ in targets]
+        candidates_by_idx = dict(zip(targets, batch_candidates))
+
+    # colors (primary + secondary) for every crop in one vectorized call
+    with stage("detect_v2.colors"):
+        crop_colors = dominant_colors_batch(crops, k=2)
+
+    refined = []
+    for i, d in enumerate(filtered):
+        lab = d["label"].lower()
+        crop_np = crops[i]
+        if crop_np is None:
             # no valid crop: copy original
             d["refined_label"] = lab
             d["refined_confidence"] = d["confidence"]
             refined.append(d)
             continue
 
-        crop_pil = Image.fromarray(cv2.cvtColor(crop_np, cv2.COLOR_BGR2RGB))
-        # only refine if label generic-ish
-        refine_target = False
-        generic_labels = {"clothing","clothes","apparel","accessories","bag","handbag"}
-        if lab in generic_labels or lab in ("person",):
-            refine_target = True
-
-        if refine_target:
-            # zero-shot classify (top 3)
-            try:
-                candidates = zero_shot_classify(crop_pil, top_k=3)
-            except Exception as e:
-                candidates = []
+        if i in candidates_by_idx:
+            candidates = candidates_by_idx[i]
             if candidates:
                 top_label, cls_score = candidates[0]
                 # Combine confidences (example weighted average)
@@ -325,7 +274,7 @@ def detect_image_bytes_v2(image_bytes: bytes, conf_thresh: float = 0.25, k_color
             d["refined_confidence"] = d["confidence"]
 
         # add color info (primary + secondary)
-        colors = get_dominant_colors(crop_np, k=2)
+        colors = crop_colors[i]
         d["colors"] = [{"rgb": list(c), "hex": "#{:02x}{:02x}{:02x}".format(*c)} for c in colors]
         refined.append(d)
 
@@ -334,11 +283,12 @@ def detect_image_bytes_v2(image_bytes: bytes, conf_thresh: float = 0.25, k_color
     if person_bbox is not None:
         reg_bboxes = _split_person_regions(person_bbox, (H, W))
         person_obj = {"person_bbox": person_bbox, "regions": {}}
-        for rname, rbbox in reg_bboxes.items():
-            crop = img_bgr[rbbox[1]:rbbox[3], rbbox[0]:rbbox[2]] if (rbbox[3]>rbbox[1] and rbbox[2]>rbbox[0]) else None
-            dom = (0,0,0)
-            if crop is not None and crop.size:
-                dom = get_dominant_colors(crop, k=1)[0]
+        region_crops = [img_bgr[rb[1]:rb[3], rb[0]:rb[2]] if (rb[3]>rb[1] and rb[2]>rb[0]) else None
+                        for rb in reg_bboxes.values()]
+        with stage("detect_v2.person_regions"):
+            region_colors = dominant_colors_batch(region_crops, k=1)
+        for (rname, rbbox), colors in zip(reg_bboxes.items(), region_colors):
+            dom = colors[0] if colors else (0,0,0)
             person_obj["regions"][rname] = {
                 "bbox": list(rbbox),
                 "dominant_color_rgb": list(dom),
@@ -346,18 +296,30 @@ def detect_image_bytes_v2(image_bytes: bytes, conf_thresh: float = 0.25, k_color
             }
         person_regions.append(person_obj)
 
+    # Report geometry in original-image coordinates. raw / filtered / refined share
+    # the same detection dicts (fused ones are new), so every bbox is mapped exactly once here.
+    for d in {id(d): d for d in detections + fused}.values():
+        d["bbox"] = image.to_original(d["bbox"])
+    for person_obj in person_regions:
+        person_obj["person_bbox"] = image.to_original(person_obj["person_bbox"])
+        for region in person_obj["regions"].values():
+            region["bbox"] = image.to_original(region["bbox"])
+
     # Final JSON
+    W, H = image.original_size
     out = {
         "width": W,
         "height": H,
         "raw_detections": detections,
         "filtered_detections": filtered,
         "refined_detections": refined,
-        "person_regions": person_regions
+        "person_regions": person_regions,
+        "fusion": fusion,
     }
     return out
 
 def visualize_predictions(image_bytes: bytes, save_path: str = "visualized.jpg", conf_thresh: float = 0.3):
+    import cv2
     models = init_models()
     model = list(models.values())[0]  # use first available
     pil = Image.open(io.BytesIO(image_bytes)).convert("RGB")
@@ -0,0 +1,151 @@
+"""
+backend/utils/batching.py
+
+Micro-batching inference queue for the YOLO ensemble:
+- Collects images submitted within a short window (max batch size / max wait in ms)
+- Runs each ensemble member once per batch instead of once per image
+- Resolves a per-request future with that request's slice of the results
+
+Tuning (env):
+- YOLO_BATCH_MAX_SIZE    max images per batch (<= 1 disables batching: calls run inline,
+                         serialized like the worker, default 8)
+- YOLO_BATCH_MAX_WAIT_MS how long the first image waits for company (default 10)
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+BATCH_MAX_SIZE = int(os.getenv("YOLO_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("YOLO_BATCH_MAX_WAIT_MS", "10"))
+
+
+def _to_numpy(x):
+    if hasattr(x, "cpu"):
+        return x.cpu().numpy()
+    return np.array(x)
+
+
+def _empty_result() -> Dict[str, np.ndarray]:
+    return {
+        "boxes": np.zeros((0, 4), dtype=np.float32),
+        "classes": np.zeros((0,), dtype=int),
+        "confs": np.zeros((0,), dtype=float),
+    }
+
+
+def predict_arrays(model, images: List[np.ndarray], conf: float) -> List[Dict[str, np.ndarray]]:
+    """
+    Run one model over a list of RGB images in a single predict call.
+    Both backends get the same arrays and reverse their channels the same way
+    (ultralytics takes numpy input as BGR), so torch and ONNX results agree.
+    Returns one {"boxes", "classes", "confs"} dict of numpy arrays per image.
+    """
+    if hasattr(model, "predict_arrays"):
+        # ONNX Runtime backend (utils.yolo_onnx) already returns this format
+        return model.predict_arrays(images, conf)
+    results = model.predict(images, conf=conf, verbose=False)
+    out = []
+    for res in results:
+        if not hasattr(res, "boxes") or len(res.boxes) == 0:
+            out.append(_empty_result())
+            continue
+        out.append({
+            "boxes": _to_numpy(res.boxes.xyxy),
+            "classes": _to_numpy(res.boxes.cls).astype(int),
+            "confs": _to_numpy(res.boxes.conf).astype(float),
+        })
+    return out
+
+
+def _filter_conf(res: Dict[str, np.ndarray], conf: float) -> Dict[str, np.ndarray]:
+    keep = res["confs"] >= conf
+    if keep.all():
+        return res
+    return {key: arr[keep] for key, arr in res.items()}
+
+
+class EnsembleBatcher:
+    """
+    Single background worker that owns the ensemble's predict calls.
+
+    `init_fn` returns the {name: model} ensemble (e.g. detect.init_models).
+    Requests in the same batch may ask for different confidence thresholds:
+    the batch is run at the lowest one and each request's slice is filtered
+    back to its own threshold.
+    """
+
+    def __init__(self, init_fn: Callable[[], Dict[str, Any]],
+                 max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS):
+        self._init_fn = init_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: "queue.Queue[Tuple[np.ndarray, float, Future]]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._inline_lock = threading.Lock()  # ultralytics models are not safe to call concurrently
+
+    def submit(self, img_rgb: np.ndarray, conf: float) -> Future:
+        """Queue one image; the future resolves to {model_name: arrays}."""
+        fut = Future()
+        self._ensure_worker()
+        self._queue.put((img_rgb, conf, fut))
+        return fut
+
+    def predict(self, img_rgb: np.ndarray, conf: float) -> Dict[str, Dict[str, np.ndarray]]:
+        """Blocking helper: run one image through the ensemble."""
+        if self.max_batch_size <= 1:
+            # batching disabled: no queue hop, run inline in the caller's thread, one call at a time
+            models = self._init_fn()
+            with self._inline_lock:
+                return {name: predict_arrays(model, [img_rgb], conf)[0] for name, model in models.items()}
+        return self.submit(img_rgb, conf).result()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="yolo-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[Tuple[np.ndarray, float, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # window closed: still take whatever is already queued
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, batch: List[Tuple[np.ndarray, float, Future]]):
+        items = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not items:
+            return
+        try:
+            models = self._init_fn()
+            images = [img for img, _, _ in items]
+            min_conf = min(conf for _, conf, _ in items)
+            per_model = {name: predict_arrays(model, images, min_conf) for name, model in models.items()}
+        except Exception as e:
+            for _, _, fut in items:
+                fut.set_exception(e)
+            return
+        for idx, (_, conf, fut) in enumerate(items):
+            fut.set_result({name: _filter_conf(res[idx], conf) for name, res in per_model.items()})
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            self._run_batch(batch)
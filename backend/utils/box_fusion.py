@@ -0,0 +1,133 @@
+"""
+backend/utils/box_fusion.py
+
+Cross-model fusion of YOLO ensemble detections (runs between raw detection and filtering):
+- Class-aware: only boxes with the same (alias-normalized) label are merged
+- Cross-model only: a cluster holds at most one box per ensemble member, so two
+  overlapping objects found by the same model (e.g. people side by side) stay apart
+- "wbf": weighted box fusion - a cluster becomes one box whose coordinates are the
+  confidence-weighted mean of its members; confidence is the best member's, so the
+  per-class thresholds of the filter stage keep their meaning
+- "nms": cross-model NMS - a cluster keeps only its most confident member
+- Vectorized: one pairwise IoU matrix per call, greedy clustering over its rows
+
+Tuning (env):
+- ENSEMBLE_FUSION      wbf | nms | none (default wbf)
+- ENSEMBLE_FUSION_IOU  IoU at which two same-class boxes are the same object (default 0.55)
+"""
+
+import os
+import threading
+from typing import Any, Dict, List
+
+import numpy as np
+
+ENSEMBLE_FUSION = os.getenv("ENSEMBLE_FUSION", "wbf").lower()
+ENSEMBLE_FUSION_IOU = float(os.getenv("ENSEMBLE_FUSION_IOU", "0.55"))
+
+# different ensemble members name the same thing differently
+_LABEL_ALIASES = {"shoe": "shoes", "handbag": "bag", "clothes": "clothing"}
+
+
+def _class_key(label: str) -> str:
+    lab = (label or "").lower()
+    return _LABEL_ALIASES.get(lab, lab)
+
+
+def iou_matrix(boxes: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of (n, 4) xyxy boxes."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    area = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    iw = np.clip(np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]), 0, None)
+    ih = np.clip(np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]), 0, None)
+    inter = iw * ih
+    union = area[:, None] + area[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def cluster_boxes(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, iou_thresh: float,
+                  sources: np.ndarray = None) -> List[np.ndarray]:
+    """
+    Greedy clustering in descending score order: each unassigned box seeds a cluster
+    with the unassigned same-class boxes of other sources overlapping it by >= iou_thresh,
+    keeping the best-scoring one per source. sources=None treats every box as its own source.
+    Returns member indices per cluster, seed first.
+    """
+    n = len(scores)
+    if n == 0:
+        return []
+    if sources is None:
+        sources = np.arange(n)
+    same = ((iou_matrix(boxes) >= iou_thresh) & (classes[:, None] == classes[None, :])
+            & (sources[:, None] != sources[None, :]))
+    order = np.argsort(-scores, kind="stable")
+    assigned = np.zeros(n, dtype=bool)
+    clusters = []
+    for i in order:
+        if assigned[i]:
+            continue
+        members = np.flatnonzero(same[i] & ~assigned)
+        members = members[np.argsort(-scores[members], kind="stable")]
+        _, first = np.unique(sources[members], return_index=True)  # best box of each other model
+        members = np.concatenate(([i], members[np.sort(first)]))
+        assigned[members] = True
+        clusters.append(members)
+    return clusters
+
+
+def fuse_detections(detections: List[Dict[str, Any]], method: str = None,
+                    iou_thresh: float = None) -> List[Dict[str, Any]]:
+    """
+    Merge duplicate detections of the same object from different ensemble members.
+    Unmerged detections are returned as the same dict objects; merged ones are new dicts
+    carrying the best member's label / source_model plus "fused_from" (member models) and
+    "fused_ids" (member indices into `detections`).
+    """
+    method = (method or ENSEMBLE_FUSION).lower()
+    iou_thresh = ENSEMBLE_FUSION_IOU if iou_thresh is None else iou_thresh
+    if method == "none" or len(detections) < 2:
+        return list(detections)
+    if method not in ("wbf", "nms"):
+        raise ValueError(f"Unknown ENSEMBLE_FUSION '{method}' (expected wbf, nms or none)")
+
+    boxes = np.array([d["bbox"] for d in detections], dtype=np.float64)
+    scores = np.array([d["confidence"] for d in detections], dtype=np.float64)
+    _, classes = np.unique([_class_key(d["label"]) for d in detections], return_inverse=True)
+    _, sources = np.unique([d.get("source_model", "") for d in detections], return_inverse=True)
+
+    fused = []
+    for members in cluster_boxes(boxes, scores, classes, iou_thresh, sources):
+        seed = detections[members[0]]
+        if len(members) == 1:
+            fused.append(seed)
+            continue
+        d = dict(seed)
+        if method == "wbf":
+            w = scores[members]
+            d["bbox"] = [int(round(v)) for v in (boxes[members] * w[:, None]).sum(0) / w.sum()]
+        d["fused_from"] = sorted({detections[j]["source_model"] for j in members})
+        d["fused_ids"] = sorted(int(j) for j in members)
+        fused.append(d)
+    return fused
+
+
+# running totals, see fusion_stats()
+_TOTALS = {"calls": 0, "boxes_in": 0, "boxes_out": 0, "crop_ops_saved": 0}
+_TOTALS_LOCK = threading.Lock()
+
+
+def record_fusion(boxes_in: int, boxes_out: int, crop_ops_saved: int) -> Dict[str, int]:
+    stats = {"boxes_in": boxes_in, "boxes_out": boxes_out, "crop_ops_saved": crop_ops_saved}
+    with _TOTALS_LOCK:
+        _TOTALS["calls"] += 1
+        for k, v in stats.items():
+            _TOTALS[k] += v
+    return stats
+
+
+def fusion_stats() -> Dict[str, Any]:
+    with _TOTALS_LOCK:
+        totals = dict(_TOTALS)
+    totals["method"] = ENSEMBLE_FUSION
+    totals["iou_thresh"] = ENSEMBLE_FUSION_IOU
+    return totals
@@ -0,0 +1,201 @@
+"""
+backend/utils/cache.py
+
+Content-addressed result cache:
+- Keys are a SHA-256 of the uploaded bytes plus the parameters that shape the result
+- In-memory LRU tier bounded by entry count / bytes, with a TTL
+- Optional on-disk SQLite tier so results survive restarts; every 100 sets it drops
+  expired rows and trims the oldest ones down to its row limit
+- get() / set() block (hashing, JSON, SQLite): async callers run them on the io lane
+- Hit/miss counters per tier (see stats())
+
+Tuning (env):
+- DETECT_CACHE_MAX_ENTRIES  in-memory entries (0 disables the cache, default 256)
+- DETECT_CACHE_MAX_MB       in-memory size bound in MB (default 64)
+- DETECT_CACHE_TTL_S        time to live in seconds (default 3600)
+- DETECT_CACHE_DIR          directory for the SQLite tier (unset = memory only)
+- DETECT_CACHE_DISK_MAX_ENTRIES  rows kept in the SQLite tier (default 10000)
+- MODEL_SET_VERSION         overrides the version derived from ./weights and the detector backend
+"""
+
+import os
+import json
+import time
+import glob
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def content_key(data: bytes, **params: Any) -> str:
+    """SHA-256 over the raw bytes and the (sorted) parameters."""
+    h = hashlib.sha256(data)
+    h.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+_MODEL_SET_VERSION = None
+
+def _hash_files(h, paths):
+    for path in sorted(paths):
+        if os.path.isfile(path):
+            st = os.stat(path)
+            h.update(f"{os.path.basename(path)}:{st.st_size}:{int(st.st_mtime)}".encode("utf-8"))
+
+
+def model_set_version(weights_dir: str = "./weights") -> str:
+    """
+    Short fingerprint of the loaded model set (weight file names, sizes, mtimes, the
+    detector backend and the ONNX exports in use), so cached results are invalidated
+    when weights or the backend serving them change.
+    """
+    global _MODEL_SET_VERSION
+    if _MODEL_SET_VERSION is None:
+        version = os.getenv("MODEL_SET_VERSION")
+        if not version:
+            from .clip_encoder import CLIP_ENCODER, CLIP_ONNX_PATH, int8_path
+            from .yolo_onnx import DETECTOR_BACKEND, YOLO_ONNX_DIR, YOLO_ONNX_INT8
+            h = hashlib.sha256()
+            _hash_files(h, glob.glob(os.path.join(weights_dir, "*")))
+            h.update(f"detector={DETECTOR_BACKEND}:int8={int(YOLO_ONNX_INT8)}".encode("utf-8"))
+            if DETECTOR_BACKEND == "onnx":
+                _hash_files(h, glob.glob(os.path.join(YOLO_ONNX_DIR, "*.onnx")))
+            if CLIP_ENCODER.startswith("onnx"):
+                _hash_files(h, [CLIP_ONNX_PATH, int8_path(CLIP_ONNX_PATH)])
+            version = h.hexdigest()[:12]
+        _MODEL_SET_VERSION = version
+    return _MODEL_SET_VERSION
+
+
+class TieredCache:
+    """
+    LRU + TTL cache of JSON-serializable values with an optional SQLite tier.
+    Values are stored serialized, so every get() returns a fresh object that
+    callers may mutate freely.
+    """
+
+    def __init__(self, name: str, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_s: float = 3600, disk_dir: Optional[str] = None, max_disk_entries: int = 10000):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, payload)
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "disk_evictions": 0}
+        self._db = None
+        if disk_dir and self.enabled:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(disk_dir, f"{name}.sqlite3"), check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires_at REAL, payload TEXT)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+            self._db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._mem.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return json.loads(entry[1])
+                self._drop(key)
+
+            if self._db is not None:
+                row = self._db.execute("SELECT expires_at, payload FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[0] > now:
+                    self._counters["disk_hits"] += 1
+                    self._put_mem(key, row[0], row[1])
+                    return json.loads(row[1])
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Any):
+        if not self.enabled:
+            return
+        payload = json.dumps(value)
+        expires_at = time.time() + self.ttl_s
+        with self._lock:
+            self._counters["sets"] += 1
+            self._put_mem(key, expires_at, payload)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO cache (key, expires_at, payload) VALUES (?, ?, ?)",
+                                 (key, expires_at, payload))
+                if self._counters["sets"] % 100 == 0:
+                    self._trim_disk()
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+            lookups = hits + self._counters["misses"]
+            return {
+                "name": self.name,
+                "enabled": self.enabled,
+                "entries": len(self._mem),
+                "bytes": self._mem_bytes,
+                "disk_tier": self._db is not None,
+                **self._counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # caller holds self._lock
+    def _trim_disk(self):
+        """Drop expired rows, then the oldest rows beyond max_disk_entries (same TTL: oldest expire first)."""
+        self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        excess = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_disk_entries
+        if excess > 0:
+            self._db.execute("DELETE FROM cache WHERE key IN "
+                             "(SELECT key FROM cache ORDER BY expires_at LIMIT ?)", (excess,))
+            self._counters["disk_evictions"] += excess
+
+    # caller holds self._lock
+    def _put_mem(self, key: str, expires_at: float, payload: str):
+        if key in self._mem:
+            self._drop(key)
+        self._mem[key] = (expires_at, payload)
+        self._mem_bytes += len(payload)
+        while self._mem and (len(self._mem) > self.max_entries or self._mem_bytes > self.max_bytes):
+            self._drop(next(iter(self._mem)))
+            self._counters["evictions"] += 1
+
+    def _drop(self, key: str):
+        _, payload = self._mem.pop(key)
+        self._mem_bytes -= len(payload)
+
+
+_DETECTION_CACHE = None
+
+def get_detection_cache() -> TieredCache:
+    """Shared cache for the /detect and /detect-v2 pipelines (blur + detection)."""
+    global _DETECTION_CACHE
+    if _DETECTION_CACHE is None:
+        _DETECTION_CACHE = TieredCache(
+            "detections",
+            max_entries=int(os.getenv("DETECT_CACHE_MAX_ENTRIES", "256")),
+            max_bytes=int(float(os.getenv("DETECT_CACHE_MAX_MB", "64")) * 1024 * 1024),
+            ttl_s=float(os.getenv("DETECT_CACHE_TTL_S", "3600")),
+            disk_dir=os.getenv("DETECT_CACHE_DIR") or None,
+            max_disk_entries=int(os.getenv("DETECT_CACHE_DISK_MAX_ENTRIES", "10000")),
+        )
+    return _DETECTION_CACHE
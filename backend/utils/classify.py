@@ -1,19 +1,16 @@
 # backend/utils/classify.py
 import os
+import threading
 from typing import List, Tuple, Dict
 from PIL import Image
 import numpy as np
 
-# Try to use FashionCLIP if installed (better for fashion), else fallback to transformers CLIP
-try:
-    from fashion_clip.fashion_clip import FashionCLIP
-    _USE_FASHION_CLIP = True
-except Exception:
-    _USE_FASHION_CLIP = False
+from .clip_encoder import FASHION_CLIP_ID, OPENAI_CLIP_ID, get_clip_encoder
 
-if not _USE_FASHION_CLIP:
-    from transformers import CLIPProcessor, CLIPModel
-    import torch
+# Use FashionCLIP if installed (better for fashion), else fallback to transformers CLIP.
+# The probe and the heavy imports (torch / transformers / fashion_clip) are deferred
+# to init_classifier so importing this module stays cheap.
+_USE_FASHION_CLIP = None
 
 # --- Candidate fine-grained labels you want to support ---
 FINE_LABELS = [
@@ -28,33 +25,76 @@ _CLIP_MODEL = None
 _CLIP_PROCESSOR = None
 _FC = None  # fashionclip wrapper if available
 _DIM = None
+_INIT_LOCK = threading.Lock()
 
 def init_classifier(model_name: str = "fashion-clip"):
     global _CLIP_MODEL, _CLIP_PROCESSOR, _FC, _DIM, _USE_FASHION_CLIP
-    if _USE_FASHION_CLIP:
-        if _FC is None:
+    if _DIM is not None:  # set last, once the model is fully loaded
+        return
+    with _INIT_LOCK:  # the startup registry and first requests may race to load
+        if _DIM is not None:
+            return
+        if _USE_FASHION_CLIP is None:
+            try:
+                from fashion_clip.fashion_clip import FashionCLIP  # noqa: F401
+                _USE_FASHION_CLIP = True
+            except Exception:
+                _USE_FASHION_CLIP = False
+        if _USE_FASHION_CLIP:
+            from fashion_clip.fashion_clip import FashionCLIP
             _FC = FashionCLIP(model_name)  # loads default fashion-clip weights
             _DIM = _FC.embed_dim
-    else:
-        if _CLIP_MODEL is None:
+        else:
+            from transformers import CLIPProcessor, CLIPModel
             _CLIP_MODEL = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
             _CLIP_PROCESSOR = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
             _DIM = _CLIP_MODEL.visual_projection.out_features if hasattr(_CLIP_MODEL, 'visual_projection') else 512
     return
 
-# --- Compute image embedding ---
-def image_embedding(img: Image.Image) -> np.ndarray:
+def image_model_id() -> str:
+    """Hub id of the CLIP model that defines the embedding space (recorded in catalog indexes)."""
     init_classifier()
-    if _USE_FASHION_CLIP and _FC is not None:
-        emb = _FC.encode_images([img])  # returns np array (1, dim)
-        return emb[0].astype("float32")
-    else:
+    return FASHION_CLIP_ID if _USE_FASHION_CLIP else OPENAI_CLIP_ID
+
+# --- Compute image embeddings (batched) ---
+def image_embeddings(imgs: List[Image.Image], batch_size: int = 32) -> np.ndarray:
+    """
+    Encode a list of PIL images -> (n, dim) float32 array.
+    All crops of an image go through the model in one forward pass
+    (chunked by batch_size). CLIP_ENCODER selects an exported / quantized
+    image tower (utils.clip_encoder), default is the float model below.
+    """
+    encoder = get_clip_encoder()
+    if encoder is None:
+        return float_image_embeddings(imgs, batch_size)
+    imgs = list(imgs)
+    if not imgs:
+        return np.zeros((0, _DIM or 512), dtype="float32")
+    return encoder.encode(imgs, batch_size=batch_size)
+
+def float_image_embeddings(imgs: List[Image.Image], batch_size: int = 32) -> np.ndarray:
+    """image_embeddings on the full-precision model under torch.inference_mode (parity reference)."""
+    import torch
+    init_classifier()
+    imgs = list(imgs)
+    if not imgs:
+        return np.zeros((0, _DIM or 512), dtype="float32")
+    with torch.inference_mode():
+        if _USE_FASHION_CLIP and _FC is not None:
+            emb = _FC.encode_images(imgs, batch_size=batch_size)  # returns np array (n, dim)
+            return np.asarray(emb, dtype="float32")
         # transformers CLIP fallback
-        inputs = _CLIP_PROCESSOR(images=img, return_tensors="pt")
-        with torch.no_grad():
+        chunks = []
+        for start in range(0, len(imgs), batch_size):
+            inputs = _CLIP_PROCESSOR(images=imgs[start:start + batch_size], return_tensors="pt")
             emb = _CLIP_MODEL.get_image_features(**inputs)
-        emb = emb / emb.norm(p=2, dim=-1, keepdim=True)
-        return emb.cpu().numpy()[0].astype("float32")
+            emb = emb / emb.norm(p=2, dim=-1, keepdim=True)
+            chunks.append(emb.cpu().numpy())
+        return np.concatenate(chunks).astype("float32")
+
+# --- Compute image embedding ---
+def image_embedding(img: Image.Image) -> np.ndarray:
+    return image_embeddings([img], batch_size=1)[0]
 
 # --- Compute text embeddings for labels (cache them) ---
 _TEXT_EMBED_CACHE = {}
@@ -74,6 +114,7 @@ def text_embedding(label: str) -> np.ndarray:
         return _TEXT_EMBED_CACHE[label]
     else:
         # transformers CLIP
+        import torch
         inputs = _CLIP_PROCESSOR(text=prompt_variants, images=None, return_tensors="pt", padding=True)
         with torch.no_grad():
             text_feats = _CLIP_MODEL.get_text_features(**{k: v for k,v in inputs.items() if k in ["input_ids","attention_mask"]})
@@ -83,33 +124,75 @@ def text_embedding(label: str) -> np.ndarray:
         _TEXT_EMBED_CACHE[label] = avg.astype("float32")
         return _TEXT_EMBED_CACHE[label]
 
+# --- Label bank: every label embedding stacked into one matrix ---
+class LabelBank:
+    """
+    Normalized text embeddings for a label set, stacked once into a
+    (n_labels, dim) float32 matrix. Scoring one image or a batch of crops
+    is then a single matrix product.
+    """
+
+    def __init__(self, labels: List[str]):
+        self.labels = list(labels)
+        mat = np.stack([text_embedding(label) for label in self.labels]).astype("float32")
+        mat /= np.linalg.norm(mat, axis=1, keepdims=True)
+        self.matrix = np.ascontiguousarray(mat)
+
+    def scores(self, img_embs: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each image embedding (row) to every label -> (n_imgs, n_labels)."""
+        embs = np.atleast_2d(np.asarray(img_embs, dtype="float32"))
+        embs = embs / np.linalg.norm(embs, axis=1, keepdims=True)
+        return embs @ self.matrix.T
+
+    def top_k(self, img_embs: np.ndarray, k: int = 1) -> List[List[Tuple[str, float]]]:
+        """
+        Top-k (label, score) per image, sorted desc. Scores are min-max
+        normalized to 0..1 over all labels of that image.
+        """
+        sims = self.scores(img_embs)
+        n_labels = sims.shape[1]
+        k = max(1, min(k, n_labels))
+
+        mx = sims.max(axis=1, keepdims=True)
+        mn = sims.min(axis=1, keepdims=True)
+        span = mx - mn
+        normed = np.where(span > 0, (sims - mn) / np.where(span > 0, span, 1.0), 1.0)
+
+        if k < n_labels:
+            idx = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        else:
+            idx = np.tile(np.arange(n_labels), (sims.shape[0], 1))
+        order = np.argsort(-np.take_along_axis(sims, idx, axis=1), axis=1, kind="stable")
+        idx = np.take_along_axis(idx, order, axis=1)
+        return [[(self.labels[j], float(normed[r, j])) for j in row] for r, row in enumerate(idx)]
+
+
+_LABEL_BANKS: Dict[Tuple[str, ...], LabelBank] = {}
+
+def get_label_bank(candidate_labels: List[str] = None) -> LabelBank:
+    """Build (once) and return the label bank for a label set (default FINE_LABELS)."""
+    key = tuple(candidate_labels if candidate_labels is not None else FINE_LABELS)
+    bank = _LABEL_BANKS.get(key)
+    if bank is None:
+        bank = LabelBank(list(key))
+        _LABEL_BANKS[key] = bank
+    return bank
+
 # --- Zero-shot classification: compares image embedding with text embeddings ---
 def zero_shot_classify(img: Image.Image, candidate_labels: List[str]=None, top_k: int = 1) -> List[Tuple[str, float]]:
     """
-    Returns list of (label, score) sorted desc. Score is cosine similarity in [ -1, 1].
+    Returns list of (label, score) sorted desc.
+    Scores are cosine similarities min-max normalized to 0..1 over the candidate labels.
     """
-    if candidate_labels is None:
-        candidate_labels = FINE_LABELS
-    img_emb = image_embedding(img).astype("float32")
-    img_emb = img_emb / np.linalg.norm(img_emb)
-    sims = []
-    for label in candidate_labels:
-        txt_emb = text_embedding(label)
-        # cos similarity
-        score = float(np.dot(img_emb, txt_emb) / (np.linalg.norm(img_emb) * np.linalg.norm(txt_emb)))
-        sims.append((label, score))
-    sims.sort(key=lambda x: x[1], reverse=True)
-    # normalize scores to 0..1 (simple transform)
-    max_score = max(s[1] for s in sims)
-    min_score = min(s[1] for s in sims)
-    normed = []
-    for label, sc in sims[:top_k]:
-        if max_score == min_score:
-            nsc = 1.0
-        else:
-            nsc = (sc - min_score) / (max_score - min_score)
-        normed.append((label, float(nsc)))
-    return normed
+    return get_label_bank(candidate_labels).top_k(image_embedding(img), top_k)[0]
+
+def zero_shot_classify_batch(imgs: List[Image.Image], candidate_labels: List[str]=None, top_k: int = 1) -> List[List[Tuple[str, float]]]:
+    """zero_shot_classify for many crops: one batched encode + one matrix product."""
+    return classify_embeddings(image_embeddings(imgs), candidate_labels, top_k)
+
+def classify_embeddings(img_embs: np.ndarray, candidate_labels: List[str]=None, top_k: int = 1) -> List[List[Tuple[str, float]]]:
+    """Batch form of zero_shot_classify for precomputed image embeddings (n, dim)."""
+    return get_label_bank(candidate_labels).top_k(img_embs, top_k)
 
 # --- Optional: placeholder for training a classifier (ResNet) later ---
 def train_resnet_classifier(train_dir: str, val_dir: str, out_path: str = "resnet_fashion.pt", epochs:int=10):
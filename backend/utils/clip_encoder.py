@@ -0,0 +1,153 @@
+"""
+backend/utils/clip_encoder.py
+
+Optional faster CLIP image tower for utils.classify.image_embeddings (crop refinement,
+catalog retrieval queries):
+- "onnx" / "onnx-int8": the image tower + projection exported by scripts/export_clip_onnx.py,
+  run on ONNX Runtime (fp32, or dynamically quantized 8-bit weights)
+- "torch-int8": the loaded CLIP / FashionCLIP model with torch dynamic quantization
+  of every nn.Linear (the ViT is almost all Linear layers), no export step
+- Preprocessing is NumPy instead of CLIPProcessor: each crop is resized (short side,
+  bicubic) and center-cropped with PIL, then the whole batch is rescaled and
+  normalized in one vectorized operation
+- Embeddings are L2-normalized, like the transformers path
+- The text side still comes from classify's model, so an export must be made from the
+  same weights (checked against the "source_model" metadata, warning on mismatch)
+- scripts/check_clip_parity.py measures FINE_LABELS top-1 agreement and latency
+  against the float model before switching
+
+Tuning (env):
+- CLIP_ENCODER    torch | torch-int8 | onnx | onnx-int8 (default torch = the float model as before)
+- CLIP_ONNX_PATH  fp32 export (default ./weights/onnx/clip_image.onnx;
+                  onnx-int8 loads clip_image.int8.onnx next to it)
+- ORT_* threads / providers are shared with the YOLO backend (see utils/yolo_onnx.py)
+"""
+
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+from PIL import Image
+
+CLIP_ENCODER = os.getenv("CLIP_ENCODER", "torch").lower()
+CLIP_ONNX_PATH = os.getenv("CLIP_ONNX_PATH", "./weights/onnx/clip_image.onnx")
+ENCODER_KINDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+# CLIPProcessor defaults for ViT-B/32 (FashionCLIP uses the same)
+CLIP_IMAGE_SIZE = 224
+CLIP_MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)
+CLIP_STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)
+
+FASHION_CLIP_ID = "patrickjohncyh/fashion-clip"
+OPENAI_CLIP_ID = "openai/clip-vit-base-patch32"
+
+
+def int8_path(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.int8{ext}"
+
+
+def preprocess(imgs: List[Image.Image], size: int = CLIP_IMAGE_SIZE, mean: np.ndarray = CLIP_MEAN,
+               std: np.ndarray = CLIP_STD) -> np.ndarray:
+    """PIL images -> (n, 3, size, size) float32, CLIPProcessor-equivalent resize / crop / normalize."""
+    batch = np.empty((len(imgs), size, size, 3), dtype=np.uint8)
+    for i, img in enumerate(imgs):
+        img = img.convert("RGB")
+        w, h = img.size
+        scale = size / min(w, h)
+        new_w, new_h = max(size, int(w * scale)), max(size, int(h * scale))  # truncation, as CLIPProcessor
+        if (new_w, new_h) != (w, h):
+            img = img.resize((new_w, new_h), Image.BICUBIC)
+        left, top = (new_w - size) // 2, (new_h - size) // 2
+        batch[i] = np.asarray(img.crop((left, top, left + size, top + size)))
+    pixels = (batch.astype(np.float32) * (1 / 255.0) - mean) / std
+    return np.ascontiguousarray(pixels.transpose(0, 3, 1, 2))
+
+
+def _l2(embs: np.ndarray) -> np.ndarray:
+    embs = np.asarray(embs, dtype=np.float32)
+    return embs / np.maximum(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12)
+
+
+class OnnxClipEncoder:
+    """CLIP image tower + projection exported to ONNX (pixel_values -> image_embeds)."""
+
+    def __init__(self, path: str):
+        import onnxruntime as ort
+        from .yolo_onnx import providers, session_options
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=session_options(), providers=providers())
+        self.input_name = self.session.get_inputs()[0].name
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.source_model = meta.get("source_model")
+        self.size = int(meta.get("image_size", CLIP_IMAGE_SIZE))
+
+    def encode(self, imgs: List[Image.Image], batch_size: int = 32) -> np.ndarray:
+        chunks = [self.session.run(None, {self.input_name: preprocess(imgs[s:s + batch_size], self.size)})[0]
+                  for s in range(0, len(imgs), batch_size)]
+        return _l2(np.concatenate(chunks))
+
+
+class TorchInt8ClipEncoder:
+    """The loaded CLIPModel with dynamically quantized (qint8) Linear layers."""
+
+    def __init__(self, clip_model, source_model: Optional[str] = None):
+        import torch
+        self.source_model = source_model
+        self.model = torch.quantization.quantize_dynamic(clip_model, {torch.nn.Linear}, dtype=torch.qint8).eval()
+
+    def encode(self, imgs: List[Image.Image], batch_size: int = 32) -> np.ndarray:
+        import torch
+        chunks = []
+        with torch.inference_mode():
+            for s in range(0, len(imgs), batch_size):
+                pixels = torch.from_numpy(preprocess(imgs[s:s + batch_size]))
+                chunks.append(self.model.get_image_features(pixel_values=pixels).numpy())
+        return _l2(np.concatenate(chunks))
+
+
+def _classifier_model():
+    """(CLIPModel, hub id) of the float model utils.classify serves."""
+    from . import classify
+    classify.init_classifier()
+    if classify._USE_FASHION_CLIP:
+        return getattr(classify._FC, "model", None), FASHION_CLIP_ID
+    return classify._CLIP_MODEL, OPENAI_CLIP_ID
+
+
+def load_encoder(kind: str, path: Optional[str] = None):
+    """Build an encoder of `kind` (None for "torch": classify keeps its float path)."""
+    if kind not in ENCODER_KINDS:
+        raise ValueError(f"Unknown CLIP_ENCODER '{kind}' (expected one of {', '.join(ENCODER_KINDS)})")
+    if kind == "torch":
+        return None
+    model, source = _classifier_model()
+    if kind == "torch-int8":
+        if model is None:
+            raise RuntimeError("torch-int8 needs the classifier's CLIPModel (not exposed by this fashion_clip version)")
+        print(f"[INFO] CLIP image encoder: torch-int8 ({source})")
+        return TorchInt8ClipEncoder(model, source)
+    path = path or CLIP_ONNX_PATH
+    encoder = OnnxClipEncoder(int8_path(path) if kind == "onnx-int8" else path)
+    if encoder.source_model and encoder.source_model != source:
+        print(f"[WARN] {encoder.path} was exported from {encoder.source_model}, "
+              f"but the label embeddings come from {source}")
+    print(f"[INFO] CLIP image encoder: {kind} ({encoder.path})")
+    return encoder
+
+
+_ENCODER = None
+_ENCODER_LOADED = False
+_ENCODER_LOCK = threading.Lock()
+
+
+def get_clip_encoder():
+    """The encoder selected by CLIP_ENCODER (singleton), None for the default float path."""
+    global _ENCODER, _ENCODER_LOADED
+    if not _ENCODER_LOADED:
+        with _ENCODER_LOCK:
+            if not _ENCODER_LOADED:
+                _ENCODER = load_encoder(CLIP_ENCODER)
+                _ENCODER_LOADED = True
+    return _ENCODER
@@ -0,0 +1,138 @@
+"""
+backend/utils/colors.py
+
+Vectorized dominant-color engine:
+- Pixels of all crops are binned into a 3D colour histogram in one pass
+- Small-k weighted k-means in NumPy over the occupied bins, all crops at once
+- Deterministic (greedy farthest-point initialisation, no random restarts)
+- Colors returned primary first (largest cluster), same as the old
+  per-crop sklearn KMeans path in detect.py / D2.py
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MAX_K = 5  # same cap as the previous KMeans path
+HIST_BITS = 4  # colour histogram resolution per channel (16 levels -> 4096 bins)
+_N_BINS = 1 << (3 * HIST_BITS)
+
+
+def _prepare_pixels(np_img: np.ndarray, resize: int) -> np.ndarray:
+    """BGR crop -> (n_pixels, 3) uint8 RGB pixels, downscaled to `resize` on the long side."""
+    h, w = np_img.shape[:2]
+    if max(h, w) > resize:
+        import cv2
+        scale = resize / max(h, w)
+        np_img = cv2.resize(np_img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    # BGR -> RGB on the small image only
+    return np_img.reshape(-1, 3)[:, ::-1]
+
+
+def _histogram_batch(pixel_sets: List[np.ndarray]):
+    """
+    Quantize every crop's pixels into a shared 3D colour histogram in one pass.
+    Returns, per occupied (crop, bin): crop index, pixel count and mean RGB of the
+    pixels that fell in the bin (so no precision is lost to the quantization).
+    """
+    shift = 8 - HIST_BITS
+    ids, pixels = [], []
+    for b, p in enumerate(pixel_sets):
+        q = (p >> shift).astype(np.int64)
+        ids.append(b * _N_BINS + ((q[:, 0] << (2 * HIST_BITS)) | (q[:, 1] << HIST_BITS) | q[:, 2]))
+        pixels.append(p)
+    ids = np.concatenate(ids)
+    pixels = np.concatenate(pixels).astype(np.float64)
+    size = len(pixel_sets) * _N_BINS
+
+    counts = np.bincount(ids, minlength=size)
+    occupied = np.flatnonzero(counts)
+    sums = np.stack([np.bincount(ids, weights=pixels[:, c], minlength=size)[occupied] for c in range(3)], axis=1)
+    weights = counts[occupied].astype(np.float64)
+    return occupied // _N_BINS, weights, sums / weights[:, None]
+
+
+def _kmeans_segments(X: np.ndarray, W: np.ndarray, seg: np.ndarray, ks: List[int],
+                     max_iter: int = 50, tol: float = 0.05):
+    """
+    Weighted Lloyd's k-means run for every crop at once. X (P, 3) holds the points
+    of all crops back to back, W their weights and seg (sorted) the crop index of
+    each point, so nothing is padded. Returns (centers (B, K, 3), counts (B, K));
+    centers beyond a crop's own k get count -1.
+    """
+    B, K = len(ks), max(ks)
+    starts = np.searchsorted(seg, np.arange(B))
+    active = np.arange(K)[None, :] < np.asarray(ks)[:, None]  # (B, K)
+    point_idx = np.arange(X.shape[0])
+
+    def seg_sum(values, flat, size):
+        return np.bincount(flat, weights=values, minlength=size)
+
+    # deterministic init: weighted mean, then greedily the point with the largest
+    # weight * squared distance to the centers chosen so far
+    C = np.zeros((B, K, 3), dtype=np.float64)
+    w_tot = seg_sum(W, seg, B)
+    C[:, 0] = np.stack([seg_sum(W * X[:, c], seg, B) for c in range(3)], axis=1) / w_tot[:, None]
+    min_d = ((X - C[seg, 0]) ** 2).sum(axis=1)
+    for j in range(1, K):
+        score = W * min_d
+        best = np.maximum.reduceat(score, starts)
+        pick = np.minimum.reduceat(np.where(score == best[seg], point_idx, X.shape[0]), starts)
+        C[:, j] = X[pick]
+        min_d = np.minimum(min_d, ((X - C[seg, j]) ** 2).sum(axis=1))
+
+    def assign(centers):
+        d = ((X[:, None, :] - centers[seg]) ** 2).sum(axis=2)  # (P, K)
+        d = np.where(active[seg], d, np.inf)
+        flat = seg * K + d.argmin(axis=1)
+        counts = seg_sum(W, flat, B * K).reshape(B, K)
+        sums = np.stack([seg_sum(W * X[:, c], flat, B * K) for c in range(3)], axis=1).reshape(B, K, 3)
+        return counts, sums
+
+    for _ in range(max_iter):
+        counts, sums = assign(C)
+        new_C = np.where(counts[..., None] > 0, sums / np.maximum(counts, 1e-12)[..., None], C)
+        shift = np.abs(new_C - C).max()
+        C = new_C
+        if shift < tol:
+            break
+
+    counts, _ = assign(C)
+    return C, np.where(active, counts, -1.0)
+
+
+def dominant_colors_batch(crops: Sequence[Optional[np.ndarray]], k: int = 2, resize: int = 150) -> List[List[Tuple[int, int, int]]]:
+    """
+    Dominant colors for many BGR crops in one call.
+    Returns one list of RGB tuples per crop (primary first); empty crops give [].
+    """
+    out: List[List[Tuple[int, int, int]]] = [[] for _ in crops]
+    idxs, pixel_sets, ks = [], [], []
+    for i, crop in enumerate(crops):
+        if crop is None or crop.size == 0:
+            continue
+        pixels = _prepare_pixels(crop, resize)
+        idxs.append(i)
+        pixel_sets.append(pixels)
+        ks.append(min(k, max(1, min(pixels.shape[0], MAX_K))))
+    if not idxs:
+        return out
+
+    try:
+        crop_of, weights, means = _histogram_batch(pixel_sets)
+        centers, counts = _kmeans_segments(means, weights, crop_of, ks)
+    except Exception:
+        for i, pixels in zip(idxs, pixel_sets):
+            out[i] = [tuple(int(v) for v in pixels.mean(axis=0))]
+        return out
+
+    for row, (i, k_use) in enumerate(zip(idxs, ks)):
+        order = np.argsort(-counts[row], kind="stable")
+        order = order[counts[row, order] > 0][:k_use]  # empty / inactive clusters are not colors
+        out[i] = [tuple(int(v) for v in centers[row, j]) for j in order]
+    return out
+
+
+def dominant_colors(np_img: np.ndarray, k: int = 2, resize: int = 150) -> List[Tuple[int, int, int]]:
+    """Dominant colors (RGB tuples) of a single BGR crop, primary first."""
+    return dominant_colors_batch([np_img], k=k, resize=resize)[0]
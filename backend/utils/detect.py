@@ -3,6 +3,7 @@ backend/utils/detect.py
 
 YOLOv8 detection utility:
 - Ensemble of models (YoloF.pt, yolov8s.pt, fallback yolov8n.pt)
+  on PyTorch, or their ONNX exports on ONNX Runtime (DETECTOR_BACKEND=onnx, utils/yolo_onnx.py)
 - Detects clothing/objects in image
 - Extracts dominant colors per detection
 - Splits person detections into top/bottom/shoes with color analysis
@@ -10,13 +11,16 @@ YOLOv8 detection utility:
 
 import os
 import io
-from typing import List, Dict, Any, Tuple, Optional
+import threading
+from typing import List, Dict, Any, Tuple, Optional, Union
 
 import numpy as np
-import cv2
 from PIL import Image
-from sklearn.cluster import KMeans
-from ultralytics import YOLO
+
+from .batching import EnsembleBatcher
+from .colors import dominant_colors_batch
+from .image_io import DecodedImage, as_decoded
+from .yolo_onnx import DETECTOR_BACKEND
 
 
 # -------------------
@@ -24,13 +28,27 @@ from ultralytics import YOLO
 # -------------------
 
 _MODELS = {}
+_MODELS_LOCK = threading.Lock()  # the startup registry and first requests may race to load
+_BATCHER = None
 
 
 def init_models():
-    """Initialize YOLO models (ensemble)."""
+    """Initialize YOLO models (ensemble), once."""
     global _MODELS
     if _MODELS:
         return _MODELS
+    with _MODELS_LOCK:
+        if not _MODELS:
+            _MODELS = _load_models()
+    return _MODELS
+
+
+def _load_models():
+    if DETECTOR_BACKEND == "onnx":
+        from .yolo_onnx import load_onnx_ensemble  # exported weights on ONNX Runtime
+        return load_onnx_ensemble()
+
+    from ultralytics import YOLO  # heavy: deferred to first use / registry load
 
     models = {}
 
@@ -55,50 +73,32 @@ def init_models():
         print("[FALLBACK] Loading yolov8n.pt as backup")
         models["backup"] = YOLO("./weights/yolov8n.pt")
 
-    _MODELS = models
     return models
 
 
+def get_batcher() -> EnsembleBatcher:
+    """Shared micro-batching queue in front of the ensemble."""
+    global _BATCHER
+    if _BATCHER is None:
+        _BATCHER = EnsembleBatcher(init_models)
+    return _BATCHER
+
+
 # -------------------
 # Helper Functions
 # -------------------
 
-def _to_numpy(x):
-    try:
-        import torch
-        if hasattr(x, "cpu"):
-            return x.cpu().numpy()
-    except Exception:
-        pass
-    return np.array(x)
-
-
 def _rgb_to_hex(rgb: Tuple[int, int, int]) -> str:
     return "#{:02x}{:02x}{:02x}".format(*rgb)
 
 
 def get_dominant_color_np(np_img: np.ndarray, k: int = 2, resize: int = 150) -> Tuple[int, int, int]:
-    if np_img is None or np_img.size == 0:
-        return (0, 0, 0)
+    return _primary_colors([np_img], k=k, resize=resize)[0]
 
-    img_rgb = cv2.cvtColor(np_img, cv2.COLOR_BGR2RGB)
-    h, w = img_rgb.shape[:2]
-    if max(h, w) > resize:
-        scale = resize / max(h, w)
-        img_rgb = cv2.resize(img_rgb, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
 
-    pixels = img_rgb.reshape(-1, 3).astype(float)
-    k_use = min(k, max(1, min(pixels.shape[0], 5)))
-
-    try:
-        kmeans = KMeans(n_clusters=k_use, random_state=0, n_init="auto")
-        kmeans.fit(pixels)
-        counts = np.bincount(kmeans.labels_)
-        dominant = kmeans.cluster_centers_[counts.argmax()].astype(int)
-        return tuple(int(v) for v in dominant)
-    except Exception:
-        avg = pixels.mean(axis=0).astype(int)
-        return tuple(int(v) for v in avg)
+def _primary_colors(crops: List[np.ndarray], k: int = 2, resize: int = 150) -> List[Tuple[int, int, int]]:
+    """Primary (most dominant) color of each BGR crop in one batched call; (0, 0, 0) for empty crops."""
+    return [colors[0] if colors else (0, 0, 0) for colors in dominant_colors_batch(crops, k=k, resize=resize)]
 
 
 def _split_person_regions(box: Tuple[int, int, int, int], img_shape: Tuple[int, int]):
@@ -124,43 +124,41 @@ def _crop_np(img_np: np.ndarray, bbox: Tuple[int, int, int, int]) -> np.ndarray:
 # Detection Functions
 # -------------------
 
-def detect_image_bytes(image_bytes: bytes, conf_thresh: float = 0.3, k_colors: int = 2) -> Dict[str, Any]:
+def detect_image_bytes(image_bytes: Union[bytes, DecodedImage], conf_thresh: float = 0.3, k_colors: int = 2) -> Dict[str, Any]:
     models = init_models()
 
-    pil = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    img_rgb = np.array(pil)
-    img_bgr = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
-    H, W = img_bgr.shape[:2]
+    image = as_decoded(image_bytes)  # bytes or an already-decoded (e.g. blurred) DecodedImage
+    img_rgb, img_bgr = image.rgb, image.bgr
+    H, W = img_bgr.shape[:2]  # working resolution (capped at MAX_WORKING_SIDE)
 
     detections = []
+    per_model = get_batcher().predict(img_rgb, conf_thresh)
 
     for name, model in models.items():
-        results = model.predict(img_rgb, conf=conf_thresh, verbose=False)
-        res = results[0]
-        if not hasattr(res, "boxes") or len(res.boxes) == 0:
+        res = per_model.get(name)
+        if res is None or len(res["confs"]) == 0:
             continue
 
-        boxes_xy = _to_numpy(res.boxes.xyxy)
-        classes = _to_numpy(res.boxes.cls).astype(int)
-        confs = _to_numpy(res.boxes.conf).astype(float)
+        boxes_xy, classes, confs = res["boxes"], res["classes"], res["confs"]
 
         for i in range(boxes_xy.shape[0]):
             x1, y1, x2, y2 = [int(round(float(v))) for v in boxes_xy[i]]
             cls_id, conf = int(classes[i]), float(confs[i])
             label = model.names.get(cls_id, str(cls_id))
 
-            crop_bgr = _crop_np(img_bgr, (x1, y1, x2, y2))
-            dom_rgb = get_dominant_color_np(crop_bgr, k=k_colors) if crop_bgr.size else (0, 0, 0)
-
             detections.append({
                 "source_model": name,
                 "label": label,
                 "bbox": [x1, y1, x2, y2],
                 "confidence": round(conf, 4),
-                "dominant_color_rgb": list(dom_rgb),
-                "dominant_color_hex": _rgb_to_hex(dom_rgb),
             })
 
+    # Dominant color of every detection crop in one batched call
+    dom_colors = _primary_colors([_crop_np(img_bgr, tuple(d["bbox"])) for d in detections], k=k_colors)
+    for det, dom_rgb in zip(detections, dom_colors):
+        det["dominant_color_rgb"] = list(dom_rgb)
+        det["dominant_color_hex"] = _rgb_to_hex(dom_rgb)
+
     out = {"width": W, "height": H, "detections": detections, "person_regions": []}
 
     # Person-specific color regions
@@ -168,9 +166,8 @@ def detect_image_bytes(image_bytes: bytes, conf_thresh: float = 0.3, k_colors: i
         if det["label"].lower() == "person":
             reg_bboxes = _split_person_regions(det["bbox"], (H, W))
             person_obj = {"person_bbox": det["bbox"], "regions": {}}
-            for rname, rbbox in reg_bboxes.items():
-                crop = _crop_np(img_bgr, rbbox)
-                dom = get_dominant_color_np(crop, k=k_colors) if crop.size else (0, 0, 0)
+            region_colors = _primary_colors([_crop_np(img_bgr, rbbox) for rbbox in reg_bboxes.values()], k=k_colors)
+            for (rname, rbbox), dom in zip(reg_bboxes.items(), region_colors):
                 person_obj["regions"][rname] = {
                     "bbox": list(rbbox),
                     "dominant_color_rgb": list(dom),
@@ -178,10 +175,19 @@ def detect_image_bytes(image_bytes: bytes, conf_thresh: float = 0.3, k_colors: i
                 }
             out["person_regions"].append(person_obj)
 
+    # Report geometry in original-image coordinates (person_bbox is mapped via its detection)
+    for det in detections:
+        det["bbox"][:] = image.to_original(det["bbox"])
+    for person_obj in out["person_regions"]:
+        for region in person_obj["regions"].values():
+            region["bbox"] = image.to_original(region["bbox"])
+    out["width"], out["height"] = image.original_size
+
     return out
 
 
 def visualize_predictions(image_bytes: bytes, save_path: str = "visualized.jpg", conf_thresh: float = 0.3):
+    import cv2
     models = init_models()
     model = list(models.values())[0]  # use first available
     pil = Image.open(io.BytesIO(image_bytes)).convert("RGB")
@@ -0,0 +1,149 @@
+"""
+backend/utils/embedding_store.py
+
+On-disk, memory-mapped embedding matrix + metadata for the product catalog.
+
+Description:
+- Directory layout:
+    header.json     {"version", "dim", "dtype", "count"} - the source of truth for count
+    embeddings.bin  row-major (count, dim) float16 / float32 matrix
+    meta.bin        concatenated UTF-8 JSON records
+    meta.idx        uint64 offsets into meta.bin, count + 1 entries (record i = [idx[i], idx[i+1]))
+- Readers map the files with np.memmap (mode "r"): nothing is copied into the
+  process heap, so every uvicorn worker on a node shares the same page-cache pages
+- Metadata is decoded per row on demand, never as a full Python list
+- append() adds rows at the end of each file and publishes them by rewriting
+  header.json last (atomic rename); a crash mid-append leaves a tail that the
+  next writer truncates, readers never see it
+"""
+
+import os
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+STORE_VERSION = 1
+DTYPES = ("float16", "float32")
+
+_HEADER, _EMB, _META, _IDX = "header.json", "embeddings.bin", "meta.bin", "meta.idx"
+
+
+class EmbeddingStore:
+    """Memory-mapped (count, dim) embedding matrix with offset-indexed JSON metadata."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._emb = None
+        self._idx = None
+        self._meta = None
+        self.refresh()
+
+    # ---- create / open ----
+
+    @classmethod
+    def create(cls, path: str, dim: int, dtype: str = "float16") -> "EmbeddingStore":
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}' (expected {', '.join(DTYPES)})")
+        if os.path.exists(os.path.join(path, _HEADER)):
+            raise FileExistsError(f"Embedding store already exists: {path}")
+        os.makedirs(path, exist_ok=True)
+        for name in (_EMB, _META):
+            open(os.path.join(path, name), "wb").close()
+        np.zeros(1, dtype=np.uint64).tofile(os.path.join(path, _IDX))
+        cls._write_header(path, {"version": STORE_VERSION, "dim": int(dim), "dtype": dtype, "count": 0})
+        return cls(path)
+
+    @classmethod
+    def open_or_create(cls, path: str, dim: int, dtype: str = "float16") -> "EmbeddingStore":
+        if os.path.exists(os.path.join(path, _HEADER)):
+            return cls(path)
+        return cls.create(path, dim, dtype)
+
+    @staticmethod
+    def _write_header(path: str, header: Dict[str, Any]):
+        tmp = os.path.join(path, _HEADER + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(header, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(path, _HEADER))
+
+    def refresh(self):
+        """(Re)map the files up to the published count, e.g. after another process appended."""
+        with open(os.path.join(self.path, _HEADER), encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != STORE_VERSION:
+            raise ValueError(f"{self.path}: unsupported store version {header.get('version')}")
+        self.header = header
+        self.dim = header["dim"]
+        self.dtype = np.dtype(header["dtype"])
+        n = header["count"]
+        self._emb = (np.memmap(os.path.join(self.path, _EMB), dtype=self.dtype, mode="r", shape=(n, self.dim))
+                     if n else np.zeros((0, self.dim), dtype=self.dtype))
+        self._idx = np.memmap(os.path.join(self.path, _IDX), dtype=np.uint64, mode="r", shape=(n + 1,))
+        self._meta = (np.memmap(os.path.join(self.path, _META), dtype=np.uint8, mode="r", shape=(int(self._idx[n]),))
+                      if self._idx[n] else np.zeros(0, dtype=np.uint8))
+
+    # ---- read ----
+
+    def __len__(self) -> int:
+        return self.header["count"]
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """(count, dim) read-only memmap in the stored dtype (zero-copy)."""
+        return self._emb
+
+    def rows(self, start: int = 0, stop: Optional[int] = None, dtype=np.float32) -> np.ndarray:
+        """A slice converted to `dtype` (copies only that slice)."""
+        return np.asarray(self._emb[start:stop], dtype=dtype)
+
+    def meta(self, i: int) -> Dict[str, Any]:
+        lo, hi = int(self._idx[i]), int(self._idx[i + 1])
+        return json.loads(self._meta[lo:hi].tobytes().decode("utf-8"))
+
+    def meta_many(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        return [self.meta(int(i)) for i in ids]
+
+    def iter_meta(self):
+        for i in range(len(self)):
+            yield self.meta(i)
+
+    # ---- write ----
+
+    def append(self, embs: np.ndarray, metas: List[Dict[str, Any]]) -> range:
+        """Append rows without rewriting existing data. Returns the new row ids."""
+        embs = np.asarray(embs)
+        if embs.ndim != 2 or embs.shape[1] != self.dim:
+            raise ValueError(f"expected (n, {self.dim}) embeddings, got {embs.shape}")
+        if len(metas) != embs.shape[0]:
+            raise ValueError(f"{len(metas)} metadata rows for {embs.shape[0]} embeddings")
+        with self._lock:
+            self.refresh()
+            n = len(self)
+            emb_path, meta_path, idx_path = (os.path.join(self.path, p) for p in (_EMB, _META, _IDX))
+            meta_end = int(self._idx[n])
+            # drop any unpublished tail left by an interrupted append
+            for p, size in ((emb_path, n * self.dim * self.dtype.itemsize), (meta_path, meta_end),
+                            (idx_path, (n + 1) * 8)):
+                if os.path.getsize(p) != size:
+                    os.truncate(p, size)
+
+            blobs = [json.dumps(m, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for m in metas]
+            offsets = meta_end + np.cumsum([len(b) for b in blobs], dtype=np.uint64)
+            with open(emb_path, "ab") as f:
+                f.write(np.ascontiguousarray(embs, dtype=self.dtype).tobytes())
+                os.fsync(f.fileno())
+            with open(meta_path, "ab") as f:
+                f.write(b"".join(blobs))
+                os.fsync(f.fileno())
+            with open(idx_path, "ab") as f:
+                f.write(offsets.astype(np.uint64).tobytes())
+                os.fsync(f.fileno())
+
+            self._write_header(self.path, {**self.header, "count": n + len(metas)})  # publish
+            self.refresh()
+            return range(n, n + len(metas))
@@ -0,0 +1,142 @@
+"""
+backend/utils/executor.py
+
+Execution layer that keeps blocking CV/ML work off the asyncio event loop:
+- "cpu" lane: bounded thread pool for GIL-releasing torch / cv2 / numpy work
+- "io" lane: thread pool for blocking network calls (LLM)
+- "process" lane: process pool for Python-heavy stages
+  (EXEC_PROCESS_WORKERS=0 routes it to the cpu lane instead)
+- Admission control: a lane admits at most workers + queue depth jobs,
+  after that callers get OverloadedError (served as 503 + Retry-After).
+  A job holds its slot until the worker finishes it, even if the caller is cancelled
+- Thread lanes run each job in a copy of the caller's contextvars (request-scoped
+  state such as the utils.tracing Server-Timing collector follows the job)
+
+Tuning (env):
+- EXEC_CPU_WORKERS / EXEC_CPU_QUEUE          (default min(4, cpus) / 16)
+- EXEC_IO_WORKERS / EXEC_IO_QUEUE            (default 16 / 64)
+- EXEC_PROCESS_WORKERS / EXEC_PROCESS_QUEUE  (default 0 / 8)
+"""
+
+import os
+import math
+import time
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class OverloadedError(Exception):
+    """Raised when a lane's queue is full; retry_after is a hint in seconds."""
+
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"{lane} lane is saturated, retry after {retry_after}s")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class Lane:
+    """A bounded executor plus an admission counter (only touched from the event loop)."""
+
+    def __init__(self, name: str, executor: Executor, workers: int, queue_depth: int):
+        self.name = name
+        self.executor = executor
+        self.workers = workers
+        self.capacity = workers + queue_depth
+        self.pending = 0
+        self.rejected = 0
+        self.completed = 0
+        self._avg_s = 0.5  # EWMA of job duration, used for Retry-After
+
+    def retry_after(self) -> int:
+        waves = self.pending / max(1, self.workers)
+        return max(1, math.ceil(waves * self._avg_s))
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise OverloadedError(self.name, self.retry_after())
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        if isinstance(self.executor, ThreadPoolExecutor):  # a Context cannot be pickled to a process
+            call = functools.partial(contextvars.copy_context().run, call)
+        self.pending += 1
+        future = loop.run_in_executor(self.executor, call)
+        future.add_done_callback(functools.partial(self._job_done, time.perf_counter()))
+        # a cancelled caller stops waiting, but the job keeps its slot until the worker finishes it
+        return await asyncio.shield(future)
+
+    def _job_done(self, t0: float, future: "asyncio.Future") -> None:
+        self.pending -= 1
+        self.completed += 1
+        self._avg_s = 0.8 * self._avg_s + 0.2 * (time.perf_counter() - t0)
+        if not future.cancelled():
+            future.exception()  # retrieved here in case the caller was cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_job_s": round(self._avg_s, 4),
+        }
+
+
+_LANES: Dict[str, Lane] = {}
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def init_executors() -> Dict[str, Lane]:
+    """Create the lanes (idempotent)."""
+    if _LANES:
+        return _LANES
+
+    cpu_workers = _env_int("EXEC_CPU_WORKERS", min(4, os.cpu_count() or 1))
+    _LANES["cpu"] = Lane("cpu", ThreadPoolExecutor(cpu_workers, thread_name_prefix="cpu"),
+                         cpu_workers, _env_int("EXEC_CPU_QUEUE", 16))
+
+    io_workers = _env_int("EXEC_IO_WORKERS", 16)
+    _LANES["io"] = Lane("io", ThreadPoolExecutor(io_workers, thread_name_prefix="io"),
+                        io_workers, _env_int("EXEC_IO_QUEUE", 64))
+
+    proc_workers = _env_int("EXEC_PROCESS_WORKERS", 0)
+    if proc_workers > 0:
+        _LANES["process"] = Lane("process", ProcessPoolExecutor(proc_workers),
+                                 proc_workers, _env_int("EXEC_PROCESS_QUEUE", 8))
+    else:
+        _LANES["process"] = _LANES["cpu"]
+    return _LANES
+
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run torch/cv2-heavy work on the bounded cpu thread pool."""
+    return await init_executors()["cpu"].run(fn, *args, **kwargs)
+
+
+async def run_io(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run blocking network calls on the io thread pool."""
+    return await init_executors()["io"].run(fn, *args, **kwargs)
+
+
+async def run_process(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run Python-heavy work in the process pool (fn and args must be picklable)."""
+    return await init_executors()["process"].run(fn, *args, **kwargs)
+
+
+def executor_stats() -> Dict[str, Any]:
+    lanes = init_executors()
+    return {name: lane.stats() for name, lane in lanes.items() if name == lane.name}
+
+
+def shutdown_executors():
+    for name, lane in list(_LANES.items()):
+        if name == lane.name:
+            lane.executor.shutdown(wait=False, cancel_futures=True)
+    _LANES.clear()
@@ -2,66 +2,252 @@
 backend/utils/face_blur.py
 
 Utility to detect faces and blur them in an image (bytes in → bytes out).
-Uses MTCNN (robust) with OpenCV for Gaussian blur.
+
+Description:
+- Pluggable face-detection backend, selected with FACE_BACKEND:
+    yunet  OpenCV FaceDetectorYN (ONNX, CPU, ~0.3 MB model) - no extra runtime
+    haar   OpenCV Haar cascade shipped with opencv-python 4.x (no weights, lowest recall)
+    mtcnn  TensorFlow MTCNN (previous default, pulls in TensorFlow)
+    auto   yunet when its weights are present, otherwise mtcnn (default)
+- yunet / haar run on a copy downscaled to FACE_DETECT_MAX_SIDE; boxes are mapped
+  back to full-resolution coordinates before blurring
+- mtcnn keeps the previous behaviour (full resolution, every face it returns) unless
+  FACE_MTCNN_MAX_SIDE / FACE_MTCNN_SCORE_THRESH opt in: downscaling costs recall on
+  small faces, and a missed face is a privacy leak
+- detect_faces_batch / blur_faces_batch share one loaded detector across images; mtcnn
+  runs them through one batched forward pass, yunet / haar loop per image
+- blur_faces_image works on a DecodedImage (utils.image_io) so the detectors get the
+  blurred pixels directly; blur_faces (bytes -> bytes) wraps it
+- Saved copies go through the write-behind upload store (utils.upload_store)
+
+Tuning (env):
+- FACE_BACKEND            auto | yunet | haar | mtcnn (default auto)
+- FACE_DETECT_MAX_SIDE    long side of the yunet / haar detection copy, 0 = full resolution (default 640)
+- FACE_SCORE_THRESH       minimum yunet face score (default 0.6)
+- FACE_MTCNN_MAX_SIDE     same for mtcnn (default 0 = full resolution)
+- FACE_MTCNN_SCORE_THRESH minimum mtcnn face confidence (default 0 = keep all)
+- FACE_YUNET_MODEL        path to face_detection_yunet_2023mar.onnx
+                          (default ./weights/face_detection_yunet_2023mar.onnx)
 """
 
 # backend/utils/face_blur.py
-import io
+import abc
 import os
-import uuid
-from typing import List, Tuple
+import threading
+from typing import Dict, List, Optional, Tuple
 import numpy as np
-import cv2
-from PIL import Image
-from mtcnn.mtcnn import MTCNN
 
-_detector = None
+from .image_io import DecodedImage, as_decoded
+from .upload_store import UPLOAD_PERSIST, UPLOAD_SAVE_ORIGINALS, get_upload_store
+from .tracing import stage, traced
 
-def init_face_detector():
-    global _detector
-    if _detector is None:
-        _detector = MTCNN()
-    return _detector
+FACE_BACKEND = os.getenv("FACE_BACKEND", "auto").lower()
+FACE_DETECT_MAX_SIDE = int(os.getenv("FACE_DETECT_MAX_SIDE", "640"))
+FACE_SCORE_THRESH = float(os.getenv("FACE_SCORE_THRESH", "0.6"))
+FACE_MTCNN_MAX_SIDE = int(os.getenv("FACE_MTCNN_MAX_SIDE", "0"))
+FACE_MTCNN_SCORE_THRESH = float(os.getenv("FACE_MTCNN_SCORE_THRESH", "0"))
+FACE_YUNET_MODEL = os.getenv("FACE_YUNET_MODEL", "./weights/face_detection_yunet_2023mar.onnx")
 
+Box = Tuple[int, int, int, int]  # x, y, w, h in full-resolution pixels
 
-def blur_faces(image_bytes: bytes, blur_strength: int = 35, save_dir: str = "../blurred_uploads", debug: bool = True) -> bytes:
-    """
-    Detect and blur faces.
-    Saves blurred copy to `save_dir/uuid_blurred.jpg`.
-    If debug=True, also saves original as `uuid_original.jpg`.
-    Returns new image bytes.
-    """
-    detector = init_face_detector()
 
-    pil_img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    img = np.array(pil_img)
-    img_bgr = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+def _downscale(img: np.ndarray, max_side: int) -> Tuple[np.ndarray, float]:
+    """Return (detection copy, scale) with scale = full / small."""
+    h, w = img.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return img, 1.0
+    import cv2
+    s = max_side / max(h, w)
+    small = cv2.resize(img, (max(1, int(round(w * s))), max(1, int(round(h * s)))), interpolation=cv2.INTER_AREA)
+    return small, max(h, w) / max(small.shape[:2])
+
+
+def _map_back(boxes, scale: float, shape) -> List[Box]:
+    """Scale detection-copy boxes to full resolution and clip them to the image."""
+    h, w = shape[:2]
+    out = []
+    for x, y, bw, bh in boxes:
+        x0, y0 = max(0, int(x * scale)), max(0, int(y * scale))
+        x1, y1 = min(w, int(np.ceil((x + bw) * scale))), min(h, int(np.ceil((y + bh) * scale)))
+        if x1 > x0 and y1 > y0:
+            out.append((x0, y0, x1 - x0, y1 - y0))
+    return out
+
+
+class FaceBackend(abc.ABC):
+    """Base class: subclasses implement _detect_small(rgb) -> [(x, y, w, h)] on the detection copy."""
+
+    name = "base"
+
+    def __init__(self, max_side: int = FACE_DETECT_MAX_SIDE, score_thresh: float = FACE_SCORE_THRESH):
+        self.max_side = max_side
+        self.score_thresh = score_thresh
+        self._lock = threading.Lock()  # OpenCV / TF detectors keep per-call state
+
+    @abc.abstractmethod
+    def _detect_small(self, img_rgb: np.ndarray) -> List[Box]:
+        """Face boxes (x, y, w, h) in the coordinates of the detection copy."""
+
+    def detect(self, img_rgb: np.ndarray) -> List[Box]:
+        """Face boxes (x, y, w, h) in the coordinates of `img_rgb`."""
+        small, scale = _downscale(img_rgb, self.max_side)
+        with self._lock:
+            boxes = self._detect_small(small)
+        return _map_back(boxes, scale, img_rgb.shape)
+
+    def _detect_small_batch(self, imgs_rgb: List[np.ndarray]) -> List[List[Box]]:
+        """Per-image loop; backends with a real batched forward pass override it."""
+        return [self._detect_small(img) for img in imgs_rgb]
+
+    def detect_batch(self, imgs_rgb: List[np.ndarray]) -> List[List[Box]]:
+        """detect() for several images under one lock acquisition."""
+        smalls = [_downscale(img, self.max_side) for img in imgs_rgb]
+        with self._lock:
+            boxes = self._detect_small_batch([small for small, _ in smalls])
+        return [_map_back(b, scale, img.shape) for b, (_, scale), img in zip(boxes, smalls, imgs_rgb)]
+
+
+class YuNetBackend(FaceBackend):
+    name = "yunet"
+
+    def __init__(self, model_path: str = FACE_YUNET_MODEL, **kwargs):
+        super().__init__(**kwargs)
+        import cv2
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"YuNet weights not found: {model_path}")
+        self._det = cv2.FaceDetectorYN.create(model_path, "", (320, 320), self.score_thresh, 0.3, 5000)
+
+    def _detect_small(self, img_rgb):
+        import cv2
+        h, w = img_rgb.shape[:2]
+        self._det.setInputSize((w, h))
+        _, faces = self._det.detect(cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return []
+        return [tuple(f[:4]) for f in faces]
+
+
+class HaarBackend(FaceBackend):
+    name = "haar"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        import cv2
+        if not hasattr(cv2, "CascadeClassifier"):  # moved out of the main package in OpenCV 5
+            raise RuntimeError("this OpenCV build has no Haar cascades; use FACE_BACKEND=yunet")
+        self._det = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+    def _detect_small(self, img_rgb):
+        import cv2
+        gray = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2GRAY)
+        faces = self._det.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(20, 20))
+        return [tuple(f) for f in faces] if len(faces) else []
 
-    detections = detector.detect_faces(img)
-    for d in detections:
-        x, y, w, h = d["box"]
-        x, y = max(0, x), max(0, y)
-        face_roi = img_bgr[y:y+h, x:x+w]
+
+class MTCNNBackend(FaceBackend):
+    name = "mtcnn"
+
+    def __init__(self, max_side: int = FACE_MTCNN_MAX_SIDE, score_thresh: float = FACE_MTCNN_SCORE_THRESH):
+        super().__init__(max_side, score_thresh)
+        from mtcnn.mtcnn import MTCNN  # pulls in TensorFlow: deferred to first use / registry load
+        self._det = MTCNN()
+
+    def _keep(self, faces) -> List[Box]:
+        return [tuple(d["box"]) for d in faces if d.get("confidence", 1.0) >= self.score_thresh]
+
+    def _detect_small(self, img_rgb):
+        return self._keep(self._det.detect_faces(img_rgb))
+
+    def _detect_small_batch(self, imgs_rgb):
+        if len(imgs_rgb) <= 1:
+            return [self._detect_small(img) for img in imgs_rgb]
+        # mtcnn>=1.0 takes a list (padded to one tensor) and runs each stage once for the whole batch
+        return [self._keep(faces) for faces in self._det.detect_faces(list(imgs_rgb))]
+
+
+_BACKENDS = {"yunet": YuNetBackend, "haar": HaarBackend, "mtcnn": MTCNNBackend}
+_detectors: Dict[str, FaceBackend] = {}
+_detectors_lock = threading.Lock()
+
+
+def _resolve(name: Optional[str]) -> str:
+    name = (name or FACE_BACKEND).lower()
+    if name == "auto":
+        return "yunet" if os.path.exists(FACE_YUNET_MODEL) else "mtcnn"
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown FACE_BACKEND '{name}' (expected auto, {', '.join(_BACKENDS)})")
+    return name
+
+
+def init_face_detector(backend: Optional[str] = None) -> FaceBackend:
+    """Load (once) and return the face detector for `backend` (default FACE_BACKEND)."""
+    name = _resolve(backend)
+    with _detectors_lock:
+        if name not in _detectors:
+            _detectors[name] = _BACKENDS[name]()
+            print(f"[INFO] Face detector backend: {name}")
+        return _detectors[name]
+
+
+def detect_faces_batch(imgs_rgb: List[np.ndarray], backend: Optional[str] = None) -> List[List[Box]]:
+    """Face boxes for each RGB image, using one shared detector."""
+    return init_face_detector(backend).detect_batch(imgs_rgb)
+
+
+def _blur_boxes(pixels: np.ndarray, boxes: List[Box], blur_strength: int):
+    """Gaussian-blur each box in place (channel order does not matter)."""
+    import cv2
+    for x, y, w, h in boxes:
+        face_roi = pixels[y:y+h, x:x+w]
         if face_roi.size == 0:
             continue
-        face_roi = cv2.GaussianBlur(face_roi, (blur_strength, blur_strength), 30)
-        img_bgr[y:y+h, x:x+w] = face_roi
+        pixels[y:y+h, x:x+w] = cv2.GaussianBlur(face_roi, (blur_strength, blur_strength), 30)
+
+
+def blur_faces_image(image, blur_strength: int = 35, save_dir: Optional[str] = None, debug: Optional[bool] = None,
+                     backend: Optional[str] = None) -> DecodedImage:
+    """
+    Detect and blur faces without a JPEG round trip.
+    Accepts bytes or a DecodedImage and returns a blurred DecodedImage that the
+    detectors consume directly. Persisting is handed to the write-behind upload
+    store (utils.upload_store); save_dir / debug default to UPLOAD_DIR / UPLOAD_SAVE_ORIGINALS.
+    """
+    return blur_faces_images([image], blur_strength, save_dir, debug, backend)[0]
 
-    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-    pil_out = Image.fromarray(img_rgb)
 
-    # ensure save dir
-    os.makedirs(save_dir, exist_ok=True)
-    filename = uuid.uuid4().hex
+@traced("blur_faces")
+def blur_faces_images(images: list, blur_strength: int = 35, save_dir: Optional[str] = None,
+                      debug: Optional[bool] = None, backend: Optional[str] = None) -> List[DecodedImage]:
+    """blur_faces_image for several uploads with one shared detector."""
+    if debug is None:
+        debug = UPLOAD_SAVE_ORIGINALS
+    with stage("blur_faces.decode"):
+        decoded = [as_decoded(img) for img in images]
+    with stage("blur_faces.detect"):
+        boxes = detect_faces_batch([d.rgb for d in decoded], backend)
+    store = get_upload_store(save_dir) if UPLOAD_PERSIST else None
+    out = []
+    for original, bx in zip(decoded, boxes):
+        blurred = original.copy()
+        with stage("blur_faces.blur"):
+            _blur_boxes(blurred.rgb, bx, blur_strength)
+        if store is not None:
+            store.submit(blurred, original if debug else None)  # encoded + written in the background
+        out.append(blurred)
+    return out
 
-    if debug:
-        # save original
-        pil_img.save(os.path.join(save_dir, f"{filename}_original.jpg"), format="JPEG")
 
-    # save blurred
-    pil_out.save(os.path.join(save_dir, f"{filename}_blurred.jpg"), format="JPEG")
+def blur_faces(image_bytes: bytes, blur_strength: int = 35, save_dir: Optional[str] = None, debug: Optional[bool] = None) -> bytes:
+    """
+    Detect and blur faces.
+    Queues a blurred copy for `save_dir/uuid_blurred.jpg` (written in the background).
+    If debug=True, also saves original as `uuid_original.jpg`.
+    Returns new image bytes.
+    """
+    return blur_faces_image(image_bytes, blur_strength, save_dir, debug).to_jpeg()
+
 
-    # return as bytes
-    out_bytes = io.BytesIO()
-    pil_out.save(out_bytes, format="JPEG")
-    return out_bytes.getvalue()
+def blur_faces_batch(images: List[bytes], blur_strength: int = 35, save_dir: Optional[str] = None,
+                     debug: Optional[bool] = None, backend: Optional[str] = None) -> List[bytes]:
+    """blur_faces for several uploads with a single detector pass per image."""
+    return [d.to_jpeg() for d in blur_faces_images(images, blur_strength, save_dir, debug, backend)]
@@ -0,0 +1,136 @@
+"""
+backend/utils/image_io.py
+
+Decode-once image container shared by the upload pipeline:
+- An upload is decoded by PIL exactly once into an RGB uint8 array
+- BGR (OpenCV / color engine) and PIL views are derived lazily and cached
+- JPEG bytes are only produced when something is persisted or returned as bytes
+  (no extra lossy JPEG generation between face blurring and detection)
+
+Every stage that used to take `image_bytes` also accepts a DecodedImage;
+as_decoded() turns either into a DecodedImage.
+
+Preprocessing: uploads are capped to MAX_WORKING_SIDE on the long side while
+decoding (JPEG uses PIL draft() to decode at 1/2, 1/4 or 1/8 scale directly).
+The scale factors are kept so results can be reported in original-image
+coordinates via to_original().
+
+Tuning (env):
+- MAX_WORKING_SIDE  long side of the working image, 0 = no cap (default 1280)
+"""
+
+import io
+import os
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+MAX_WORKING_SIDE = int(os.getenv("MAX_WORKING_SIDE", "1280"))
+
+
+class DecodedImage:
+    """RGB pixels of one image plus cached BGR / PIL / JPEG views."""
+
+    __slots__ = ("rgb", "original_size", "_bgr", "_pil", "_jpeg")
+
+    def __init__(self, rgb: np.ndarray, pil: Optional[Image.Image] = None,
+                 original_size: Optional[Tuple[int, int]] = None):
+        self.rgb = rgb
+        # (width, height) of the upload before downscaling
+        self.original_size = original_size or (rgb.shape[1], rgb.shape[0])
+        self._bgr = None
+        self._pil = pil
+        self._jpeg: Dict[int, bytes] = {}  # quality -> encoded bytes
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_side: Optional[int] = None) -> "DecodedImage":
+        """Decode, capping the long side at max_side (default MAX_WORKING_SIDE)."""
+        max_side = MAX_WORKING_SIDE if max_side is None else max_side
+        pil = Image.open(io.BytesIO(data))
+        original_size = pil.size
+        if max_side and max(pil.size) > max_side:
+            s = max_side / max(pil.size)
+            target = (max(1, round(pil.size[0] * s)), max(1, round(pil.size[1] * s)))
+            pil.draft("RGB", target)  # JPEG: DCT-domain downscale, decodes far fewer pixels
+            pil = pil.convert("RGB")
+            if pil.size != target:
+                pil = pil.resize(target, Image.BILINEAR, reducing_gap=2.0)
+        else:
+            pil = pil.convert("RGB")
+        return cls(np.asarray(pil), pil, original_size)
+
+    @classmethod
+    def from_pil(cls, pil: Image.Image) -> "DecodedImage":
+        pil = pil.convert("RGB")
+        return cls(np.asarray(pil), pil)
+
+    @property
+    def scale(self) -> Tuple[float, float]:
+        """(sx, sy): original pixels per working pixel."""
+        return self.original_size[0] / self.rgb.shape[1], self.original_size[1] / self.rgb.shape[0]
+
+    def to_original(self, bbox: Sequence[float]) -> List[int]:
+        """Map an [x1, y1, x2, y2] box from working to original-image coordinates."""
+        sx, sy = self.scale
+        if sx == 1.0 and sy == 1.0:
+            return [int(v) for v in bbox]
+        x1, y1, x2, y2 = bbox
+        W, H = self.original_size
+        return [min(W, int(round(x1 * sx))), min(H, int(round(y1 * sy))),
+                min(W, int(round(x2 * sx))), min(H, int(round(y2 * sy)))]
+
+    @property
+    def height(self) -> int:
+        return self.rgb.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.rgb.shape[1]
+
+    @property
+    def shape(self):
+        return self.rgb.shape
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """BGR view for OpenCV-style consumers (computed once)."""
+        if self._bgr is None:
+            self._bgr = np.ascontiguousarray(self.rgb[:, :, ::-1])
+        return self._bgr
+
+    @property
+    def pil(self) -> Image.Image:
+        if self._pil is None:
+            self._pil = Image.fromarray(self.rgb)
+        return self._pil
+
+    def copy(self) -> "DecodedImage":
+        """Writable copy of the pixels (views are not carried over)."""
+        return DecodedImage(np.array(self.rgb, copy=True), original_size=self.original_size)
+
+    def to_jpeg(self, quality: int = 75) -> bytes:
+        """Encode once per quality; later calls return the cached bytes."""
+        data = self._jpeg.get(quality)
+        if data is None:
+            buf = io.BytesIO()
+            self.pil.save(buf, format="JPEG", quality=quality)
+            data = self._jpeg[quality] = buf.getvalue()
+        return data
+
+    def save(self, path: str, quality: int = 75):
+        with open(path, "wb") as f:
+            f.write(self.to_jpeg(quality))
+
+
+def as_decoded(image: Union[bytes, bytearray, DecodedImage, Image.Image, np.ndarray]) -> DecodedImage:
+    """Accept raw bytes, a DecodedImage, a PIL image or an RGB array."""
+    if isinstance(image, DecodedImage):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return DecodedImage.from_bytes(bytes(image))
+    if isinstance(image, Image.Image):
+        return DecodedImage.from_pil(image)
+    if isinstance(image, np.ndarray):
+        return DecodedImage(image)
+    raise TypeError(f"Unsupported image type: {type(image).__name__}")
@@ -3,7 +3,10 @@
 # backend/utils/llm_analyzer.py
 import json
 from typing import Dict, Any, Optional
-from .perplexity_client import call_perplexity_chat
+from .perplexity_client import call_perplexity_chat, acall_perplexity_chat
+from .llm_cache import get_llm_cache, outfit_signature
+from .tracing import traced
+from .prompt_compactor import compact_detections
 
 ANALYZER_SYSTEM = (
     "You are a concise, objective fashion analyst. "
@@ -33,24 +36,16 @@ Output schema (JSON ONLY):
 }}
 """
 
-def analyze_outfit(detections: Dict[str, Any], person_regions: Optional[list] = None, occasion: Optional[str] = "casual") -> Dict[str, Any]:
-    """
-    detections: the JSON returned by detect_image_bytes (detections + person_regions).
-    occasion: optional user-selected occasion (can be casual).
-    Returns parsed JSON per schema above.
-    """
-    payload = {
-        "detections": detections or [],
-        "person_regions": person_regions or [],
-        "occasion": occasion or ""
-    }
-    user_msg = ANALYZER_USER_TEMPLATE.format(input_json=json.dumps(payload))
-    messages = [
+def _analyzer_messages(detections: Dict[str, Any], person_regions: Optional[list], occasion: Optional[str]) -> list:
+    # deduped, geometry-free, token-budgeted summary instead of the full detections JSON
+    payload, _ = compact_detections(detections, person_regions, occasion)
+    user_msg = ANALYZER_USER_TEMPLATE.format(input_json=json.dumps(payload, separators=(",", ":")))
+    return [
         {"role": "system", "content": ANALYZER_SYSTEM},
         {"role": "user", "content": user_msg}
     ]
 
-    raw, content = call_perplexity_chat(messages)
+def _parse_analysis(content: str) -> Dict[str, Any]:
     # parse content as JSON
     try:
         parsed = json.loads(content)
@@ -71,3 +66,33 @@ def analyze_outfit(detections: Dict[str, Any], person_regions: Optional[list] =
                 "llm_tags": []
             }
     return parsed
+
+@traced("analyze_outfit")
+def analyze_outfit(detections: Dict[str, Any], person_regions: Optional[list] = None, occasion: Optional[str] = "casual") -> Dict[str, Any]:
+    """
+    detections: the JSON returned by detect_image_bytes (detections + person_regions).
+    occasion: optional user-selected occasion (can be casual).
+    Returns parsed JSON per schema above.
+    """
+    key = outfit_signature("analyze", detections, person_regions, occasion)
+    cached = get_llm_cache().get(key) if key else None
+    if cached is not None:
+        return cached
+    raw, content = call_perplexity_chat(_analyzer_messages(detections, person_regions, occasion))
+    parsed = _parse_analysis(content)
+    if key:
+        get_llm_cache().set(key, parsed)
+    return parsed
+
+@traced("analyze_outfit")
+async def analyze_outfit_async(detections: Dict[str, Any], person_regions: Optional[list] = None, occasion: Optional[str] = "casual") -> Dict[str, Any]:
+    """Same as analyze_outfit, awaiting the pooled async client instead of blocking."""
+    key = outfit_signature("analyze", detections, person_regions, occasion)
+    cached = get_llm_cache().get(key) if key else None
+    if cached is not None:
+        return cached
+    raw, content = await acall_perplexity_chat(_analyzer_messages(detections, person_regions, occasion))
+    parsed = _parse_analysis(content)
+    if key:
+        get_llm_cache().set(key, parsed)
+    return parsed
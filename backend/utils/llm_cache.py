@@ -0,0 +1,114 @@
+"""
+backend/utils/llm_cache.py
+
+Semantic response cache for the LLM analyzer / enhancer:
+- Keyed on a canonical outfit signature instead of the raw detections JSON:
+  sorted refined labels + quantized color buckets + occasion (no bbox pixels)
+- Exact-signature hits skip the network call entirely
+- Payloads with no readable garment get no signature and are never cached
+- TTL + LRU + optional SQLite persistence via utils.cache.TieredCache
+
+Tuning (env):
+- LLM_CACHE_MAX_ENTRIES  (0 disables, default 1024)
+- LLM_CACHE_TTL_S        (default 21600 = 6h)
+- LLM_CACHE_DIR          directory for the SQLite tier (unset = memory only)
+- LLM_CACHE_COLOR_LEVELS quantization levels per RGB channel (default 4)
+"""
+
+import os
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from .cache import TieredCache
+
+COLOR_LEVELS = int(os.getenv("LLM_CACHE_COLOR_LEVELS", "4"))
+
+
+def color_bucket(rgb) -> str:
+    """Quantize an RGB triple to COLOR_LEVELS steps per channel, e.g. [250, 20, 30] -> "3-0-0"."""
+    if not rgb:
+        return "-"
+    step = 256 / COLOR_LEVELS
+    return "-".join(str(min(COLOR_LEVELS - 1, int(v // step))) for v in list(rgb)[:3])
+
+
+def _detection_list(detections: Any) -> List[Dict[str, Any]]:
+    """Accept a detect_image_bytes(_v2) result dict, a bare list, or the frontend's keyed dict."""
+    if isinstance(detections, list):
+        return detections
+    if not isinstance(detections, dict):
+        return []
+    for key in ("refined_detections", "filtered_detections", "detections", "raw_detections"):
+        if detections.get(key):
+            return detections[key]
+    return keyed_detections(detections)
+
+
+def keyed_detections(detections: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The frontend posts detections keyed as {"detection_0": {...}, "detection_1": {...}}."""
+    return [v for v in detections.values() if isinstance(v, dict) and "label" in v]
+
+
+def primary_rgb(det: Dict[str, Any]):
+    """Primary color of a v2 (colors list) or v1 / frontend (dominant_color_rgb / _hex) detection."""
+    colors = det.get("colors")
+    if colors:
+        return colors[0].get("rgb")
+    if det.get("dominant_color_rgb"):
+        return det["dominant_color_rgb"]
+    hex_color = (det.get("dominant_color_hex") or "").lstrip("#")
+    if len(hex_color) == 6:
+        return [int(hex_color[i:i + 2], 16) for i in (0, 2, 4)]
+    return None
+
+
+def outfit_signature(kind: str, detections: Any, person_regions: Optional[list] = None,
+                     occasion: Optional[str] = None, extra: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Canonical, quantized signature of an outfit for `kind` ("analyze" / "enhance").
+    Two uploads with the same garments in the same color buckets map to the same key.
+    None when no garment could be read from `detections`: such a key would be shared
+    by every unrecognized payload, so callers must not cache the response.
+    """
+    items = sorted({
+        f"{(d.get('refined_label') or d.get('label') or '').lower()}|{color_bucket(primary_rgb(d))}"
+        for d in _detection_list(detections)
+    })
+    if not items:
+        return None
+    if person_regions is None and isinstance(detections, dict):
+        person_regions = detections.get("person_regions")
+    regions = sorted({
+        f"{rname}|{color_bucket(primary_rgb(region))}"
+        for person in (person_regions or [])
+        for rname, region in (person.get("regions") or {}).items()
+    })
+    canon = {
+        "kind": kind,
+        "items": items,
+        "regions": regions,
+        "occasion": (occasion or "").strip().lower(),
+        "extra": sorted(str(e).lower() for e in (extra or [])),
+    }
+    return hashlib.sha256(json.dumps(canon, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+_LLM_CACHE = None
+
+def get_llm_cache() -> TieredCache:
+    global _LLM_CACHE
+    if _LLM_CACHE is None:
+        _LLM_CACHE = TieredCache(
+            "llm",
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+            ttl_s=float(os.getenv("LLM_CACHE_TTL_S", "21600")),
+            disk_dir=os.getenv("LLM_CACHE_DIR") or None,
+        )
+    return _LLM_CACHE
+
+
+def llm_cache_stats() -> Dict[str, Any]:
+    stats = get_llm_cache().stats()
+    stats["llm_calls_saved"] = stats["memory_hits"] + stats["disk_hits"]
+    return stats
@@ -3,7 +3,10 @@
 # backend/utils/llm_enhancer.py
 import json
 from typing import List, Dict, Any, Optional
-from .perplexity_client import call_perplexity_chat
+from .perplexity_client import call_perplexity_chat, acall_perplexity_chat
+from .llm_cache import get_llm_cache, outfit_signature
+from .tracing import traced
+from .prompt_compactor import compact_detections, compact_recommendations
 
 ENHANCER_SYSTEM = (
     "You are a friendly stylist assistant. Given a user's current outfit detections, occasion, and a candidate list of recommended items, "
@@ -25,17 +28,19 @@ Return JSON only:
 }}
 """
 
-def enhance_recommendation(detections: Dict[str, Any], occasion: str, recommendations: List[Dict[str,Any]]) -> Dict[str,Any]:
+def _enhancer_messages(detections: Dict[str, Any], occasion: str, recommendations: List[Dict[str,Any]]) -> list:
+    summary, _ = compact_detections(detections)
     user_prompt = ENHANCER_USER_TEMPLATE.format(
-        detections=json.dumps(detections),
+        detections=json.dumps({"items": summary["items"], "regions": summary["regions"]}, separators=(",", ":")),
         occasion=occasion or "",
-        recommendations=json.dumps(recommendations)
+        recommendations=json.dumps(compact_recommendations(recommendations), separators=(",", ":"))
     )
-    messages = [
+    return [
         {"role": "system", "content": ENHANCER_SYSTEM},
         {"role": "user", "content": user_prompt}
     ]
-    _, content = call_perplexity_chat(messages)
+
+def _parse_enhanced(content: str) -> Dict[str,Any]:
     try:
         parsed = json.loads(content)
     except Exception:
@@ -47,3 +52,33 @@ def enhance_recommendation(detections: Dict[str, Any], occasion: str, recommenda
             "items_explained": []
         }
     return parsed
+
+def _enhancer_key(detections: Dict[str, Any], occasion: str, recommendations: List[Dict[str,Any]]) -> Optional[str]:
+    # the recommended labels shape the answer, so they are part of the signature
+    return outfit_signature("enhance", detections, None, occasion,
+                            extra=[r.get("label", "") for r in (recommendations or [])])
+
+@traced("enhance_recommendation")
+def enhance_recommendation(detections: Dict[str, Any], occasion: str, recommendations: List[Dict[str,Any]]) -> Dict[str,Any]:
+    key = _enhancer_key(detections, occasion, recommendations)
+    cached = get_llm_cache().get(key) if key else None
+    if cached is not None:
+        return cached
+    _, content = call_perplexity_chat(_enhancer_messages(detections, occasion, recommendations))
+    parsed = _parse_enhanced(content)
+    if key:
+        get_llm_cache().set(key, parsed)
+    return parsed
+
+@traced("enhance_recommendation")
+async def enhance_recommendation_async(detections: Dict[str, Any], occasion: str, recommendations: List[Dict[str,Any]]) -> Dict[str,Any]:
+    """Same as enhance_recommendation, awaiting the pooled async client instead of blocking."""
+    key = _enhancer_key(detections, occasion, recommendations)
+    cached = get_llm_cache().get(key) if key else None
+    if cached is not None:
+        return cached
+    _, content = await acall_perplexity_chat(_enhancer_messages(detections, occasion, recommendations))
+    parsed = _parse_enhanced(content)
+    if key:
+        get_llm_cache().set(key, parsed)
+    return parsed
@@ -0,0 +1,152 @@
+"""
+backend/utils/model_registry.py
+
+Startup model registry:
+- Loads every model the API needs (YOLO ensemble, CLIP/FashionCLIP + label bank, face detector,
+  catalog index)
+  at startup instead of on the first user request, optionally in parallel
+- Runs a dummy warm-up inference through each model
+- stop() skips whatever has not started yet, so shutdown does not wait for every model
+- Keeps per-model status and load / warm-up times for the /ready endpoint; optional components
+  (the API degrades without them) do not hold readiness back once they failed or were skipped
+- mark_lazy() for MODEL_EAGER_LOAD=0: nothing is loaded up front, models load on first use
+
+Tuning (env):
+- MODEL_PARALLEL_LOAD  load models concurrently (default 1)
+- MODEL_WARMUP         run warm-up inferences after loading (default 1)
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+
+class ModelRegistry:
+    """Named (loader, warmup) pairs with per-model status."""
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def register(self, name: str, loader: Callable[[], Any], warmup: Optional[Callable[[Any], Any]] = None,
+                 optional: bool = False):
+        self._entries[name] = (loader, warmup)
+        self._status[name] = {"status": "pending", "optional": optional,
+                              "load_s": None, "warmup_s": None, "error": None}
+
+    def _set(self, name: str, **fields):
+        with self._lock:
+            self._status[name].update(fields)
+
+    def stop(self):
+        """Ask load_all to start nothing new (loads already running finish; threads cannot be killed)."""
+        self._stop.set()
+
+    def mark_lazy(self):
+        """No startup load: every model is loaded by its first request instead."""
+        with self._lock:
+            for st in self._status.values():
+                st["status"] = "lazy"
+
+    def load_one(self, name: str, warmup: bool = True):
+        loader, warm = self._entries[name]
+        if self._stop.is_set():
+            self._set(name, status="skipped")
+            return
+        self._set(name, status="loading")
+        try:
+            t0 = time.perf_counter()
+            obj = loader()
+            self._set(name, load_s=round(time.perf_counter() - t0, 3))
+            if warmup and warm is not None and not self._stop.is_set():
+                self._set(name, status="warming")
+                t0 = time.perf_counter()
+                warm(obj)
+                self._set(name, warmup_s=round(time.perf_counter() - t0, 3))
+            self._set(name, status="ready")
+            print(f"[INFO] Model '{name}' ready")
+        except Exception as e:
+            self._set(name, status="failed", error=str(e))
+            print(f"[WARN] Model '{name}' failed to load:", e)
+
+    def load_all(self, parallel: Optional[bool] = None, warmup: Optional[bool] = None):
+        if parallel is None:
+            parallel = os.getenv("MODEL_PARALLEL_LOAD", "1") == "1"
+        if warmup is None:
+            warmup = os.getenv("MODEL_WARMUP", "1") == "1"
+        names = list(self._entries)
+        if parallel and len(names) > 1:
+            with ThreadPoolExecutor(len(names), thread_name_prefix="model-load") as pool:
+                list(pool.map(lambda n: self.load_one(n, warmup), names))
+        else:
+            for name in names:
+                self.load_one(name, warmup)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: dict(st) for name, st in self._status.items()}
+
+    def ready(self) -> bool:
+        with self._lock:
+            return all(st["status"] in ("ready", "lazy")
+                       or (st["optional"] and st["status"] in ("failed", "skipped"))
+                       for st in self._status.values())
+
+
+# -------------------
+# Default registry
+# -------------------
+
+def _warm_ensemble(get_batcher):
+    def warm(_models):
+        get_batcher().predict(np.zeros((640, 640, 3), dtype=np.uint8), 0.25)
+    return warm
+
+
+def _load_classifier():
+    from .classify import init_classifier, get_label_bank
+    init_classifier()
+    return get_label_bank()  # stacks the FINE_LABELS text embeddings once
+
+
+def _warm_classifier(bank):
+    from PIL import Image
+    from .classify import image_embeddings
+    bank.top_k(image_embeddings([Image.new("RGB", (224, 224))]), k=1)
+
+
+def _load_catalog_index():
+    from .retrieval import get_catalog_index, catalog_index_error
+    index = get_catalog_index()
+    if catalog_index_error() is not None:  # shows up as 'failed' on /ready
+        raise RuntimeError(catalog_index_error())
+    return index
+
+
+def _warm_face_detector(detector):
+    detector.detect(np.zeros((160, 160, 3), dtype=np.uint8))
+
+
+_REGISTRY = None
+
+def get_registry() -> ModelRegistry:
+    """Registry with every model the API serves."""
+    global _REGISTRY
+    if _REGISTRY is None:
+        from . import detect
+        from .face_blur import init_face_detector
+
+        registry = ModelRegistry()
+        registry.register("yolo", detect.init_models, _warm_ensemble(detect.get_batcher))  # shared by D2
+        registry.register("classifier", _load_classifier, _warm_classifier)
+        registry.register("face_detector", init_face_detector, _warm_face_detector)
+        registry.register("catalog_index", _load_catalog_index, optional=True)  # recommendations fall back without it
+        _REGISTRY = registry
+    return _REGISTRY
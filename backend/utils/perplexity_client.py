@@ -2,32 +2,39 @@
 
 # backend/utils/perplexity_client.py
 import os
+import random
+import asyncio
 import requests
-from typing import List, Dict, Any, Tuple
+import httpx
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Tuple, Optional
 
 from dotenv import load_dotenv
 load_dotenv()
 
 API_URL = os.getenv("API_URL")  # Perplexity chat endpoint (OpenAI-like)
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL")  # recommended model in docs
+API_KEY = os.getenv("PERPLEXITY_API_KEY")  # read once at import
 
-def call_perplexity_chat(messages: List[Dict[str, str]], model: str = DEFAULT_MODEL, timeout: int = 30) -> Tuple[Dict[str, Any], str]:
-    """
-    Call Perplexity Chat Completions endpoint.
-    messages: list of {"role":"system"|"user"|"assistant", "content": "..."}
-    returns: (raw_json_response, content_string)
-    """
-    api_key = os.getenv("PERPLEXITY_API_KEY")
+# async client tuning
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "30"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _headers(api_key: Optional[str]) -> Dict[str, str]:
     if not api_key:
         raise RuntimeError("PERPLEXITY_API_KEY not set in environment")
-
-    headers = {
+    return {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
         "Accept": "application/json",
     }
 
-    payload = {
+
+def _payload(messages: List[Dict[str, str]], model: str) -> Dict[str, Any]:
+    return {
         "model": model,
         "messages": messages,
         # you can tune max_tokens / temperature etc here
@@ -35,13 +42,160 @@ def call_perplexity_chat(messages: List[Dict[str, str]], model: str = DEFAULT_MO
         "max_tokens": 512
     }
 
-    resp = requests.post(API_URL, json=payload, headers=headers, timeout=timeout)
-    resp.raise_for_status()
-    data = resp.json()
+
+def _content(data: Dict[str, Any]) -> str:
     # Perplexity returns choices similar to OpenAI: choices[0].message.content
     try:
-        content = data["choices"][0]["message"]["content"]
+        return data["choices"][0]["message"]["content"]
     except Exception:
         # fallback: some responses are in `result` or `text`
-        content = data.get("text", "") or str(data)
-    return data, content
+        return data.get("text", "") or str(data)
+
+
+# --- Sync client (keep-alive session shared by all calls) ---
+_SESSION = None
+
+def _get_session() -> requests.Session:
+    global _SESSION
+    if _SESSION is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=LLM_MAX_CONCURRENCY)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _SESSION = session
+    return _SESSION
+
+
+def call_perplexity_chat(messages: List[Dict[str, str]], model: str = DEFAULT_MODEL, timeout: int = 30) -> Tuple[Dict[str, Any], str]:
+    """
+    Call Perplexity Chat Completions endpoint.
+    messages: list of {"role":"system"|"user"|"assistant", "content": "..."}
+    returns: (raw_json_response, content_string)
+    """
+    headers = _headers(API_KEY)
+    resp = _get_session().post(API_URL, json=_payload(messages, model), headers=headers, timeout=timeout)
+    resp.raise_for_status()
+    data = resp.json()
+    return data, _content(data)
+
+
+# --- Async client ---
+class AsyncPerplexityClient:
+    """
+    Non-blocking chat client:
+    - keep-alive connection pool (httpx.AsyncClient)
+    - concurrency limit shared by all callers
+    - retries with full-jitter exponential backoff on 429/5xx and transport errors
+    - a per-call deadline covering queueing, retries and backoff
+    api_url / api_key are injectable so it can be pointed at a local fake endpoint.
+    """
+
+    def __init__(self, api_url: Optional[str] = None, api_key: Optional[str] = None,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES,
+                 deadline_s: float = LLM_DEADLINE_S, backoff_base_s: float = 0.5, backoff_max_s: float = 8.0):
+        self.api_url = api_url or API_URL
+        self.api_key = api_key or API_KEY
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.deadline_s = deadline_s
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    async def _ensure(self):
+        # httpx clients and semaphores belong to one event loop
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None:
+                # pooled connections of the previous loop; it may already be closed
+                try:
+                    await self._client.aclose()
+                except Exception:
+                    pass
+            limits = httpx.Limits(max_connections=self.max_concurrency,
+                                  max_keepalive_connections=self.max_concurrency)
+            self._client = httpx.AsyncClient(limits=limits)
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return loop
+
+    def _backoff(self, attempt: int, resp: Optional[httpx.Response]) -> float:
+        delay = random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt)))
+        if resp is not None:
+            try:
+                delay = max(delay, float(resp.headers.get("Retry-After", 0)))
+            except ValueError:
+                pass
+        return delay
+
+    async def chat(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL,
+                   deadline_s: Optional[float] = None) -> Tuple[Dict[str, Any], str]:
+        """Async equivalent of call_perplexity_chat; returns (raw_json_response, content_string)."""
+        headers = _headers(self.api_key)
+        loop = await self._ensure()
+        deadline = loop.time() + (deadline_s if deadline_s is not None else self.deadline_s)
+
+        await asyncio.wait_for(self._sem.acquire(), timeout=max(0.0, deadline - loop.time()))
+        try:
+            last_exc: Optional[Exception] = None
+            for attempt in range(self.max_retries + 1):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                resp = None
+                try:
+                    # httpx timeouts are per phase; wait_for bounds the whole request
+                    resp = await asyncio.wait_for(
+                        self._client.post(self.api_url, json=_payload(messages, model),
+                                          headers=headers, timeout=remaining),
+                        timeout=remaining)
+                    if resp.status_code not in RETRY_STATUSES:
+                        resp.raise_for_status()
+                        data = resp.json()
+                        return data, _content(data)
+                    last_exc = httpx.HTTPStatusError(f"retryable status {resp.status_code}",
+                                                     request=resp.request, response=resp)
+                except httpx.TransportError as e:
+                    last_exc = e
+                except asyncio.TimeoutError as e:
+                    raise asyncio.TimeoutError("LLM call deadline exceeded") from (last_exc or e)
+
+                if attempt == self.max_retries:
+                    break
+                delay = self._backoff(attempt, resp)
+                if loop.time() + delay >= deadline:
+                    break
+                await asyncio.sleep(delay)
+
+            if last_exc is None:
+                raise asyncio.TimeoutError("LLM call deadline exceeded")
+            raise last_exc
+        finally:
+            self._sem.release()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_ASYNC_CLIENT = None
+
+def get_async_client() -> AsyncPerplexityClient:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        _ASYNC_CLIENT = AsyncPerplexityClient()
+    return _ASYNC_CLIENT
+
+
+async def acall_perplexity_chat(messages: List[Dict[str, str]], model: str = DEFAULT_MODEL,
+                                deadline_s: Optional[float] = None) -> Tuple[Dict[str, Any], str]:
+    """Await a chat completion on the shared pooled client."""
+    return await get_async_client().chat(messages, model=model, deadline_s=deadline_s)
+
+
+async def close_async_client():
+    if _ASYNC_CLIENT is not None:
+        await _ASYNC_CLIENT.aclose()
@@ -0,0 +1,178 @@
+"""
+backend/utils/prompt_compactor.py
+
+Prompt payload compaction for the LLM analyzer / enhancer:
+- Dedupes the raw / filtered / refined detection lists of detect_image_bytes_v2
+  (they are mostly the same detections repeated); raw detections that were merged into a
+  fused box (its "fused_ids", see utils.box_fusion) are dropped, not listed as low_conf
+- Drops geometry the LLM does not need (bboxes, image size, source model)
+- Collapses repeats of the same garment + color bucket into one item with a count
+- Trims the lowest-priority items until the summary fits a token budget
+- Reports bytes / estimated tokens before and after
+
+Tuning (env):
+- PROMPT_TOKEN_BUDGET  token budget for the outfit summary (default 350)
+"""
+
+import os
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .llm_cache import color_bucket, primary_rgb, keyed_detections
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "350"))
+CHARS_PER_TOKEN = 4  # rough average for JSON-ish English text
+
+# later stages carry more information, so they win when an item appears twice
+_STAGE_RANK = {"refined_detections": 0, "filtered_detections": 1, "detections": 1, "raw_detections": 2}
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def _hex(rgb) -> Optional[str]:
+    if not rgb:
+        return None
+    return "#{:02x}{:02x}{:02x}".format(*[int(v) for v in list(rgb)[:3]])
+
+
+def _merged_detections(detections: Any) -> List[Tuple[int, Dict[str, Any]]]:
+    """Union of all detection lists, one entry per (model, label, bbox), best stage kept."""
+    if isinstance(detections, list):
+        sources = [("detections", detections)]
+    elif isinstance(detections, dict) and any(k in detections for k in _STAGE_RANK):
+        sources = [(k, detections.get(k) or []) for k in _STAGE_RANK]
+    elif isinstance(detections, dict):
+        sources = [("detections", keyed_detections(detections))]
+    else:
+        sources = []
+
+    # raw members of a fused box are the same object under its pre-fusion bbox
+    fused_ids = {i for stage, dets in sources if stage != "raw_detections" for d in dets
+                 for i in d.get("fused_ids") or ()}
+
+    best: Dict[tuple, Tuple[int, Dict[str, Any]]] = {}
+    for stage, dets in sources:
+        rank = _STAGE_RANK[stage]
+        for i, d in enumerate(dets):
+            if stage == "raw_detections" and i in fused_ids:
+                continue
+            key = (d.get("source_model"), (d.get("label") or "").lower(), tuple(d.get("bbox") or ()))
+            if key not in best or rank < best[key][0]:
+                best[key] = (rank, d)
+    return list(best.values())
+
+
+def _compact_item(rank: int, d: Dict[str, Any]) -> Dict[str, Any]:
+    label = (d.get("label") or "").lower()
+    refined = (d.get("refined_label") or label).lower()
+    conf = d.get("refined_confidence", d.get("confidence"))
+    if d.get("colors"):
+        colors = [c.get("hex") or _hex(c.get("rgb")) for c in d["colors"]]
+    else:
+        colors = [d.get("dominant_color_hex") or _hex(d.get("dominant_color_rgb"))]
+    item = {"label": refined}
+    if refined != label:
+        item["detected_as"] = label
+    if conf is not None:
+        item["conf"] = round(float(conf), 2)
+    colors = [c for c in colors if c]
+    if colors:
+        item["colors"] = colors
+    if rank == _STAGE_RANK["raw_detections"]:
+        item["low_conf"] = True  # did not pass the filter stage
+    return item
+
+
+def _compact_regions(person_regions: Optional[list]) -> List[Dict[str, str]]:
+    out = []
+    for person in person_regions or []:
+        regions = {}
+        for rname, region in (person.get("regions") or {}).items():
+            hex_color = region.get("dominant_color_hex") or _hex(region.get("dominant_color_rgb"))
+            if hex_color:
+                regions[rname] = hex_color
+        if regions:
+            out.append(regions)
+    return out
+
+
+def _count_detections(detections: Any) -> int:
+    if isinstance(detections, list):
+        return len(detections)
+    if isinstance(detections, dict) and any(k in detections for k in _STAGE_RANK):
+        return sum(len(detections.get(k) or []) for k in _STAGE_RANK)
+    if isinstance(detections, dict):
+        return len(keyed_detections(detections))
+    return 0
+
+
+# running totals, see compaction_stats()
+_TOTALS = {"calls": 0, "bytes_before": 0, "bytes_after": 0, "tokens_before": 0, "tokens_after": 0}
+_TOTALS_LOCK = threading.Lock()
+
+
+def compact_detections(detections: Any, person_regions: Optional[list] = None, occasion: Optional[str] = None,
+                       token_budget: Optional[int] = None) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    Build the compact outfit summary sent to the LLM.
+    Returns (summary, stats) where stats holds bytes / estimated tokens before and after.
+    """
+    token_budget = PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    if person_regions is None and isinstance(detections, dict):
+        person_regions = detections.get("person_regions")
+
+    original = _dumps({"detections": detections or [], "person_regions": person_regions or [], "occasion": occasion or ""})
+
+    # collapse repeats of the same garment in the same color bucket
+    grouped: Dict[tuple, Dict[str, Any]] = {}
+    order: List[tuple] = []
+    for rank, d in sorted(_merged_detections(detections), key=lambda rd: (rd[0], -float(rd[1].get("confidence") or 0))):
+        item = _compact_item(rank, d)
+        key = (item["label"], color_bucket(primary_rgb(d)))
+        if key in grouped:
+            grouped[key]["n"] = grouped[key].get("n", 1) + 1
+            continue
+        grouped[key] = item
+        order.append(key)
+    items = [grouped[k] for k in order]
+
+    summary = {"occasion": occasion or "", "items": items, "regions": _compact_regions(person_regions)}
+    text = _dumps(summary)
+    # over budget: drop the lowest-priority items (raw-only / least confident come last)
+    while items and estimate_tokens(text) > token_budget:
+        items.pop()
+        text = _dumps(summary)
+
+    stats = {
+        "items_in": _count_detections(detections),
+        "items_out": len(items),
+        "bytes_before": len(original.encode("utf-8")),
+        "bytes_after": len(text.encode("utf-8")),
+        "tokens_before": estimate_tokens(original),
+        "tokens_after": estimate_tokens(text),
+    }
+    with _TOTALS_LOCK:
+        _TOTALS["calls"] += 1
+        for k in ("bytes_before", "bytes_after", "tokens_before", "tokens_after"):
+            _TOTALS[k] += stats[k]
+    return summary, stats
+
+
+def compact_recommendations(recommendations: Optional[List[Dict[str, Any]]]) -> List[Dict[str, str]]:
+    """Only label + source of each recommendation reach the prompt."""
+    return [{"label": r.get("label", ""), "source": r.get("source", "")} for r in (recommendations or [])]
+
+
+def compaction_stats() -> Dict[str, Any]:
+    with _TOTALS_LOCK:
+        totals = dict(_TOTALS)
+    if totals["bytes_before"]:
+        totals["bytes_saved_ratio"] = round(1 - totals["bytes_after"] / totals["bytes_before"], 4)
+    return totals
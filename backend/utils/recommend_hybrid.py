@@ -3,6 +3,8 @@
 # backend/utils/recommend_hybrid.py
 from typing import List, Dict, Any, Optional, Set
 
+from .tracing import traced
+
 # small rule-base for demo; extend as needed
 OCCASION_RULES = {
     "casual": {
@@ -32,26 +34,28 @@ def rule_based_suggestions(detections: List[Dict[str,Any]], occasion: str) -> Li
         suggestions.append({"label": s, "source": "rule"})
     return suggestions
 
-# Placeholder for ML retrieval — replace with FAISS+FashionCLIP later
-def retrieve_similar_items(detections: List[Dict[str,Any]], top_k: int = 5) -> List[Dict[str,Any]]:
+def retrieve_similar_items(detections: List[Dict[str,Any]], top_k: int = 5, image=None) -> List[Dict[str,Any]]:
     """
-    Implement your ML retrieval here (compute embeddings for detected items,
-    search FAISS index, return candidate items).
-    For now returns empty list (or mock items).
+    ML retrieval: embed the detected items (crops of `image` when given, else
+    "<color> <label>" text queries) and search the FAISS catalog index
+    (utils.retrieval). Returns catalog items with a "label"; [] without an index.
     """
-    # Mock example (you should replace)
-    return []
+    from .retrieval import retrieve_catalog_items
+    return retrieve_catalog_items(detections, top_k=top_k, image=image)
 
 
+@traced("generate_hybrid_recommendations")
 def generate_hybrid_recommendations(
     detections: List[Dict[str,Any]],
     person_regions: List[Dict[str,Any]],
     occasion: Optional[str] = "casual",
     llm_suggestions: Optional[List[str]] = None,
-    exclude_previous: Optional[Set[str]] = None
+    exclude_previous: Optional[Set[str]] = None,
+    ml_items: Optional[List[Dict[str,Any]]] = None
 ) -> List[Dict[str,Any]]:
     """
     Combine LLM suggestions, rules, and ML retrieval, filter duplicates and excluded items.
+    ml_items: precomputed retrieve_similar_items output (e.g. fetched while the LLM was busy).
     Returns list of recommendation dicts: {"label":..., "source": "ml|rule|llm"}
     """
     if exclude_previous is None:
@@ -76,7 +80,13 @@ def generate_hybrid_recommendations(
             seen.add(key)
 
     # 3) ML retrieval (if any)
-    ml_items = retrieve_similar_items(detections)
+    if ml_items is None:
+        try:
+            ml_items = retrieve_similar_items(detections)
+        except Exception as e:
+            # retrieval is an extra source: rules and LLM suggestions still answer
+            print("[WARN] ML retrieval failed:", e)
+            ml_items = []
     for m in ml_items:
         key = m["label"].lower()
         if key not in exclude_previous and key not in seen:
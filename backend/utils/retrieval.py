@@ -0,0 +1,350 @@
+"""
+backend/utils/retrieval.py
+
+FAISS-backed product catalog retrieval:
+- Offline: scripts/build_catalog_index.py embeds a local catalog with the
+  classifier's image encoder (utils.classify) and writes an index directory:
+    store/           memory-mapped L2-normalized embeddings + metadata (utils.embedding_store),
+                     row i <-> vector id i; shared by all workers through the page cache
+    index.faiss      FAISS inner-product index (hnsw | ivf | flat), read with mmap where supported;
+                     kind "exact" has none and searches the store directly
+    index.json       build config (kind, dim, count, nlist / hnsw_m, encoder_model, encoder_kind)
+- The index is only served / appended to with the CLIP model and CLIP_ENCODER it was
+  built with (check_encoder): vectors from another embedding space would search
+  without error but return nonsense
+- append_items() adds products incrementally (store append + index add)
+- Online: detection crops (or, without pixels, a text embedding of "<color> <label>")
+  are embedded in one batch and searched; results are top-k items per detection
+
+Tuning (env):
+- RETRIEVAL_INDEX_DIR   index directory (default ./catalog_index)
+- RETRIEVAL_NPROBE      IVF lists probed per query (default 16)
+- RETRIEVAL_EF_SEARCH   HNSW candidate list size per query (default 64)
+- RETRIEVAL_THREADS     FAISS OpenMP threads (default 1, requests already run in parallel)
+- RETRIEVAL_MIN_SCORE   drop hits below this cosine similarity (default 0.0)
+"""
+
+import os
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .embedding_store import EmbeddingStore
+
+RETRIEVAL_INDEX_DIR = os.getenv("RETRIEVAL_INDEX_DIR", "./catalog_index")
+RETRIEVAL_NPROBE = int(os.getenv("RETRIEVAL_NPROBE", "16"))
+RETRIEVAL_EF_SEARCH = int(os.getenv("RETRIEVAL_EF_SEARCH", "64"))
+RETRIEVAL_THREADS = int(os.getenv("RETRIEVAL_THREADS", "1"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.0"))
+
+INDEX_KINDS = ("hnsw", "ivf", "flat", "exact")
+STORE_DIR = "store"
+_CHUNK_ROWS = 65536  # rows converted to float32 at a time
+
+# whole-body boxes are not catalog products
+_SKIP_LABELS = {"person"}
+
+# coarse color names so text queries read like product titles ("navy jacket")
+_COLOR_NAMES = {
+    "black": (20, 20, 20), "white": (240, 240, 240), "gray": (128, 128, 128),
+    "red": (200, 30, 30), "maroon": (120, 20, 30), "pink": (240, 150, 180),
+    "orange": (240, 140, 40), "yellow": (240, 220, 50), "beige": (220, 200, 160),
+    "brown": (120, 80, 40), "green": (40, 140, 60), "olive": (110, 110, 40),
+    "blue": (40, 90, 200), "navy": (25, 35, 80), "purple": (120, 60, 150),
+}
+_COLOR_KEYS = list(_COLOR_NAMES)
+_COLOR_RGB = np.array([_COLOR_NAMES[c] for c in _COLOR_KEYS], dtype=np.float32)
+
+
+ENCODER_KEYS = ("encoder_model", "encoder_kind")
+
+
+def encoder_config() -> Dict[str, Any]:
+    """Identity of the embedding space this process embeds with, for index.json."""
+    from .classify import image_model_id
+    from .clip_encoder import CLIP_ENCODER
+    return {"encoder": "image_embeddings", "encoder_model": image_model_id(), "encoder_kind": CLIP_ENCODER}
+
+
+def check_encoder(config: Dict[str, Any], index_dir: str):
+    """Raise ValueError if `index_dir` was built with another encoder than the current one."""
+    recorded = {k: config[k] for k in ENCODER_KEYS if k in config}
+    if not recorded:
+        print(f"[WARN] {index_dir}: index.json does not record its encoder, cannot check the embedding space")
+        return
+    current = encoder_config()
+    for key, built in recorded.items():
+        if built != current[key]:
+            raise ValueError(f"{index_dir} was built with {key}={built} but this process embeds with "
+                             f"{key}={current[key]}; rebuild the index or switch back")
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.ascontiguousarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def color_name(rgb) -> Optional[str]:
+    if not rgb:
+        return None
+    d = ((_COLOR_RGB - np.asarray(rgb[:3], dtype=np.float32)) ** 2).sum(1)
+    return _COLOR_KEYS[int(d.argmin())]
+
+
+# -------------------
+# Index build / load
+# -------------------
+
+def build_index(embs: np.ndarray, kind: str = "hnsw", nlist: Optional[int] = None, hnsw_m: int = 32,
+                ef_construction: int = 200):
+    """FAISS inner-product index over L2-normalized `embs` (cosine similarity); None for "exact"."""
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind '{kind}' (expected {', '.join(INDEX_KINDS)})")
+    if kind == "exact":
+        return None
+    import faiss
+    n, dim = embs.shape
+    if kind == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        nlist = nlist or max(1, min(4096, int(4 * np.sqrt(n))))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        # train on a sample, the store may not fit in RAM as float32
+        sample = np.sort(np.random.default_rng(0).choice(n, min(n, 256 * nlist), replace=False))
+        index.train(_normalize(embs[sample]))
+    for start in range(0, n, _CHUNK_ROWS):
+        index.add(_normalize(embs[start:start + _CHUNK_ROWS]))
+    return index
+
+
+def write_index(index_dir: str, index, store: EmbeddingStore, config: Dict[str, Any]):
+    """Write index.faiss (unless "exact") and index.json next to the store."""
+    if index is not None:
+        import faiss
+        if index.ntotal != len(store):
+            raise ValueError(f"index has {index.ntotal} vectors but the store {len(store)} rows")
+        tmp = os.path.join(index_dir, "index.faiss.tmp")
+        faiss.write_index(index, tmp)
+        os.replace(tmp, os.path.join(index_dir, "index.faiss"))
+    with open(os.path.join(index_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump({**config, "count": len(store), "dim": store.dim, "store_dtype": store.dtype.name}, f, indent=2)
+
+
+def create_catalog_index(index_dir: str, embs: np.ndarray, metas: List[Dict[str, Any]], kind: str = "hnsw",
+                         store_dtype: str = "float16", config: Optional[Dict[str, Any]] = None, **build_kwargs):
+    """Fresh index directory: store the normalized rows, then index them from the memmap."""
+    if os.path.exists(os.path.join(index_dir, STORE_DIR)):
+        raise FileExistsError(f"{index_dir} already has a store; use append_items() to add products")
+    os.makedirs(index_dir, exist_ok=True)
+    store = EmbeddingStore.create(os.path.join(index_dir, STORE_DIR), embs.shape[1], store_dtype)
+    store.append(_normalize(embs), metas)
+    index = build_index(store.embeddings, kind=kind, **build_kwargs)
+    write_index(index_dir, index, store, {**(config or {}), "kind": kind, **build_kwargs})
+    return store
+
+
+def append_items(index_dir: str, embs: np.ndarray, metas: List[Dict[str, Any]]) -> range:
+    """
+    Incrementally add catalog items: rows are appended to the store (no rewrite)
+    and added to the existing FAISS index (IVF keeps its trained centroids).
+    """
+    with open(os.path.join(index_dir, "index.json"), encoding="utf-8") as f:
+        config = json.load(f)
+    check_encoder(config, index_dir)
+    store = EmbeddingStore(os.path.join(index_dir, STORE_DIR))
+    ids = store.append(_normalize(embs), metas)
+    index = None
+    if config["kind"] != "exact":
+        import faiss
+        index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+        index.add(_normalize(embs))
+    write_index(index_dir, index, store, config)
+    return ids
+
+
+class CatalogIndex:
+    """A loaded index directory: FAISS index (or exact search) over a memory-mapped embedding store."""
+
+    def __init__(self, index, store: EmbeddingStore, config: Dict[str, Any]):
+        self.index = index
+        self.store = store
+        self.config = config
+        self.set_search_params(RETRIEVAL_NPROBE, RETRIEVAL_EF_SEARCH)
+
+    @classmethod
+    def load(cls, index_dir: str) -> "CatalogIndex":
+        with open(os.path.join(index_dir, "index.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        store = EmbeddingStore(os.path.join(index_dir, STORE_DIR))
+        index = None
+        if config.get("kind") != "exact":
+            import faiss
+            faiss.omp_set_num_threads(RETRIEVAL_THREADS)
+            path = os.path.join(index_dir, "index.faiss")
+            try:  # map the vector codes instead of copying them into every worker
+                index = faiss.read_index(path, getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP))
+            except RuntimeError:
+                index = faiss.read_index(path)
+            if index.ntotal != len(store):
+                raise ValueError(f"{index_dir}: index has {index.ntotal} vectors but the store {len(store)} rows")
+        return cls(index, store, config)
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Speed / recall knobs: IVF nprobe, HNSW efSearch (ignored for other kinds)."""
+        if self.index is None:
+            return
+        import faiss
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None and nprobe:
+            ivf.nprobe = nprobe
+        if hasattr(self.index, "hnsw") and ef_search:
+            self.index.hnsw.efSearch = ef_search
+
+    @property
+    def dim(self) -> int:
+        return self.store.dim
+
+    @property
+    def ntotal(self) -> int:
+        return len(self.store)
+
+    def meta(self, idx: int) -> Dict[str, Any]:
+        return self.store.meta(idx)
+
+    def _exact_search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Chunked matrix product over the memmap; keeps a running top-k."""
+        n_q = queries.shape[0]
+        best_s = np.full((n_q, k), -np.inf, dtype=np.float32)
+        best_i = np.full((n_q, k), -1, dtype=np.int64)
+        for start in range(0, self.ntotal, _CHUNK_ROWS):
+            scores = queries @ self.store.rows(start, start + _CHUNK_ROWS).T
+            s = np.concatenate([best_s, scores], axis=1)
+            i = np.concatenate([best_i, np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)], axis=1)
+            top = np.argpartition(-s, k - 1, axis=1)[:, :k] if s.shape[1] > k else np.arange(s.shape[1])[None].repeat(n_q, 0)
+            best_s, best_i = np.take_along_axis(s, top, 1), np.take_along_axis(i, top, 1)
+        order = np.argsort(-best_s, axis=1, kind="stable")
+        return np.take_along_axis(best_s, order, 1), np.take_along_axis(best_i, order, 1)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(scores, ids) of shape (n_queries, k); missing hits have id -1."""
+        queries = _normalize(queries)
+        if self.index is None:
+            return self._exact_search(queries, k)
+        return self.index.search(queries, k)
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+_INDEX_MISSING = False
+_INDEX_ERROR: Optional[str] = None
+
+
+def get_catalog_index(index_dir: Optional[str] = None) -> Optional[CatalogIndex]:
+    """Load the catalog index once; None (with one warning) if it has not been built or cannot be used."""
+    global _INDEX, _INDEX_MISSING, _INDEX_ERROR
+    with _INDEX_LOCK:
+        if _INDEX is None and not _INDEX_MISSING and _INDEX_ERROR is None:
+            index_dir = index_dir or RETRIEVAL_INDEX_DIR
+            if not os.path.exists(os.path.join(index_dir, "index.json")):
+                _INDEX_MISSING = True
+                print(f"[WARN] No catalog index in {index_dir}; ML retrieval disabled "
+                      f"(build one with scripts/build_catalog_index.py)")
+            else:
+                try:
+                    index = CatalogIndex.load(index_dir)
+                    check_encoder(index.config, index_dir)  # query embeddings must share the space
+                except Exception as e:
+                    # recorded, not retried: every request would pay for (and fail on) the load again
+                    _INDEX_ERROR = str(e)
+                    print(f"[WARN] Could not load catalog index from {index_dir}; ML retrieval disabled:", e)
+                    return None
+                _INDEX = index
+                print(f"[INFO] Loaded catalog index: {_INDEX.ntotal} items ({_INDEX.config.get('kind')})")
+        return _INDEX
+
+
+def catalog_index_error() -> Optional[str]:
+    """Why the catalog index could not be loaded, None if it loaded or was never built."""
+    return _INDEX_ERROR
+
+
+# -------------------
+# Request-time queries
+# -------------------
+
+def _text_query(det: Dict[str, Any]) -> str:
+    from .llm_cache import primary_rgb
+    label = det.get("refined_label") or det.get("label") or ""
+    color = color_name(primary_rgb(det))
+    return f"{color} {label}" if color else label
+
+
+def _query_embeddings(detections: List[Dict[str, Any]], image=None) -> np.ndarray:
+    """
+    Embed detection crops in one batch when pixels are available, else text queries.
+    image: the (blurred) DecodedImage detection ran on, or upload bytes to decode.
+    """
+    from .classify import image_embeddings, text_embedding
+    if image is not None:
+        from .image_io import as_decoded
+        image = as_decoded(image)
+        sx, sy = image.scale  # detection bboxes are in original-image coordinates
+        H, W = image.rgb.shape[:2]
+        crops, crop_idx = [], []
+        for i, d in enumerate(detections):
+            x1, y1, x2, y2 = d["bbox"]
+            x1, x2 = max(0, int(x1 / sx)), min(W, int(np.ceil(x2 / sx)))
+            y1, y2 = max(0, int(y1 / sy)), min(H, int(np.ceil(y2 / sy)))
+            if x2 > x1 and y2 > y1:
+                crops.append(image.pil.crop((x1, y1, x2, y2)))
+                crop_idx.append(i)
+        embs = [None] * len(detections)
+        for i, e in zip(crop_idx, image_embeddings(crops)):
+            embs[i] = e
+        for i, e in enumerate(embs):
+            if e is None:
+                embs[i] = text_embedding(_text_query(detections[i]))
+        return np.stack(embs).astype(np.float32)
+    return np.stack([text_embedding(_text_query(d)) for d in detections]).astype(np.float32)
+
+
+def search_catalog(detections: List[Dict[str, Any]], top_k: int = 5, image=None,
+                   index: Optional[CatalogIndex] = None) -> List[List[Dict[str, Any]]]:
+    """Top-k catalog items for each detection (same order as `detections`)."""
+    index = index or get_catalog_index()
+    if index is None or not detections:
+        return [[] for _ in detections]
+    scores, ids = index.search(_query_embeddings(detections, image), top_k)
+    results = []
+    for det, row_scores, row_ids in zip(detections, scores, ids):
+        hits = []
+        for score, idx in zip(row_scores, row_ids):
+            if idx < 0 or score < RETRIEVAL_MIN_SCORE:
+                continue
+            meta = index.meta(int(idx))
+            hits.append({
+                **meta,
+                "label": meta.get("label") or meta.get("title") or str(meta.get("item_id", idx)),
+                "item_id": meta.get("item_id", int(idx)),
+                "score": round(float(score), 4),
+                "query": det.get("refined_label") or det.get("label"),
+            })
+        results.append(hits)
+    return results
+
+
+def retrieve_catalog_items(detections: List[Dict[str, Any]], top_k: int = 5, image=None) -> List[Dict[str, Any]]:
+    """Flat, de-duplicated hit list (best score per item) across all garment detections."""
+    garments = [d for d in detections or [] if (d.get("label") or "").lower() not in _SKIP_LABELS]
+    best: Dict[Any, Dict[str, Any]] = {}
+    for hits in search_catalog(garments, top_k=top_k, image=image):
+        for hit in hits:
+            key = hit["item_id"]
+            if key not in best or hit["score"] > best[key]["score"]:
+                best[key] = hit
+    return sorted(best.values(), key=lambda h: -h["score"])
@@ -0,0 +1,224 @@
+"""
+backend/utils/tracing.py
+
+Lightweight per-stage latency tracing for the request pipelines:
+- `with stage("detect_v2.yolo"):` times a block; `@traced("analyze_outfit")`
+  times a whole (sync or async) function
+- Per stage: fixed-bucket latency histogram, call count and error count
+  (a stage errors when its block raises)
+- render_prometheus() exposes the histograms plus any numeric stats dicts in
+  Prometheus text format (served by /metrics)
+- ServerTimingMiddleware collects the stages a request ran (through a contextvar,
+  carried into the executor threads by utils.executor) into a Server-Timing header
+- Disabled: stage() returns a shared no-op context manager and traced() returns
+  the function unchanged, so the instrumented code pays one branch per block
+- Stages run in the process lane (EXEC_PROCESS_WORKERS > 0) are recorded in the
+  worker process and do not show up here
+
+Tuning (env):
+- TRACING_ENABLED  record stage timings (default 1)
+- SERVER_TIMING    add the Server-Timing response header (default 0, needs TRACING_ENABLED)
+"""
+
+import os
+import re
+import time
+import bisect
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+SERVER_TIMING = TRACING_ENABLED and os.getenv("SERVER_TIMING", "0") == "1"
+
+# histogram upper bounds in seconds (+Inf is implicit)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NOOP = nullcontext()
+
+# (stage, seconds) of the current request, set by ServerTimingMiddleware
+_REQUEST_TIMINGS: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None)
+
+
+class _StageStats:
+    __slots__ = ("buckets", "count", "errors", "sum_s")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # per bucket, last one is +Inf
+        self.count = 0
+        self.errors = 0
+        self.sum_s = 0.0
+
+
+_STAGES: Dict[str, _StageStats] = {}
+_LOCK = threading.Lock()
+
+
+def record(name: str, seconds: float, error: bool = False):
+    """Add one observation of `name` (also used for timings measured elsewhere)."""
+    with _LOCK:
+        st = _STAGES.get(name)
+        if st is None:
+            st = _STAGES[name] = _StageStats()
+        st.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        st.count += 1
+        st.sum_s += seconds
+        if error:
+            st.errors += 1
+    timings = _REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+class _Span:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.t0, exc_type is not None)
+        return False
+
+
+def stage(name: str):
+    """Context manager timing one pipeline stage."""
+    return _Span(name) if TRACING_ENABLED else _NOOP
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Decorator timing every call of a sync or async function as stage `name`."""
+    def decorate(fn: Callable) -> Callable:
+        if not TRACING_ENABLED:
+            return fn
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with _Span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def stage_stats() -> Dict[str, Dict[str, Any]]:
+    """Count / errors / mean latency per stage."""
+    with _LOCK:
+        return {
+            name: {"count": st.count, "errors": st.errors,
+                   "mean_ms": round(st.sum_s * 1000 / st.count, 3) if st.count else 0.0}
+            for name, st in _STAGES.items()
+        }
+
+
+# ---- Prometheus text format ----
+
+_METRIC_PREFIX = "outfit"
+
+
+def _metric_name(*parts: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join((_METRIC_PREFIX,) + parts))
+
+
+def _label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _fmt(value) -> str:
+    return str(int(value)) if isinstance(value, int) else repr(float(value))  # bools become 0 / 1
+
+
+def _stage_lines() -> List[str]:
+    with _LOCK:
+        stages = {name: (list(st.buckets), st.count, st.errors, st.sum_s) for name, st in _STAGES.items()}
+    hist, calls, errors = _metric_name("stage_duration_seconds"), _metric_name("stage_calls_total"), \
+        _metric_name("stage_errors_total")
+    lines = [f"# HELP {hist} Latency of each pipeline stage.", f"# TYPE {hist} histogram"]
+    for name, (buckets, count, _, sum_s) in sorted(stages.items()):
+        label = _label_value(name)
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), buckets):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{hist}_bucket{{stage="{label}",le="{le}"}} {cumulative}')
+        lines.append(f'{hist}_sum{{stage="{label}"}} {sum_s!r}')
+        lines.append(f'{hist}_count{{stage="{label}"}} {count}')
+    for metric, idx, help_text in ((calls, 1, "Calls per pipeline stage."),
+                                   (errors, 2, "Calls per pipeline stage that raised.")):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        lines += [f'{metric}{{stage="{_label_value(name)}"}} {vals[idx]}' for name, vals in sorted(stages.items())]
+    return lines
+
+
+def _gauge_lines(groups: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Numeric fields of {group: stats} as gauges; one nested level becomes a `name` label."""
+    series: Dict[str, List[str]] = {}
+    for group, stats in groups.items():
+        for key, value in (stats or {}).items():
+            if isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    if isinstance(sub_value, (int, float)):
+                        series.setdefault(_metric_name(group, sub_key), []).append(
+                            f'{{name="{_label_value(key)}"}} {_fmt(sub_value)}')
+            elif isinstance(value, (int, float)):
+                series.setdefault(_metric_name(group, key), []).append(f" {_fmt(value)}")
+    lines = []
+    for metric, samples in sorted(series.items()):
+        lines.append(f"# TYPE {metric} gauge")
+        lines += [metric + s for s in samples]
+    return lines
+
+
+def render_prometheus(extra: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """Stage histograms + `extra` stats groups (e.g. {"executor": executor_stats()}) as gauges."""
+    return "\n".join(_stage_lines() + _gauge_lines(extra or {})) + "\n"
+
+
+# ---- Server-Timing ----
+
+def _server_timing(timings: List[Tuple[str, float]], total_s: float) -> bytes:
+    per_stage: Dict[str, float] = {}
+    for name, seconds in timings:
+        per_stage[name] = per_stage.get(name, 0.0) + seconds  # first-seen order
+    parts = [f"{re.sub(r'[^a-zA-Z0-9_.-]', '_', name)};dur={s * 1000:.1f}" for name, s in per_stage.items()]
+    parts.append(f"app;dur={total_s * 1000:.1f}")
+    return ", ".join(parts).encode("latin-1")
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware: Server-Timing header with the stages that ran before the response started."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings: List[Tuple[str, float]] = []
+        token = _REQUEST_TIMINGS.set(timings)
+        t0 = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - t0)))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _REQUEST_TIMINGS.reset(token)
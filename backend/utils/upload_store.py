@@ -0,0 +1,217 @@
+"""
+backend/utils/upload_store.py
+
+Write-behind persistence of (blurred) uploads:
+- Requests only enqueue a DecodedImage; JPEG encoding and disk writes happen on a
+  background thread, off the request's critical path
+- Bounded buffer with a drop policy when the writer falls behind:
+    drop_new     discard the incoming upload (default)
+    drop_oldest  discard the oldest queued upload to make room
+- Sampling: only a fraction of uploads is persisted
+- Retention: the directory is trimmed by file count, total size and age
+
+Tuning (env):
+- UPLOAD_DIR              target directory (default ../blurred_uploads)
+- UPLOAD_PERSIST          persist blurred uploads at all (default 1)
+- UPLOAD_SAVE_ORIGINALS   default for blur_faces(debug=...): also keep the unblurred original (default 0)
+- UPLOAD_SAMPLE_RATE      fraction of uploads persisted, 0..1 (default 1.0)
+- UPLOAD_QUEUE_SIZE       max uploads waiting to be written (default 64)
+- UPLOAD_DROP_POLICY      drop_new | drop_oldest (default drop_new)
+- UPLOAD_MAX_FILES        keep at most this many files, 0 = unlimited (default 5000)
+- UPLOAD_MAX_MB           keep at most this many MB, 0 = unlimited (default 1024)
+- UPLOAD_MAX_AGE_H        delete files older than this, 0 = never (default 0)
+- UPLOAD_RETENTION_EVERY  run retention after this many writes (default 50)
+"""
+
+import os
+import time
+import uuid
+import random
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+from .image_io import DecodedImage
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "../blurred_uploads")
+UPLOAD_PERSIST = os.getenv("UPLOAD_PERSIST", "1") == "1"
+UPLOAD_SAVE_ORIGINALS = os.getenv("UPLOAD_SAVE_ORIGINALS", "0") == "1"
+
+DROP_POLICIES = ("drop_new", "drop_oldest")
+
+
+class UploadStore:
+    """Bounded write-behind queue + directory retention for one upload directory."""
+
+    def __init__(self, directory: str = UPLOAD_DIR,
+                 queue_size: int = int(os.getenv("UPLOAD_QUEUE_SIZE", "64")),
+                 drop_policy: str = os.getenv("UPLOAD_DROP_POLICY", "drop_new"),
+                 sample_rate: float = float(os.getenv("UPLOAD_SAMPLE_RATE", "1.0")),
+                 max_files: int = int(os.getenv("UPLOAD_MAX_FILES", "5000")),
+                 max_mb: float = float(os.getenv("UPLOAD_MAX_MB", "1024")),
+                 max_age_h: float = float(os.getenv("UPLOAD_MAX_AGE_H", "0")),
+                 retention_every: int = int(os.getenv("UPLOAD_RETENTION_EVERY", "50"))):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown UPLOAD_DROP_POLICY '{drop_policy}' (expected {', '.join(DROP_POLICIES)})")
+        self.directory = directory
+        self.queue_size = max(1, queue_size)
+        self.drop_policy = drop_policy
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age_s = max_age_h * 3600
+        self.retention_every = max(1, retention_every)
+
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._since_retention = 0
+        self._stats = {"submitted": 0, "sampled_out": 0, "dropped": 0, "written": 0,
+                       "bytes_written": 0, "errors": 0, "deleted": 0}
+        self._thread = threading.Thread(target=self._worker, name="upload-store", daemon=True)
+        self._thread.start()
+
+    # ---- producer side (request threads) ----
+
+    def submit(self, blurred: DecodedImage, original: Optional[DecodedImage] = None) -> bool:
+        """
+        Queue an upload for persistence; never blocks.
+        `original` (the unblurred image) is written next to the blurred one when given.
+        Returns False when the upload was sampled out or dropped.
+        """
+        with self._cond:
+            self._stats["submitted"] += 1
+            if self._closed:
+                self._stats["dropped"] += 1
+                return False
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                self._stats["sampled_out"] += 1
+                return False
+            if len(self._queue) >= self.queue_size:
+                self._stats["dropped"] += 1
+                if self.drop_policy == "drop_new":
+                    return False
+                self._queue.popleft()
+            self._queue.append((uuid.uuid4().hex, blurred, original))
+            self._cond.notify()
+        return True
+
+    # ---- consumer side (writer thread) ----
+
+    def _write(self, path: str, image: DecodedImage):
+        data = image.to_jpeg()
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)  # readers / retention never see half-written files
+        self._stats["written"] += 1
+        self._stats["bytes_written"] += len(data)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                filename, blurred, original = self._queue.popleft()
+                self._busy = True
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                if original is not None:
+                    self._write(os.path.join(self.directory, f"{filename}_original.jpg"), original)
+                self._write(os.path.join(self.directory, f"{filename}_blurred.jpg"), blurred)
+                self._since_retention += 1
+                if self._since_retention >= self.retention_every:
+                    self._since_retention = 0
+                    self.enforce_retention()
+            except Exception as e:
+                self._stats["errors"] += 1
+                print("[WARN] Upload persistence failed:", e)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def enforce_retention(self) -> int:
+        """Delete the oldest files until count / size / age limits hold. Returns files deleted."""
+        if not (self.max_files or self.max_bytes or self.max_age_s):
+            return 0
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.is_file() and e.name.endswith(".jpg")]
+        except FileNotFoundError:
+            return 0
+        files = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in entries), reverse=True)  # newest first
+
+        now = time.time()
+        keep_bytes, doomed = 0, []
+        for i, (mtime, size, path) in enumerate(files):
+            keep_bytes += size
+            if ((self.max_files and i >= self.max_files)
+                    or (self.max_bytes and keep_bytes > self.max_bytes)
+                    or (self.max_age_s and now - mtime > self.max_age_s)):
+                doomed.append(path)
+        for path in doomed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._stats["deleted"] += len(doomed)
+        return len(doomed)
+
+    # ---- lifecycle ----
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is written. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queued"] = len(self._queue)
+        stats.update(directory=self.directory, queue_size=self.queue_size,
+                     drop_policy=self.drop_policy, sample_rate=self.sample_rate)
+        return stats
+
+
+_STORES: Dict[str, UploadStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_upload_store(directory: Optional[str] = None) -> UploadStore:
+    """One store (writer thread) per directory."""
+    directory = directory or UPLOAD_DIR
+    with _STORES_LOCK:
+        if directory not in _STORES:
+            _STORES[directory] = UploadStore(directory)
+        return _STORES[directory]
+
+
+def upload_store_stats() -> Dict[str, Any]:
+    with _STORES_LOCK:
+        stores = list(_STORES.values())
+    return {"persist": UPLOAD_PERSIST, "stores": [s.stats() for s in stores]}
+
+
+def close_upload_stores(timeout: float = 5.0):
+    """Flush pending writes (bounded by timeout) and stop the writer threads."""
+    with _STORES_LOCK:
+        stores = list(_STORES.values())
+        _STORES.clear()
+    for store in stores:
+        store.close(timeout)
@@ -0,0 +1,190 @@
+"""
+backend/utils/yolo_onnx.py
+
+ONNX Runtime backend for the YOLO ensemble (DETECTOR_BACKEND=onnx):
+- Runs the ONNX exports of YoloF.pt / yolov8s.pt / yolov8n.pt
+  (scripts/export_yolo_onnx.py) with the same ensemble keys and fallback as
+  init_models: "fashion", "general", else "backup"
+- Pre- and post-processing in NumPy: letterbox to the export size (gray 114
+  padding, like ultralytics), class-aware NMS, boxes mapped back to the input image
+- Channel order matches the torch backend: ultralytics takes numpy input as BGR and
+  flips it before the network, so predict_arrays flips the same arrays (D2 / detect
+  pass their RGB working image to both backends) and both networks see the same pixels
+- One session.run per batch of images (the batcher's micro-batches map 1:1)
+- OnnxYolo.predict_arrays returns the same {"boxes", "classes", "confs"} arrays
+  as utils.batching.predict_arrays, so raw_detections keep their schema
+- Class names come from the ultralytics export metadata
+
+Tuning (env):
+- DETECTOR_BACKEND      torch | onnx (default torch)
+- YOLO_ONNX_DIR         directory with <weights>.onnx (default ./weights/onnx)
+- YOLO_ONNX_INT8        1 = prefer <weights>.int8.onnx when present (default 0)
+- YOLO_NMS_IOU          NMS IoU threshold (default 0.7, the ultralytics predict default)
+- YOLO_MAX_DET          max detections per image (default 300)
+- ORT_INTRA_OP_THREADS  threads inside one operator (default min(4, cpus))
+- ORT_INTER_OP_THREADS  threads across independent operators (default 1)
+- ORT_PROVIDERS         comma-separated execution providers in priority order, e.g.
+                        OpenVINOExecutionProvider,CPUExecutionProvider (default CPUExecutionProvider)
+"""
+
+import os
+import ast
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "torch").lower()
+YOLO_ONNX_DIR = os.getenv("YOLO_ONNX_DIR", "./weights/onnx")
+YOLO_ONNX_INT8 = os.getenv("YOLO_ONNX_INT8", "0") == "1"
+YOLO_NMS_IOU = float(os.getenv("YOLO_NMS_IOU", "0.7"))
+YOLO_MAX_DET = int(os.getenv("YOLO_MAX_DET", "300"))
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", str(min(4, os.cpu_count() or 1))))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "1"))
+ORT_PROVIDERS = [p.strip() for p in os.getenv("ORT_PROVIDERS", "CPUExecutionProvider").split(",") if p.strip()]
+
+# same members / keys as the PyTorch ensemble in detect.py / D2.py
+ENSEMBLE = (("fashion", "YoloF"), ("general", "yolov8s"))
+FALLBACK = ("backup", "yolov8n")
+
+_MAX_WH = 7680  # class offset for class-aware NMS in one pass (as ultralytics)
+
+
+def onnx_path(stem: str, int8: Optional[bool] = None, directory: Optional[str] = None) -> str:
+    """Path of the export for a weights stem, the INT8 variant if requested and present."""
+    directory = directory or YOLO_ONNX_DIR
+    fp32 = os.path.join(directory, f"{stem}.onnx")
+    quant = os.path.join(directory, f"{stem}.int8.onnx")
+    if (YOLO_ONNX_INT8 if int8 is None else int8) and os.path.exists(quant):
+        return quant
+    return fp32
+
+
+def session_options():
+    import onnxruntime as ort
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = ORT_INTRA_OP_THREADS
+    opts.inter_op_num_threads = ORT_INTER_OP_THREADS
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return opts
+
+
+def providers() -> List[str]:
+    import onnxruntime as ort
+    available = set(ort.get_available_providers())
+    chosen = [p for p in ORT_PROVIDERS if p in available]
+    missing = [p for p in ORT_PROVIDERS if p not in available]
+    if missing:
+        print(f"[WARN] ONNX Runtime providers not available: {', '.join(missing)}")
+    return chosen or ["CPUExecutionProvider"]
+
+
+def letterbox(img: np.ndarray, size: int) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """Resize keeping aspect ratio and pad to size x size. Returns (padded, gain, (pad_left, pad_top))."""
+    import cv2
+    h, w = img.shape[:2]
+    gain = min(size / h, size / w)
+    new_w, new_h = int(round(w * gain)), int(round(h * gain))
+    if (new_w, new_h) != (w, h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    dw, dh = (size - new_w) / 2, (size - new_h) / 2
+    left, top = int(round(dw - 0.1)), int(round(dh - 0.1))
+    out = np.full((size, size, 3), 114, dtype=np.uint8)
+    out[top:top + new_h, left:left + new_w] = img
+    return out, gain, (left, top)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_thresh: float, max_det: int) -> np.ndarray:
+    """Greedy NMS over (n, 4) xyxy boxes; indices of the kept boxes, best first."""
+    order = scores.argsort()[::-1]
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None)
+        ih = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None)
+        inter = iw * ih
+        iou = inter / (area[i] + area[rest] - inter + 1e-9)
+        order = rest[iou <= iou_thresh]
+    return np.asarray(keep, dtype=int)
+
+
+def postprocess(pred: np.ndarray, conf: float, gain: float, pad: Tuple[int, int], shape: Tuple[int, int],
+                iou_thresh: float = YOLO_NMS_IOU, max_det: int = YOLO_MAX_DET) -> Dict[str, np.ndarray]:
+    """One image's raw YOLOv8 head output (4 + nc, anchors) -> predict_arrays dict in input-image pixels."""
+    pred = pred.T  # (anchors, 4 + nc): cx, cy, w, h, class scores
+    scores = pred[:, 4:]
+    classes = scores.argmax(1)
+    confs = scores[np.arange(len(classes)), classes]
+    keep = confs >= conf
+    xywh, classes, confs = pred[keep, :4], classes[keep], confs[keep]
+    if not len(confs):
+        return {"boxes": np.zeros((0, 4), dtype=np.float32), "classes": np.zeros((0,), dtype=int),
+                "confs": np.zeros((0,), dtype=float)}
+    boxes = np.empty_like(xywh)
+    boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+    idx = nms(boxes + (classes * _MAX_WH)[:, None], confs, iou_thresh, max_det)
+    boxes, classes, confs = boxes[idx], classes[idx], confs[idx]
+
+    boxes[:, [0, 2]] -= pad[0]
+    boxes[:, [1, 3]] -= pad[1]
+    boxes /= gain
+    h, w = shape
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+    return {"boxes": boxes.astype(np.float32), "classes": classes.astype(int), "confs": confs.astype(float)}
+
+
+class OnnxYolo:
+    """An exported YOLOv8 detector on ONNX Runtime with the ultralytics model's `names`."""
+
+    def __init__(self, path: str):
+        import onnxruntime as ort
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=session_options(), providers=providers())
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = {int(k): v for k, v in ast.literal_eval(meta["names"]).items()} if "names" in meta else {}
+        imgsz = ast.literal_eval(meta["imgsz"]) if "imgsz" in meta else inp.shape[2:]
+        self.imgsz = int(imgsz[0]) if isinstance(imgsz[0], int) else 640
+        self.fixed_batch = inp.shape[0] if isinstance(inp.shape[0], int) else None
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        if self.fixed_batch is None or self.fixed_batch == len(batch):
+            return self.session.run(None, {self.input_name: batch})[0]
+        # static-batch export: one image per run
+        return np.concatenate([self.session.run(None, {self.input_name: batch[i:i + 1]})[0]
+                               for i in range(len(batch))])
+
+    def predict_arrays(self, images: List[np.ndarray], conf: float) -> List[Dict[str, np.ndarray]]:
+        """uint8 HWC images (as handed to ultralytics) -> one {"boxes", "classes", "confs"} dict per image."""
+        boxed = [letterbox(img, self.imgsz) for img in images]
+        # ultralytics reverses the channels of numpy input (BGR -> RGB); do the same
+        batch = np.stack([b[0] for b in boxed])[..., ::-1].transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+        preds = self._run(np.ascontiguousarray(batch))
+        return [postprocess(pred, conf, gain, pad, img.shape[:2])
+                for pred, (_, gain, pad), img in zip(preds, boxed, images)]
+
+
+def load_onnx_ensemble(directory: Optional[str] = None) -> Dict[str, OnnxYolo]:
+    """ONNX counterpart of init_models: same keys, same yolov8n fallback."""
+    models = {}
+    for key, stem in ENSEMBLE:
+        path = onnx_path(stem, directory=directory)
+        if not os.path.exists(path):
+            continue
+        try:
+            models[key] = OnnxYolo(path)
+            print(f"[INFO] Loaded {path} (onnxruntime)")
+        except Exception as e:
+            print(f"[WARN] Could not load {path}:", e)
+    if not models:
+        key, stem = FALLBACK
+        path = onnx_path(stem, directory=directory)
+        print(f"[FALLBACK] Loading {path} as backup")
+        models[key] = OnnxYolo(path)
+    return models